@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+RK3588批量导出队列
+每个任务 = .pt文件 + 导出参数，在独立的工作进程中调用export_rk3588_onnx，
+主进程（导出GUI或命令行）通过每个任务各自的事件队列获取进度，可随时取消，结束后汇总输出大小与导出耗时
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import queue
+import sys
+import time
+from pathlib import Path
+
+# 任务状态
+PENDING, RUNNING, DONE, FAILED, CANCELLED = 'pending', 'running', 'done', 'failed', 'cancelled'
+STATUS_LABELS = {PENDING: '等待', RUNNING: '导出中', DONE: '完成', FAILED: '失败', CANCELLED: '已取消'}
+
+
+class _EventWriter:
+    """工作进程的stdout/stderr：完整写入任务日志，每行输出同时作为进度事件发回主进程"""
+
+    def __init__(self, job_id, events, log_file):
+        self.job_id = job_id
+        self.events = events
+        self.log_file = log_file
+        self.buffer = ''
+
+    def write(self, text):
+        self.log_file.write(text)
+        self.buffer += text
+        while '\n' in self.buffer:
+            line, self.buffer = self.buffer.split('\n', 1)
+            if line.strip():
+                self.events.put((self.job_id, 'progress', line.strip()))
+        return len(text)
+
+    def flush(self):
+        self.log_file.flush()
+
+
+def _run_job(job_id, model_path, output_path, settings, events, log_path):
+    """工作进程入口：导出单个任务，结果以 (job_id, 'done'/'failed', 信息) 事件返回"""
+    with open(log_path, 'w', encoding='utf-8') as log_file:
+        sys.stdout = sys.stderr = _EventWriter(job_id, events, log_file)
+        try:
+            from simple_rk3588_export import export_rk3588_onnx
+            result = export_rk3588_onnx(model_path, output_path, **settings)
+        except Exception as e:
+            events.put((job_id, 'failed', f"{type(e).__name__}: {e}"))
+            return
+        events.put((job_id, 'done', str(result)))
+
+
+def format_img_size(img_size):
+    """640 → '640'，(480, 640) → '480x640'"""
+    return str(img_size) if isinstance(img_size, int) else 'x'.join(str(v) for v in img_size)
+
+
+def default_output_name(model_path, img_size, settings):
+    """
+    批量任务的默认输出文件名：<训练目录>_<模型名>_<尺寸>_<参数哈希>.onnx
+    ultralytics的checkpoint都叫best.pt/last.pt，取runs/<name>/weights/best.pt中的<name>区分，
+    参数哈希区分同一模型、同一尺寸的不同导出参数（fp16/uint8/类别子集/布局/DFL...）
+    """
+    model_path = Path(model_path)
+    run_dir = model_path.parent.parent if model_path.parent.name == 'weights' else model_path.parent
+    options = {k: v for k, v in settings.items() if k not in ('img_size', 'use_cache', 'reports', 'profile_runs')}
+    digest = hashlib.sha1(json.dumps(options, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:6]
+    prefix = f"{run_dir.name}_" if run_dir.name else ''
+    return f"{prefix}{model_path.stem}_{format_img_size(img_size)}_{digest}.onnx"
+
+
+def parse_img_size(text):
+    """'640' → 640，'480x640' → (480, 640)（高x宽）"""
+    parts = [int(v) for v in str(text).lower().split('x')]
+    return parts[0] if len(parts) == 1 or parts[0] == parts[1] else (parts[0], parts[1])
+
+
+class BatchExporter:
+    """
+    批量导出队列：每个任务在独立的spawn进程中运行，最多max_workers个同时运行
+    主进程定期调用poll()处理进度事件并启动等待中的任务，GUI不会因导出追踪而卡住
+    """
+
+    def __init__(self, max_workers=1, log_dir=None):
+        self.max_workers = max(1, max_workers)
+        self.log_dir = Path(log_dir) if log_dir else None
+        # spawn：不继承Tk/torch的线程状态，取消时可直接终止进程
+        self.ctx = mp.get_context('spawn')
+        self.jobs = []
+        self.processes = {}
+        # 每个运行中的任务独占一个事件队列：终止进程可能损坏它正在写的队列，取消时整个丢弃
+        self.queues = {}
+
+    def _output_taken(self, output_path):
+        """输出路径是否已被未取消的任务占用"""
+        target = Path(output_path).resolve()
+        return any(Path(job['output']).resolve() == target for job in self.jobs if job['status'] != CANCELLED)
+
+    def unique_output(self, output_path):
+        """输出路径已被队列中的任务占用时追加 _2、_3... 后缀"""
+        output_path = Path(output_path)
+        candidate, index = output_path, 2
+        while self._output_taken(candidate):
+            candidate = output_path.with_name(f"{output_path.stem}_{index}{output_path.suffix}")
+            index += 1
+        return candidate
+
+    def add_job(self, model_path, output_path, **settings):
+        """
+        加入任务，settings为export_rk3588_onnx的关键字参数，返回任务ID
+        输出路径（及由其派生的日志路径）已被队列中的其他任务占用时抛出ValueError，避免互相覆盖
+        """
+        if self._output_taken(output_path):
+            raise ValueError(f"输出路径与队列中的任务重复: {output_path}")
+        job = {
+            'id': len(self.jobs),
+            'model': str(model_path),
+            'output': str(output_path),
+            'settings': settings,
+            'status': PENDING,
+            'message': '',
+            'result': None,
+            'size_mb': None,
+            'started': None,
+            'elapsed': None,
+        }
+        self.jobs.append(job)
+        return job['id']
+
+    def _log_path(self, job):
+        log_dir = self.log_dir or Path(job['output']).parent
+        log_dir.mkdir(parents=True, exist_ok=True)
+        return log_dir / f"{Path(job['output']).stem}.export.log"
+
+    def _launch(self, job):
+        Path(job['output']).parent.mkdir(parents=True, exist_ok=True)
+        events = self.ctx.Queue()
+        process = self.ctx.Process(
+            target=_run_job,
+            args=(job['id'], job['model'], job['output'], job['settings'], events, str(self._log_path(job))),
+            daemon=True,
+        )
+        process.start()
+        self.processes[job['id']] = process
+        self.queues[job['id']] = events
+        job['status'] = RUNNING
+        job['started'] = time.perf_counter()
+        job['message'] = '启动工作进程...'
+
+    def _finish(self, job, status, message):
+        job['status'] = status
+        job['message'] = message
+        job['elapsed'] = time.perf_counter() - job['started'] if job['started'] else None
+        process = self.processes.pop(job['id'], None)
+        if process is not None:
+            process.join(timeout=5)
+        events = self.queues.pop(job['id'], None)
+        if events is not None:
+            events.close()
+        if status == DONE:
+            from rk3588_eval_utils import onnx_size_mb
+            job['result'] = message
+            job['size_mb'] = onnx_size_mb(message)
+
+    def poll(self):
+        """处理工作进程事件、回收已退出的进程并启动等待中的任务，返回状态或进度有变化的任务"""
+        # 先记录已退出的进程：其事件此时都已进入管道，下面一并读出
+        exited = [job_id for job_id, process in self.processes.items() if not process.is_alive()]
+        updated = {}
+        for job_id, events in list(self.queues.items()):
+            job = self.jobs[job_id]
+            while job['status'] == RUNNING:
+                try:
+                    _, kind, message = events.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == 'progress':
+                    job['message'] = message
+                else:
+                    self._finish(job, DONE if kind == 'done' else FAILED, message)
+                updated[job_id] = job
+        for job_id in exited:
+            job = self.jobs[job_id]
+            if job['status'] == RUNNING:
+                self._finish(job, FAILED, f"工作进程异常退出 (exitcode={self.processes[job_id].exitcode})")
+                updated[job_id] = job
+
+        for job in self.jobs:
+            if len(self.processes) >= self.max_workers:
+                break
+            if job['status'] == PENDING:
+                self._launch(job)
+                updated[job['id']] = job
+        return list(updated.values())
+
+    def cancel(self, job_id):
+        """取消任务：等待中的直接标记取消，运行中的终止其工作进程并丢弃其事件队列（可能已损坏，不再读取）"""
+        job = self.jobs[job_id]
+        if job['status'] == PENDING:
+            job['status'] = CANCELLED
+        elif job['status'] == RUNNING:
+            process = self.processes.get(job_id)
+            if process is not None:
+                process.terminate()
+            self._finish(job, CANCELLED, '已取消')
+
+    def cancel_all(self):
+        for job in self.jobs:
+            self.cancel(job['id'])
+
+    def is_busy(self):
+        return any(job['status'] in (PENDING, RUNNING) for job in self.jobs)
+
+    def wait(self, interval=0.2, on_update=None):
+        """阻塞直到全部任务结束（命令行使用），on_update(job)在任务状态或进度变化时调用"""
+        while self.is_busy():
+            for job in self.poll():
+                if on_update:
+                    on_update(job)
+            time.sleep(interval)
+        for job in self.poll():
+            if on_update:
+                on_update(job)
+
+
+def format_summary(jobs):
+    """任务汇总表：模型、尺寸、状态、输出大小与导出耗时"""
+    lines = [f"  {'#':<4}{'模型':<24}{'尺寸':<12}{'状态':<8}{'大小(MB)':>10}{'耗时(s)':>10}  输出"]
+    for job in jobs:
+        size = f"{job['size_mb']:.2f}" if job['size_mb'] is not None else '-'
+        elapsed = f"{job['elapsed']:.1f}" if job['elapsed'] is not None else '-'
+        img_size = format_img_size(job['settings'].get('img_size', 640))
+        output = job['result'] or (job['output'] if job['status'] != FAILED else job['message'])
+        lines.append(f"  {job['id']:<4}{Path(job['model']).name:<24}{img_size:<12}"
+                     f"{STATUS_LABELS[job['status']]:<8}{size:>10}{elapsed:>10}  {output}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Queue RK3588 ONNX exports (models x sizes) in worker processes')
+    parser.add_argument('models', nargs='+', help='YOLOv8 .pt files')
+    parser.add_argument('--imgsz', nargs='+', default=['640'],
+                        help='Input sizes: S for square or HxW for rectangular, e.g. 640 480x640 (default: 640)')
+    parser.add_argument('-o', '--output-dir', default='batch_exports', help='Output directory (default: batch_exports)')
+    parser.add_argument('--workers', type=int, default=1, help='Parallel worker processes (default: 1)')
+    parser.add_argument('--opset', type=int, default=11, help='ONNX opset version (default: 11)')
+    parser.add_argument('--no-fuse', action='store_true', help='Skip Conv+BN fusion')
+    parser.add_argument('--half', action='store_true', help='Also write FP16 models')
+    parser.add_argument('--uint8-input', action='store_true', help='Take uint8 NHWC BGR frames')
+    parser.add_argument('--decode-boxes', action='store_true', help='Decode boxes in-graph (box1..3)')
+    parser.add_argument('--classes', type=int, nargs='+', help='Keep only these class ids')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore the export cache')
+    parser.add_argument('--reports', action='store_true',
+                        help='Run the per-export parity/latency reports (off by default for batches)')
+    parser.add_argument('--profile-runs', type=int, default=0,
+                        help='Profiled onnxruntime runs for a per-operator report next to each export (default: 0, off)')
+    args = parser.parse_args()
+
+    output_dir = Path(args.output_dir)
+    exporter = BatchExporter(max_workers=args.workers, log_dir=output_dir / 'logs')
+    for model in args.models:
+        for size_text in args.imgsz:
+            img_size = parse_img_size(size_text)
+            settings = dict(img_size=img_size, opset_version=args.opset, fuse=not args.no_fuse, half=args.half,
+                            uint8_input=args.uint8_input, decode_boxes=args.decode_boxes, keep_classes=args.classes,
+                            use_cache=not args.no_cache, reports=args.reports, profile_runs=args.profile_runs)
+            # 同一模型在命令行中重复给出时追加序号
+            output = exporter.unique_output(output_dir / default_output_name(model, img_size, settings))
+            exporter.add_job(model, output, **settings)
+    print(f"📋 批量导出: {len(exporter.jobs)} 个任务, {exporter.max_workers} 个工作进程, 日志: {output_dir / 'logs'}")
+
+    started = set()
+
+    def on_update(job):
+        tag = f"[{job['id']}] {Path(job['model']).name} {format_img_size(job['settings']['img_size'])}"
+        if job['status'] == RUNNING and job['id'] not in started:
+            started.add(job['id'])
+            print(f"🔄 {tag}: 开始导出")
+        elif job['status'] in (DONE, FAILED, CANCELLED):
+            icon = {DONE: '✅', FAILED: '❌', CANCELLED: '⚠️'}[job['status']]
+            print(f"{icon} {tag}: {STATUS_LABELS[job['status']]} ({job['elapsed'] or 0:.1f}s)")
+
+    try:
+        exporter.wait(on_update=on_update)
+    except KeyboardInterrupt:
+        print("\n⚠️ 收到中断，取消剩余任务")
+        exporter.cancel_all()
+
+    print(f"\n📊 批量导出汇总:")
+    print(format_summary(exporter.jobs))
+
+
+if __name__ == "__main__":
+    main()
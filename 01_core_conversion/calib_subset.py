@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+多样性校准子集
+datasets/temp/images中的图片是连续视频帧，相邻帧几乎相同，全量校准慢、随机抽样又不稳定：
+- 多进程为每张图片计算廉价特征（HSV颜色直方图 + 16x16灰度缩略图）
+- k-means聚为N簇，每簇取离簇中心最近的一帧
+- 写出清单JSON（图片路径相对清单所在目录），rk3588_quantize.py --calib-dir、rk3588_parity.py --images、
+  rk3588_quant_sensitivity.py --calib-dir 均可直接传入清单（见rk3588_eval_utils.list_images）
+- 报告覆盖度（每张图片到最近入选帧的特征距离，与同样大小的随机子集对比）及相对全量校准节省的时间
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+from pathlib import Path
+
+import numpy as np
+
+from rk3588_eval_utils import DEFAULT_TRAIN_DIR, list_images
+
+EMBEDDING = 'hsv_hist_8x4x4+gray_thumb_16'
+
+
+def image_embedding(image_path, thumb_size=16, bins=(8, 4, 4)):
+    """
+    单张图片的特征向量，返回 (图片路径, 特征或None)
+    颜色直方图取平方根（Hellinger），缩略图去均值后归一化，两部分各为单位长度
+    """
+    import cv2
+
+    image = cv2.imread(str(image_path))
+    if image is None:
+        return str(image_path), None
+    small = cv2.resize(image, (160, 120), interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1, 2], None, list(bins), [0, 180, 0, 256, 0, 256]).ravel()
+    hist = np.sqrt(hist / max(hist.sum(), 1.0))
+    gray = cv2.resize(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (thumb_size, thumb_size),
+                      interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+    gray -= gray.mean()
+    gray /= max(float(np.linalg.norm(gray)), 1e-6)
+    return str(image_path), np.concatenate([hist, gray]).astype(np.float32)
+
+
+def compute_embeddings(image_paths, workers=None):
+    """多进程计算全部图片的特征，返回 (成功的图片路径列表, 特征矩阵[N, D])"""
+    image_paths = [str(p) for p in image_paths]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(image_paths)))
+    if workers == 1:
+        results = [image_embedding(p) for p in image_paths]
+    else:
+        with ProcessPoolExecutor(workers, mp_context=mp.get_context('spawn')) as pool:
+            results = list(pool.map(image_embedding, image_paths,
+                                    chunksize=max(1, len(image_paths) // (workers * 4))))
+    for path, feature in results:
+        if feature is None:
+            print(f"⚠️ 跳过无法读取的图片: {path}")
+    results = [(path, feature) for path, feature in results if feature is not None]
+    if not results:
+        return [], np.zeros((0, 0), np.float32)
+    return [path for path, _ in results], np.stack([feature for _, feature in results])
+
+
+def nearest_distances(features, centers):
+    """每个样本到最近中心的欧氏距离与中心序号"""
+    d2 = ((features[:, None, :] - centers[None, :, :]) ** 2).sum(-1)
+    labels = d2.argmin(1)
+    return np.sqrt(np.maximum(d2[np.arange(len(features)), labels], 0.0)), labels
+
+
+def kmeans(features, k, iters=100, seed=0):
+    """k-means（k-means++初始化），返回 (各样本簇号, 簇中心)"""
+    rng = np.random.default_rng(seed)
+    centers = [features[rng.integers(len(features))]]
+    d2 = ((features - centers[0]) ** 2).sum(1)
+    for _ in range(1, k):
+        total = d2.sum()
+        index = rng.choice(len(features), p=d2 / total) if total > 0 else rng.integers(len(features))
+        centers.append(features[index])
+        d2 = np.minimum(d2, ((features - centers[-1]) ** 2).sum(1))
+    centers = np.stack(centers)
+    labels = None
+    for _ in range(iters):
+        _, new_labels = nearest_distances(features, centers)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for j in range(k):
+            members = features[labels == j]
+            if len(members):
+                centers[j] = members.mean(0)
+    return labels, centers
+
+
+def select_diverse(features, n, seed=0):
+    """聚为n簇并取每簇离中心最近的样本，返回 (入选序号列表, 各入选样本代表的图片数)"""
+    if n >= len(features):
+        return list(range(len(features))), [1] * len(features)
+    labels, centers = kmeans(features, n, seed=seed)
+    selected, sizes = [], []
+    for j in range(n):
+        members = np.flatnonzero(labels == j)
+        if not len(members):
+            continue
+        dist = ((features[members] - centers[j]) ** 2).sum(1)
+        selected.append(int(members[dist.argmin()]))
+        sizes.append(int(len(members)))
+    order = np.argsort(selected)  # 按文件名（即帧序）排列
+    return [selected[i] for i in order], [sizes[i] for i in order]
+
+
+def coverage(features, selected):
+    """覆盖度：每张图片到最近入选帧的特征距离（平均/95分位/最大），越小说明子集越能代表全集"""
+    dist, _ = nearest_distances(features, features[selected])
+    return {'mean': float(dist.mean()), 'p95': float(np.percentile(dist, 95)), 'max': float(dist.max())}
+
+
+def random_coverage(features, n, trials=20, seed=0):
+    """同样大小随机子集的覆盖度（多次抽样取平均），作为对照"""
+    rng = np.random.default_rng(seed)
+    stats = [coverage(features, rng.choice(len(features), n, replace=False)) for _ in range(trials)]
+    return {key: float(np.mean([s[key] for s in stats])) for key in stats[0]}
+
+
+def calibration_cost_ms(onnx_path, image_paths, samples=5):
+    """单张图片的校准开销估计（letterbox预处理 + 一次onnxruntime推理），毫秒"""
+    from rk3588_eval_utils import create_cpu_session, load_input_tensor, onnx_input_dtype, session_input_size
+
+    session = create_cpu_session(onnx_path)
+    input_name = session.get_inputs()[0].name
+    img_size, dtype = session_input_size(session), onnx_input_dtype(session)
+    session.run(None, {input_name: load_input_tensor(image_paths[0], img_size, dtype)})  # 预热
+    start = time.perf_counter()
+    for path in image_paths[:samples]:
+        session.run(None, {input_name: load_input_tensor(path, img_size, dtype)})
+    return (time.perf_counter() - start) * 1000 / min(samples, len(image_paths))
+
+
+def build_calib_subset(image_dir, n=32, output=None, workers=None, seed=0, onnx_path=None):
+    """构建多样性校准子集并写出清单，返回清单字典"""
+    image_dir = Path(image_dir)
+    output = Path(output) if output else image_dir.parent / f"calib_subset_{n}.json"
+    images = list_images(image_dir)
+    if not images:
+        raise ValueError(f"未找到图片: {image_dir}")
+
+    print(f"📦 计算图片特征: {len(images)} 张 ({EMBEDDING})")
+    start = time.perf_counter()
+    paths, features = compute_embeddings(images, workers)
+    embed_s = time.perf_counter() - start
+    selected, sizes = select_diverse(features, n, seed)
+    build_s = time.perf_counter() - start
+    print(f"✓ 特征 {embed_s:.2f} s, 聚类选取 {len(selected)} 帧 {build_s - embed_s:.2f} s")
+
+    partial = len(selected) < len(paths)
+    manifest = {
+        'source': os.path.relpath(image_dir, output.parent),
+        'total_images': len(paths),
+        'selected': len(selected),
+        'method': 'kmeans',
+        'embedding': EMBEDDING,
+        'seed': seed,
+        'images': [os.path.relpath(paths[i], output.parent) for i in selected],
+        'cluster_sizes': sizes,
+        'coverage': coverage(features, selected),
+        'random_coverage': random_coverage(features, len(selected), seed=seed) if partial else None,
+        'build_s': build_s,
+    }
+    if onnx_path:
+        per_image_ms = calibration_cost_ms(onnx_path, paths)
+        manifest['calibration'] = {
+            'per_image_ms': per_image_ms,
+            'full_s': per_image_ms * len(paths) / 1000,
+            'subset_s': per_image_ms * len(selected) / 1000,
+            'saved_s': per_image_ms * (len(paths) - len(selected)) / 1000 - build_s,
+        }
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    manifest['path'] = str(output)
+    return manifest
+
+
+def format_summary(manifest):
+    """格式化覆盖度与耗时汇总"""
+    cov, rnd = manifest['coverage'], manifest['random_coverage']
+    lines = [f"📊 校准子集: {manifest['selected']}/{manifest['total_images']} 张 "
+             f"({manifest['selected'] / manifest['total_images']:.1%})，每帧代表 "
+             f"{min(manifest['cluster_sizes'])}~{max(manifest['cluster_sizes'])} 张",
+             f"  覆盖距离(越小越好)  {'平均':>8}{'P95':>8}{'最大':>8}",
+             f"  多样性子集          {cov['mean']:>8.3f}{cov['p95']:>8.3f}{cov['max']:>8.3f}"]
+    if rnd:
+        lines.append(f"  随机子集(20次平均)  {rnd['mean']:>8.3f}{rnd['p95']:>8.3f}{rnd['max']:>8.3f}")
+    calib = manifest.get('calibration')
+    if calib:
+        lines.append(f"⏱️ 校准估计 ({calib['per_image_ms']:.1f} ms/张): 全量 {calib['full_s']:.1f} s → "
+                     f"子集 {calib['subset_s']:.1f} s，扣除构建 {manifest['build_s']:.1f} s 后节省 {calib['saved_s']:.1f} s")
+    else:
+        lines.append(f"⏱️ 构建耗时 {manifest['build_s']:.1f} s，校准图片减少 "
+                     f"{1 - manifest['selected'] / manifest['total_images']:.0%}（--onnx 给出模型可估计节省的校准时间）")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pick a diverse calibration subset by clustering cheap image '
+                                                 'embeddings and write a manifest for quantization/parity tools')
+    parser.add_argument('--images', default=str(DEFAULT_TRAIN_DIR),
+                        help='Image folder (default: datasets/temp/images/train)')
+    parser.add_argument('-n', '--num', type=int, default=32, help='Frames to select (default: 32)')
+    parser.add_argument('-o', '--output', help='Manifest path (default: <images>/../calib_subset_<n>.json)')
+    parser.add_argument('--workers', type=int, help='Embedding worker processes (default: CPU count)')
+    parser.add_argument('--seed', type=int, default=0, help='k-means / random baseline seed (default: 0)')
+    parser.add_argument('--onnx', help='Optional ONNX model to estimate calibration time saved')
+    args = parser.parse_args()
+
+    manifest = build_calib_subset(args.images, args.num, args.output, args.workers, args.seed, args.onnx)
+    print(f"\n{format_summary(manifest)}")
+    print(f"📝 清单已保存: {manifest['path']}")
+    print(f"💡 python rk3588_quantize.py <fp32.onnx> --calib-dir {manifest['path']}")
+
+
+if __name__ == "__main__":
+    main()
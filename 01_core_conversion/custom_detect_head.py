@@ -11,11 +11,113 @@ from ultralytics.utils.tal import dist2bbox, make_anchors
 import copy
 
 
+# DFL期望值（16个bin上的softmax加权和）的图内实现：
+#   conv      view → transpose → softmax → 固定权重conv1x1（yolov8_train_inf.md原始写法）
+#   reducesum view → softmax → 乘arange常量 → ReduceSum，无Transpose与Conv
+#   matmul    view → softmax → 与投影向量MatMul，无Transpose
+# 三者输出均为 [batch, 1, 4, H*W]，数值只差浮点舍入
+DFL_MODES = ('conv', 'reducesum', 'matmul')
+
+
+def dfl_expectation(reg_feat, mode='conv', conv1x1=None, reg_max=16):
+    """
+    回归分支输出 [batch, 4*reg_max, H, W] → DFL期望距离 [batch, 1, 4, H*W]
+    mode见DFL_MODES，conv模式需要传入权重为arange的conv1x1
+    """
+    if mode not in DFL_MODES:
+        raise ValueError(f"未知的DFL实现: {mode}，可选 {', '.join(DFL_MODES)}")
+    batch = reg_feat.shape[0]
+    dist = reg_feat.view(batch, 4, reg_max, -1)  # [batch, 4, 16, H*W]
+    if mode == 'conv':
+        return conv1x1(dist.transpose(2, 1).softmax(1))  # [batch, 16, 4, H*W] → [batch, 1, 4, H*W]
+    project = torch.arange(reg_max, dtype=reg_feat.dtype, device=reg_feat.device)
+    if mode == 'reducesum':
+        expectation = (dist.softmax(2) * project.view(1, 1, reg_max, 1)).sum(2)  # [batch, 4, H*W]
+    else:
+        expectation = torch.matmul(project.view(1, 1, 1, reg_max), dist.softmax(2))  # [batch, 4, 1, H*W]
+    return expectation.view(batch, 1, 4, -1)
+
+
+def decode_dist_boxes(dist, height, width, stride):
+    """
+    图内框解码：DFL后的ltrb距离 [batch, 1, 4, H*W] → 输入像素坐标xyxy [batch, 1, 4, H*W]
+    anchor网格在导出时按特征图尺寸固化为常量，主机端无需再构建网格
+    """
+    sy, sx = torch.meshgrid(torch.arange(height, dtype=dist.dtype, device=dist.device) + 0.5,
+                            torch.arange(width, dtype=dist.dtype, device=dist.device) + 0.5, indexing='ij')
+    anchor_points = torch.stack((sx, sy)).view(1, 1, 2, height * width)  # [1, 1, 2, H*W] (x, y)
+    lt, rb = dist[:, :, :2], dist[:, :, 2:]
+    return torch.cat((anchor_points - lt, anchor_points + rb), 2) * stride
+
+
+def select_topk_candidates(boxes, logits, k):
+    """
+    图内TopK候选预筛选：按每个anchor的最大类别分数取前k个
+    boxes: 各尺度xyxy框 [batch, 1, 4, H*W] 列表，logits: 各尺度cls [batch, nc, H, W] 列表
+    返回 boxes [batch, k, 4]、scores [batch, k]（sigmoid后）、class_ids [batch, k]
+    """
+    boxes = torch.cat([b[:, 0] for b in boxes], 2)  # [batch, 4, N]
+    logits = torch.cat([c.flatten(2) for c in logits], 2)  # [batch, nc, N]
+    # sigmoid单调，先在logits上取max/TopK，只对k个候选做sigmoid
+    max_logits, class_ids = logits.max(1)  # [batch, N]
+    top_logits, index = max_logits.topk(min(k, max_logits.shape[1]), dim=1)
+    top_boxes = boxes.gather(2, index.unsqueeze(1).expand(-1, 4, -1)).transpose(1, 2)
+    return top_boxes, top_logits.sigmoid(), class_ids.gather(1, index)
+
+
+# 导出输出布局：
+#   rk3588       每尺度 reg [batch, 1, 4, H*W] + cls [batch, nc, H, W]（RKNN默认）
+#   anchor_major 每尺度 reg [batch, H*W, 4] + cls [batch, H*W, nc]，主机端按anchor连续读取无需转置
+#   concat       各尺度anchor-major拼接为 reg [batch, N, 4] + cls [batch, N, nc] 两个输出
+OUTPUT_LAYOUTS = ('rk3588', 'anchor_major', 'concat')
+
+
+def arrange_outputs(regs, logits, layout='rk3588'):
+    """
+    按导出布局排列各尺度输出
+    regs: 各尺度 [batch, 1, 4, H*W]（ltrb距离或xyxy框），logits: 各尺度 [batch, nc, H, W]
+    """
+    if layout not in OUTPUT_LAYOUTS:
+        raise ValueError(f"未知的输出布局: {layout}，可选 {', '.join(OUTPUT_LAYOUTS)}")
+    if layout == 'rk3588':
+        return [t for pair in zip(regs, logits) for t in pair]
+    regs = [r[:, 0].transpose(1, 2) for r in regs]  # [batch, H*W, 4]
+    logits = [c.flatten(2).transpose(1, 2) for c in logits]  # [batch, H*W, nc]
+    if layout == 'concat':
+        return [torch.cat(regs, 1), torch.cat(logits, 1)]
+    return [t for pair in zip(regs, logits) for t in pair]
+
+
+def prune_class_channels(detect_head, keep_classes):
+    """
+    类别子集裁剪：各尺度cv3最后一层Conv2d只保留keep_classes对应的输出通道
+    clsN随之变为 [batch, len(keep_classes), H, W]，通道i对应原始类别keep_classes[i]
+    """
+    keep = [int(c) for c in keep_classes]
+    if not keep or len(set(keep)) != len(keep) or min(keep) < 0 or max(keep) >= detect_head.nc:
+        raise ValueError(f"无效的类别子集 {keep}，类别ID需在0~{detect_head.nc - 1}之间且不重复")
+    index = torch.tensor(keep)
+    for branch in detect_head.cv3:
+        conv = branch[-1]
+        pruned = nn.Conv2d(conv.in_channels, len(keep), conv.kernel_size, conv.stride, conv.padding,
+                           bias=conv.bias is not None).requires_grad_(False)
+        pruned.weight.data = conv.weight.data[index].clone()
+        if conv.bias is not None:
+            pruned.bias.data = conv.bias.data[index].clone()
+        branch[-1] = pruned
+    detect_head.nc = len(keep)
+    detect_head.no = detect_head.nc + detect_head.reg_max * 4
+    return keep
+
+
 class RK3588DetectHead(nn.Module):
     """为RK3588优化的检测头 - 继承自YOLOv8 Detect"""
     
-    def __init__(self, nc=80, ch=()):
-        """初始化RK3588优化的检测头"""
+    def __init__(self, nc=80, ch=(), decode_boxes=False, layout='rk3588', dfl='conv'):
+        """
+        初始化RK3588优化的检测头，decode_boxes=True时reg输出替换为解码后的xyxy框，
+        layout见OUTPUT_LAYOUTS，dfl为DFL期望值的图内实现（见DFL_MODES）
+        """
         super().__init__()
         self.nc = nc  # 类别数
         self.nl = len(ch)  # 检测层数
@@ -51,6 +153,9 @@ class RK3588DetectHead(nn.Module):
         # 导出模式标志
         self.export_mode = False
         self.export_format = 'rk3588'  # 可以是 'rk3588' 或 'standard'
+        self.decode_boxes = decode_boxes
+        self.layout = layout
+        self.dfl_mode = dfl
     
     def forward(self, x):
         """前向传播"""
@@ -60,8 +165,8 @@ class RK3588DetectHead(nn.Module):
             return self.forward_standard(x)
     
     def forward_rk3588(self, x):
-        """RK3588优化的前向传播 - 导出6个输出"""
-        y = []
+        """RK3588优化的前向传播 - 导出 (regN或boxN, clsN)，排列方式由self.layout决定"""
+        regs, logits = [], []
         for i in range(self.nl):
             # 获取回归和分类特征
             reg_feat = self.cv2[i](x[i])  # [batch, 64, H, W]
@@ -69,14 +174,15 @@ class RK3588DetectHead(nn.Module):
             
             # 处理回归输出 - 应用DFL
             batch, _, h, w = reg_feat.shape
-            reg_feat = reg_feat.view(batch, 4, 16, -1).transpose(2, 1).softmax(1)
-            reg_output = self.conv1x1(reg_feat)  # [batch, 1, 4, H*W]
+            reg_output = dfl_expectation(reg_feat, self.dfl_mode, self.conv1x1, self.reg_max)  # [batch, 1, 4, H*W]
+            if self.decode_boxes:
+                reg_output = decode_dist_boxes(reg_output, h, w, float(self.stride[i]))
             
             # 添加到输出
-            y.append(reg_output)
-            y.append(cls_feat)
+            regs.append(reg_output)
+            logits.append(cls_feat)
         
-        return y
+        return arrange_outputs(regs, logits, self.layout)
     
     def forward_standard(self, x):
         """标准YOLOv8前向传播"""
@@ -110,8 +216,12 @@ class RK3588DetectHead(nn.Module):
         self.export_format = format
 
 
-def replace_detect_head(model, export_format='rk3588'):
-    """替换模型的检测头为RK3588优化版本"""
+def replace_detect_head(model, export_format='rk3588', decode_boxes=False, keep_classes=None, layout='rk3588',
+                        dfl='conv'):
+    """
+    替换模型的检测头为RK3588优化版本，keep_classes给出时只保留这些类别的cls通道，
+    layout见OUTPUT_LAYOUTS，dfl见DFL_MODES
+    """
     # 找到Detect层
     detect_layer = None
     detect_index = -1
@@ -128,13 +238,17 @@ def replace_detect_head(model, export_format='rk3588'):
     # 创建新的检测头
     nc = detect_layer.nc
     ch = [detect_layer.cv2[i][0].conv.in_channels for i in range(detect_layer.nl)]
-    new_detect = RK3588DetectHead(nc=nc, ch=ch)
+    new_detect = RK3588DetectHead(nc=nc, ch=ch, decode_boxes=decode_boxes, layout=layout, dfl=dfl)
     
     # 复制权重
     new_detect.cv2.load_state_dict(detect_layer.cv2.state_dict())
     new_detect.cv3.load_state_dict(detect_layer.cv3.state_dict())
     new_detect.dfl.load_state_dict(detect_layer.dfl.state_dict())
     new_detect.stride = detect_layer.stride
+    # ultralytics按f/i/type路由各层输入与保存输出
+    new_detect.f, new_detect.i, new_detect.type = detect_layer.f, detect_layer.i, detect_layer.type
+    if keep_classes:
+        prune_class_channels(new_detect, keep_classes)
     
     # 设置导出模式
     new_detect.set_export_mode(True, export_format)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+DFL实现对比
+用 conv / reducesum / matmul 三种DFL期望值实现分别导出同一模型，
+在验证图片上确认各变体与conv（原始写法）的全部输出一致，并比较：
+- onnxruntime CPU单次推理延迟（默认图优化）
+- 逐算子profiling中reg分支与解码/后处理区段的耗时（各尺度DFL归入对应的reg分支）
+- 检测头相关算子的节点数（Transpose/Softmax/Conv/ReduceSum/MatMul...）
+"""
+
+import argparse
+from pathlib import Path
+
+from simple_rk3588_export import export_rk3588_onnx
+from custom_detect_head import DFL_MODES
+from rk3588_eval_utils import (DEFAULT_VAL_DIR, count_onnx_ops, create_cpu_session, list_images, load_input_tensor,
+                               measure_latency, onnx_input_dtype, output_error, random_feed)
+from rk3588_profile import HEAD_POST, profile_onnx
+
+# 节点数对比中列出的算子（各DFL实现的差异都落在这些算子上）
+DFL_OPS = ('Transpose', 'Softmax', 'Conv', 'Mul', 'ReduceSum', 'MatMul', 'Reshape')
+
+
+def dfl_section_ms(profile):
+    """profiling报告中各reg分支与解码/后处理区段的耗时合计(ms)，DFL变体之间的差异都落在这些区段内"""
+    return sum(row['ms'] for name, row in profile['by_section'].items() if name.startswith('reg') or name == HEAD_POST)
+
+
+def compare_outputs(reference_session, session, images, img_size):
+    """在图片上对比两个模型的全部输出，返回 {输出名: (最大绝对误差, 最小余弦)}"""
+    dtype = onnx_input_dtype(session)
+    input_name = session.get_inputs()[0].name
+    names = [o.name for o in session.get_outputs()]
+    errors = {name: (0.0, 1.0) for name in names}
+    feeds = [{input_name: load_input_tensor(p, img_size, dtype)} for p in images] or [random_feed(session, img_size=img_size)]
+    for feed in feeds:
+        for name, ref, out in zip(names, reference_session.run(None, feed), session.run(None, feed)):
+            max_abs, cosine = output_error(ref, out)
+            errors[name] = (max(errors[name][0], max_abs), min(errors[name][1], cosine))
+    return errors
+
+
+def benchmark_dfl(model_path, modes=DFL_MODES, img_size=640, val_dir=None, out_dir=None, max_images=10,
+                  runs=50, profile_runs=20, atol=1e-4, **export_kwargs):
+    """逐DFL实现导出并评估，返回 (结果行列表, 输出目录)，第一个实现作为一致性参考"""
+    model_path = Path(model_path)
+    out_dir = Path(out_dir) if out_dir else model_path.parent / f"{model_path.stem}_dfl"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    images = list_images(val_dir or DEFAULT_VAL_DIR, max_images)
+    if not images:
+        print(f"⚠️ 未找到验证图片，改用随机输入做一致性检查: {val_dir or DEFAULT_VAL_DIR}")
+
+    rows = []
+    reference = None
+    for mode in modes:
+        print(f"\n{'=' * 20} DFL: {mode} {'=' * 20}")
+        try:
+            onnx_path = export_rk3588_onnx(str(model_path), str(out_dir / f"{model_path.stem}_dfl_{mode}.onnx"),
+                                           img_size=img_size, reports=False, ort_artifact=False, profile_runs=0, dfl=mode,
+                                           **export_kwargs)
+        except (ValueError, RuntimeError) as e:
+            print(f"❌ DFL={mode} 导出失败，跳过: {e}")
+            continue
+        session = create_cpu_session(onnx_path)
+        if reference is None:
+            reference = (mode, session)
+            errors = {o.name: (0.0, 1.0) for o in session.get_outputs()}
+        else:
+            errors = compare_outputs(reference[1], session, images, img_size)
+        max_abs = max(e[0] for e in errors.values())
+        latency = measure_latency(session, random_feed(session, img_size=img_size), warmup=5, runs=runs)
+        profile = profile_onnx(onnx_path, runs=profile_runs, top_k=0) if profile_runs else None
+        ops = count_onnx_ops(onnx_path)
+        row = {
+            'dfl': mode,
+            'max_abs_vs_ref': max_abs,
+            'identical': max_abs <= atol,
+            'latency_ms': latency,
+            'dfl_section_ms': dfl_section_ms(profile) if profile else None,
+            'nodes': sum(ops.values()),
+            'ops': {op: ops[op] for op in DFL_OPS},
+            'onnx_path': str(onnx_path),
+        }
+        rows.append(row)
+        status = '✓' if row['identical'] else '❌'
+        print(f"📊 DFL={mode}: 延迟 {latency:.2f} ms, 与{reference[0]}最大误差 {max_abs:.2e} {status}")
+    return rows, out_dir
+
+
+def write_table(rows, out_dir, atol=1e-4):
+    """写出Markdown对比表，返回文件路径"""
+    md_path = Path(out_dir) / "dfl_benchmark.md"
+    base = rows[0]['latency_ms'] if rows else None
+    lines = [
+        f"| DFL | 与{rows[0]['dfl'] if rows else '参考'}最大误差 | 一致(≤{atol:g}) | CPU延迟(ms) | 相对 | "
+        f"reg分支+解码/后处理(ms) | 节点数 | " + " | ".join(DFL_OPS) + " |",
+        "|:---|---:|:---:|---:|---:|---:|---:|" + "---:|" * len(DFL_OPS),
+    ]
+    for row in rows:
+        section_ms = '-' if row['dfl_section_ms'] is None else f"{row['dfl_section_ms']:.3f}"
+        lines.append(f"| {row['dfl']} | {row['max_abs_vs_ref']:.2e} | {'✓' if row['identical'] else '✗'} | "
+                     f"{row['latency_ms']:.2f} | {base / row['latency_ms']:.2f}x | {section_ms} | {row['nodes']} | "
+                     + " | ".join(str(row['ops'][op]) for op in DFL_OPS) + " |")
+    md_path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    return md_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export each DFL implementation, check identical outputs and '
+                                                 'compare onnxruntime latency')
+    parser.add_argument('model', help='Path to YOLOv8 model (.pt file)')
+    parser.add_argument('--modes', nargs='+', choices=DFL_MODES, default=list(DFL_MODES),
+                        help='DFL implementations to compare; the first is the parity reference (default: all)')
+    parser.add_argument('--imgsz', type=int, default=640, help='Input size (default: 640)')
+    parser.add_argument('--val-dir', default=str(DEFAULT_VAL_DIR), help='Images for the output parity check')
+    parser.add_argument('--max-images', type=int, default=10, help='Parity check images (default: 10)')
+    parser.add_argument('--out-dir', help='Output folder (default: <model>_dfl next to the .pt)')
+    parser.add_argument('--runs', type=int, default=50, help='Timed onnxruntime runs per variant (default: 50)')
+    parser.add_argument('--profile-runs', type=int, default=20,
+                        help='Profiled runs for the reg-branch and decode/post-process section time; '
+                             '0 disables (default: 20)')
+    parser.add_argument('--atol', type=float, default=1e-4, help='Max abs difference counted as identical (default: 1e-4)')
+    parser.add_argument('--decode-boxes', action='store_true', help='Export with in-graph box decoding')
+    args = parser.parse_args()
+
+    rows, out_dir = benchmark_dfl(args.model, args.modes, args.imgsz, args.val_dir, args.out_dir, args.max_images,
+                                  args.runs, args.profile_runs, args.atol, decode_boxes=args.decode_boxes)
+    if not rows:
+        print("❌ 没有导出成功的DFL实现")
+        return
+    md_path = write_table(rows, out_dir, args.atol)
+    print(f"\n{md_path.read_text(encoding='utf-8')}")
+    print(f"📝 结果已保存: {md_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+RK3588导出缓存
+以.pt文件内容哈希 + 导出参数为键的磁盘缓存，参数未变时直接复用已导出的ONNX
+缓存条目按最长保存天数与总大小上限淘汰（最久未使用的先淘汰）
+"""
+
+import hashlib
+import json
+import shutil
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "rk3588_export"
+DEFAULT_MAX_SIZE_MB = 2048
+DEFAULT_MAX_AGE_DAYS = 30
+MANIFEST_NAME = "manifest.json"
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """计算文件内容的SHA256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExportCache:
+    """内容寻址的导出缓存：每个键对应一个目录，保存导出产物与manifest"""
+
+    def __init__(self, cache_dir=None, max_size_mb=DEFAULT_MAX_SIZE_MB, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.max_age_seconds = max_age_days * 24 * 3600
+
+    def make_key(self, model_path, settings):
+        """键 = .pt内容哈希 + 排序后的导出参数"""
+        payload = {
+            'model_sha256': file_sha256(model_path),
+            'settings': settings,
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _entry_dir(self, key):
+        return self.cache_dir / key
+
+    def restore(self, key, targets):
+        """
+        命中时将缓存产物复制到targets指定的路径 {角色: 目标路径}，返回是否命中
+        缓存中缺少任一角色视为未命中
+        """
+        entry = self._entry_dir(key)
+        manifest_path = entry / MANIFEST_NAME
+        if not manifest_path.exists():
+            return False
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return False
+        files = manifest.get('files', {})
+        if any(role not in files or not (entry / files[role]).exists() for role in targets):
+            return False
+
+        for role, target in targets.items():
+            Path(target).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(entry / files[role], target)
+        # 更新使用时间，供LRU淘汰
+        manifest_path.touch()
+        return True
+
+    def store(self, key, artifacts, settings=None):
+        """
+        保存导出产物 {角色: 文件路径}
+        ONNX的外部权重会合并进单个文件，避免复制到新文件名后找不到.data
+        """
+        import onnx
+
+        entry = self._entry_dir(key)
+        tmp_entry = entry.with_name(entry.name + ".tmp")
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        tmp_entry.mkdir(parents=True)
+
+        files = {}
+        for role, path in artifacts.items():
+            name = f"{role}.onnx"
+            onnx.save(onnx.load(str(path)), str(tmp_entry / name))
+            files[role] = name
+        with open(tmp_entry / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+            json.dump({'files': files, 'settings': settings, 'created': time.time()}, f,
+                      indent=2, ensure_ascii=False, default=str)
+
+        shutil.rmtree(entry, ignore_errors=True)
+        tmp_entry.rename(entry)
+        self.evict()
+
+    def evict(self):
+        """淘汰过期条目，再按最久未使用顺序淘汰直到总大小不超过上限"""
+        if not self.cache_dir.exists():
+            return
+        now = time.time()
+        entries = []
+        for entry in self.cache_dir.iterdir():
+            manifest_path = entry / MANIFEST_NAME
+            if not entry.is_dir() or not manifest_path.exists():
+                continue
+            last_used = manifest_path.stat().st_mtime
+            if now - last_used > self.max_age_seconds:
+                shutil.rmtree(entry, ignore_errors=True)
+                continue
+            size = sum(p.stat().st_size for p in entry.iterdir() if p.is_file())
+            entries.append((last_used, size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total <= self.max_size_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
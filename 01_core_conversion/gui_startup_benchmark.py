@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+导出GUI冷启动基准
+以 python -X importtime 启动rk3588_export_gui.py（基准模式：就绪后自动退出），记录：
+- 窗口出现耗时（time-to-window）与torch/ultralytics加载完成耗时（time-to-ready）
+- 窗口出现前/后导入的顶层模块及其累计导入耗时（解析-X importtime输出）
+窗口出现后导入的耗时即为改为后台加载前窗口需要多等待的时间，需要图形显示环境
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from rk3588_export_gui import STARTUP_BENCH_ENV
+
+GUI_SCRIPT = Path(__file__).resolve().parent / "rk3588_export_gui.py"
+
+
+def parse_startup_log(stderr_text):
+    """
+    解析一次启动的stderr
+    返回 {'marks': {阶段: 毫秒}, 'imports': {阶段: [(模块, 累计毫秒), ...]}}，
+    imports按导入发生在哪个启动阶段之前分组（'window'/'ready'），只统计顶层导入
+    """
+    marks = {}
+    imports = {'window': [], 'ready': []}
+    for line in stderr_text.splitlines():
+        if line.startswith('STARTUP '):
+            _, stage, ms = line.split()
+            marks[stage] = float(ms)
+        elif line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if not cumulative.strip().isdigit():
+                continue  # 表头
+            # 嵌套导入每层多缩进两个空格，顶层导入名前只有一个空格
+            if len(name) - len(name.lstrip()) > 1:
+                continue
+            stage = 'window' if 'window' not in marks else 'ready'
+            if 'ready' not in marks:
+                imports[stage].append((name.strip(), int(cumulative) / 1000.0))
+    return {'marks': marks, 'imports': imports}
+
+
+def run_startup(timeout=120):
+    """以基准模式启动一次GUI，返回parse_startup_log结果"""
+    env = dict(os.environ, **{STARTUP_BENCH_ENV: '1'})
+    result = subprocess.run([sys.executable, '-X', 'importtime', str(GUI_SCRIPT)], env=env,
+                            capture_output=True, text=True, timeout=timeout, cwd=str(GUI_SCRIPT.parent))
+    parsed = parse_startup_log(result.stderr)
+    if 'window' not in parsed['marks']:
+        tail = '\n'.join(result.stderr.strip().splitlines()[-5:])
+        raise RuntimeError(f"GUI未能启动（需要图形显示环境）:\n{tail}")
+    return parsed
+
+
+def summarize_runs(runs, top_k=8):
+    """多次启动取中位数，并列出窗口前后耗时最多的顶层导入（取首次冷启动）"""
+    summary = {}
+    for stage in ('window', 'ready'):
+        values = [run['marks'][stage] for run in runs if stage in run['marks']]
+        summary[f'time_to_{stage}_ms'] = float(np.median(values)) if values else None
+    first = runs[0]['imports']
+    summary['imports_before_window_ms'] = sum(ms for _, ms in first['window'])
+    summary['imports_after_window_ms'] = sum(ms for _, ms in first['ready'])
+    summary['top_before_window'] = sorted(first['window'], key=lambda item: item[1], reverse=True)[:top_k]
+    summary['top_after_window'] = sorted(first['ready'], key=lambda item: item[1], reverse=True)[:top_k]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure export GUI time-to-window and time-to-ready via -X importtime')
+    parser.add_argument('--runs', type=int, default=3, help='GUI launches; the first one is the coldest (default: 3)')
+    parser.add_argument('--top-k', type=int, default=8, help='Heaviest top-level imports to list (default: 8)')
+    parser.add_argument('--output', help='Optional JSON file for the results')
+    args = parser.parse_args()
+
+    runs = []
+    for i in range(args.runs):
+        try:
+            runs.append(run_startup())
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            print(f"❌ 第 {i + 1} 次启动失败: {e}")
+            return
+        marks = runs[-1]['marks']
+        print(f"⏱️ 第 {i + 1} 次: 窗口 {marks['window']:.0f} ms, 就绪 {marks.get('ready', float('nan')):.0f} ms")
+
+    summary = summarize_runs(runs, args.top_k)
+    print(f"\n📊 导出GUI启动 ({args.runs} 次中位数):")
+    print(f"  窗口出现: {summary['time_to_window_ms']:.0f} ms")
+    if summary['time_to_ready_ms'] is not None:
+        print(f"  依赖就绪: {summary['time_to_ready_ms']:.0f} ms")
+    print(f"  窗口前顶层导入: {summary['imports_before_window_ms']:.0f} ms")
+    for name, ms in summary['top_before_window']:
+        print(f"    {name:<32}{ms:>9.1f} ms")
+    print(f"  窗口后（后台线程）顶层导入: {summary['imports_after_window_ms']:.0f} ms")
+    for name, ms in summary['top_after_window']:
+        print(f"    {name:<32}{ms:>9.1f} ms")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'runs': runs, 'summary': summary}, f, indent=2, ensure_ascii=False)
+        print(f"📝 结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
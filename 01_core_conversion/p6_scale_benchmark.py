@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+P6（四尺度）模型导出对比
+对每个输入尺寸分别导出全部尺度（8输出）与只保留P3-P5（6输出，等同旧版截断导出）两种模型，
+测量CPU延迟，并以PT模型检测结果为参考，按目标尺寸（small/medium/large）统计召回，
+用于权衡P6检测头与更高分辨率带来的延迟和小目标召回
+"""
+
+import argparse
+from pathlib import Path
+
+import cv2
+from ultralytics import YOLO
+
+from simple_rk3588_export import export_rk3588_onnx
+from rk3588_eval_utils import (DEFAULT_VAL_DIR, SIZE_BUCKETS, create_cpu_session, detection_agreement, list_images,
+                               measure_latency, onnx_detect, pt_detect, random_feed, recall_by_size)
+
+DEFAULT_SIZES = (640, 1280)
+
+
+def benchmark_scales(model_path, sizes=DEFAULT_SIZES, val_dir=None, out_dir=None, ref_size=None,
+                     conf_threshold=0.25, iou_threshold=0.5, max_images=None):
+    """逐尺寸导出全部尺度与前3个尺度两种模型并评估，返回结果行列表与输出目录"""
+    model_path = Path(model_path)
+    out_dir = Path(out_dir) if out_dir else model_path.parent / f"{model_path.stem}_scales"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    images = list_images(val_dir or DEFAULT_VAL_DIR, max_images)
+    if not images:
+        raise ValueError(f"未找到验证图片: {val_dir or DEFAULT_VAL_DIR}")
+
+    pt_model = YOLO(str(model_path))
+    num_scales = pt_model.model.model[-1].nl
+    variants = [(num_scales, None)]
+    if num_scales > 3:
+        variants.append((3, 3))
+    else:
+        print(f"⚠️ {model_path.name} 只有 {num_scales} 个尺度，仅评估完整导出")
+
+    # PT参考结果（完整检测头）只计算一次
+    ref_size = ref_size or max(sizes)
+    print(f"📦 PT参考推理 (imgsz={ref_size}, {len(images)} 张图片)")
+    frames = [cv2.imread(str(p)) for p in images]
+    pt_dets = [pt_detect(pt_model, frame, ref_size, conf_threshold) for frame in frames]
+
+    rows = []
+    for size in sizes:
+        for scales, max_scales in variants:
+            print(f"\n{'=' * 20} 尺寸 {size}, {scales} 个尺度 {'=' * 20}")
+            try:
+                onnx_path = export_rk3588_onnx(str(model_path),
+                                               str(out_dir / f"{model_path.stem}_{size}_s{scales}.onnx"),
+                                               img_size=size, reports=False, ort_artifact=False, max_scales=max_scales,
+                                               profile_runs=0)
+            except (ValueError, RuntimeError) as e:
+                print(f"❌ 尺寸 {size} ({scales} 个尺度) 导出失败，跳过: {e}")
+                continue
+            session = create_cpu_session(onnx_path)
+            latency = measure_latency(session, random_feed(session, img_size=size))
+            onnx_dets = [onnx_detect(session, frame, conf_threshold) for frame in frames]
+            agreement = detection_agreement(pt_dets, onnx_dets, iou_threshold)
+            buckets = recall_by_size(pt_dets, onnx_dets, iou_threshold)
+            row = {
+                'size': size,
+                'scales': scales,
+                'outputs': len(session.get_outputs()),
+                'latency_ms': round(latency, 2),
+                'recall': round(agreement['recall'], 4),
+                'precision': round(agreement['precision'], 4),
+                'onnx_path': str(onnx_path),
+            }
+            for name, _, _ in SIZE_BUCKETS:
+                row[f'recall_{name}'] = buckets[name]['recall']
+                row[f'ref_{name}'] = buckets[name]['ref_count']
+            rows.append(row)
+            print(f"📊 尺寸 {size}, {scales} 个尺度: 延迟 {latency:.2f} ms, 召回 {agreement['recall']:.3f} "
+                  f"(small {format_recall(row['recall_small'])})")
+    return rows, out_dir
+
+
+def format_recall(value):
+    """召回率显示，无参考目标时为 -"""
+    return '-' if value is None else f"{value:.4f}"
+
+
+def write_table(rows, out_dir):
+    """写出Markdown对比表，返回文件路径"""
+    md_path = Path(out_dir) / "p6_scale_benchmark.md"
+    lines = [
+        "| 尺寸 | 尺度数 | 输出数 | CPU延迟(ms) | 召回 | 精确 | small召回 | medium召回 | large召回 |",
+        "|---:|---:|---:|---:|---:|---:|---:|---:|---:|",
+    ]
+    for row in rows:
+        lines.append(f"| {row['size']} | {row['scales']} | {row['outputs']} | {row['latency_ms']:.2f} | "
+                     f"{row['recall']:.4f} | {row['precision']:.4f} | {format_recall(row['recall_small'])} | "
+                     f"{format_recall(row['recall_medium'])} | {format_recall(row['recall_large'])} |")
+    if rows:
+        lines.append("")
+        lines.append(f"参考目标数 (PT): small {rows[0]['ref_small']}, medium {rows[0]['ref_medium']}, "
+                     f"large {rows[0]['ref_large']}")
+    md_path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    return md_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare all-scale (8-output) vs P3-P5-only exports of a P6 model')
+    parser.add_argument('model', help='Path to a 4-scale YOLOv8 model (.pt file, e.g. yolov8n-p6)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='Input sizes (default: 640 1280)')
+    parser.add_argument('--val-dir', default=str(DEFAULT_VAL_DIR), help='Validation image folder')
+    parser.add_argument('--out-dir', help='Output folder (default: <model>_scales next to the .pt)')
+    parser.add_argument('--ref-size', type=int, help='PT reference inference size (default: largest --sizes)')
+    parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold (default: 0.25)')
+    parser.add_argument('--max-images', type=int, help='Use at most N validation images')
+    args = parser.parse_args()
+
+    rows, out_dir = benchmark_scales(args.model, args.sizes, args.val_dir, args.out_dir, args.ref_size,
+                                     args.conf, max_images=args.max_images)
+    md_path = write_table(rows, out_dir)
+    print(f"\n{md_path.read_text(encoding='utf-8')}")
+    print(f"📝 结果已保存: {md_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+RK3588输入分辨率扫描
+基于export_rk3588_onnx在多个尺寸下导出，测量CPU延迟以及与PT模型在验证集上的检测一致性，
+输出CSV与Markdown格式的Pareto表，用于挑选满足召回目标的最低成本分辨率
+"""
+
+import argparse
+import csv
+from pathlib import Path
+
+import cv2
+from ultralytics import YOLO
+
+from simple_rk3588_export import export_rk3588_onnx
+from rk3588_eval_utils import (DEFAULT_VAL_DIR, create_cpu_session, detection_agreement, list_images,
+                               measure_latency, onnx_detect, pt_detect, random_feed)
+
+DEFAULT_SIZES = (320, 416, 480, 544, 640)
+
+
+def mark_pareto(rows):
+    """标记Pareto最优点：不存在延迟更低且召回更高（至少一项严格更优）的其他尺寸"""
+    for row in rows:
+        row['pareto'] = not any(
+            other['latency_ms'] <= row['latency_ms'] and other['recall'] >= row['recall']
+            and (other['latency_ms'] < row['latency_ms'] or other['recall'] > row['recall'])
+            for other in rows if other is not row
+        )
+    return rows
+
+
+def sweep_resolutions(model_path, sizes=DEFAULT_SIZES, val_dir=None, out_dir=None, ref_size=640,
+                      conf_threshold=0.25, iou_threshold=0.5, max_images=None):
+    """逐尺寸导出并评估，返回结果行列表"""
+    model_path = Path(model_path)
+    out_dir = Path(out_dir) if out_dir else model_path.parent / f"{model_path.stem}_sweep"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    images = list_images(val_dir or DEFAULT_VAL_DIR, max_images)
+    if not images:
+        raise ValueError(f"未找到验证图片: {val_dir or DEFAULT_VAL_DIR}")
+
+    # PT参考结果只计算一次
+    print(f"📦 PT参考推理 (imgsz={ref_size}, {len(images)} 张图片)")
+    pt_model = YOLO(str(model_path))
+    frames = [cv2.imread(str(p)) for p in images]
+    pt_dets = [pt_detect(pt_model, frame, ref_size, conf_threshold) for frame in frames]
+
+    rows = []
+    for size in sizes:
+        print(f"\n{'=' * 20} 尺寸 {size} {'=' * 20}")
+        try:
+            onnx_path = export_rk3588_onnx(str(model_path), str(out_dir / f"{model_path.stem}_{size}.onnx"),
+                                           img_size=size, reports=False, ort_artifact=False, profile_runs=0)
+        except (ValueError, RuntimeError) as e:
+            print(f"❌ 尺寸 {size} 导出失败，跳过: {e}")
+            continue
+        session = create_cpu_session(onnx_path)
+        latency = measure_latency(session, random_feed(session, img_size=size))
+        onnx_dets = [onnx_detect(session, frame, conf_threshold) for frame in frames]
+        agreement = detection_agreement(pt_dets, onnx_dets, iou_threshold)
+        rows.append({
+            'size': size,
+            'latency_ms': round(latency, 2),
+            'recall': round(agreement['recall'], 4),
+            'precision': round(agreement['precision'], 4),
+            'pt_detections': agreement['ref_count'],
+            'onnx_detections': agreement['test_count'],
+            'onnx_path': str(onnx_path),
+        })
+        print(f"📊 尺寸 {size}: 延迟 {latency:.2f} ms, 召回 {agreement['recall']:.3f}, "
+              f"精确 {agreement['precision']:.3f}")
+    return mark_pareto(rows), out_dir
+
+
+def write_tables(rows, out_dir, recall_target):
+    """写出CSV与Markdown表，返回两个文件路径"""
+    fields = ['size', 'latency_ms', 'recall', 'precision', 'pt_detections', 'onnx_detections', 'pareto', 'onnx_path']
+    csv_path = Path(out_dir) / "resolution_sweep.csv"
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    md_path = Path(out_dir) / "resolution_sweep.md"
+    lines = [
+        "| 尺寸 | CPU延迟(ms) | 召回(vs PT) | 精确(vs PT) | PT检测数 | ONNX检测数 | Pareto |",
+        "|---:|---:|---:|---:|---:|---:|:---:|",
+    ]
+    for row in sorted(rows, key=lambda r: r['latency_ms']):
+        lines.append(f"| {row['size']} | {row['latency_ms']:.2f} | {row['recall']:.4f} | {row['precision']:.4f} | "
+                     f"{row['pt_detections']} | {row['onnx_detections']} | {'✓' if row['pareto'] else ''} |")
+    best = cheapest_meeting_target(rows, recall_target)
+    lines.append("")
+    if best:
+        lines.append(f"满足召回目标 {recall_target} 的最低延迟尺寸: **{best['size']}** ({best['latency_ms']:.2f} ms)")
+    else:
+        lines.append(f"没有尺寸满足召回目标 {recall_target}")
+    md_path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    return csv_path, md_path
+
+
+def cheapest_meeting_target(rows, recall_target):
+    """返回满足召回目标且延迟最低的结果行"""
+    candidates = [r for r in rows if r['recall'] >= recall_target]
+    return min(candidates, key=lambda r: r['latency_ms']) if candidates else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a model at several input sizes and build a latency/recall Pareto table')
+    parser.add_argument('model', help='Path to YOLOv8 model (.pt file)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='Input sizes to sweep')
+    parser.add_argument('--val-dir', default=str(DEFAULT_VAL_DIR), help='Validation image folder')
+    parser.add_argument('--out-dir', help='Output folder (default: <model>_sweep next to the .pt)')
+    parser.add_argument('--ref-size', type=int, default=640, help='PT reference inference size (default: 640)')
+    parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold (default: 0.25)')
+    parser.add_argument('--recall-target', type=float, default=0.95, help='Recall target vs PT (default: 0.95)')
+    parser.add_argument('--max-images', type=int, help='Use at most N validation images')
+    args = parser.parse_args()
+
+    rows, out_dir = sweep_resolutions(args.model, args.sizes, args.val_dir, args.out_dir, args.ref_size,
+                                      args.conf, max_images=args.max_images)
+    csv_path, md_path = write_tables(rows, out_dir, args.recall_target)
+    print(f"\n{md_path.read_text(encoding='utf-8')}")
+    print(f"📝 结果已保存: {csv_path}, {md_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+RK3588导出评估工具
+导出脚本与导出GUI共用的onnxruntime会话创建、CPU延迟测量与输出误差统计
+"""
+
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_VAL_DIR = PROJECT_ROOT / "datasets" / "temp" / "images" / "val"
+DEFAULT_TRAIN_DIR = PROJECT_ROOT / "datasets" / "temp" / "images" / "train"
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# 主机端预处理与对比器共用 02_validation_tools/rk3588_host_utils.py
+_VALIDATION_TOOLS_DIR = str(PROJECT_ROOT / "02_validation_tools")
+if _VALIDATION_TOOLS_DIR not in sys.path:
+    sys.path.append(_VALIDATION_TOOLS_DIR)
+
+
+def create_cpu_session(onnx_path):
+    """创建CPU推理会话"""
+    import onnxruntime as ort
+    return ort.InferenceSession(str(onnx_path), providers=['CPUExecutionProvider'])
+
+
+def onnx_input_dtype(session):
+    """返回模型输入对应的numpy数据类型，uint8表示NHWC BGR原始帧输入"""
+    input_type = session.get_inputs()[0].type
+    if 'uint8' in input_type:
+        return np.uint8
+    return np.float16 if 'float16' in input_type else np.float32
+
+
+def to_hw(img_size):
+    """将int或(h, w)形式的输入尺寸统一为(h, w)"""
+    return (img_size, img_size) if isinstance(img_size, int) else tuple(img_size)
+
+
+def random_feed(session, batch_size=None, img_size=None):
+    """按模型输入形状构造随机输入，动态维度使用给定的batch/尺寸"""
+    inp = session.get_inputs()[0]
+    dtype = onnx_input_dtype(session)
+    h, w = to_hw(img_size or 640)
+    defaults = [batch_size or 1, h, w, 3] if dtype == np.uint8 else [batch_size or 1, 3, h, w]
+    shape = [dim if isinstance(dim, int) else defaults[i] for i, dim in enumerate(inp.shape)]
+    if batch_size is not None:
+        shape[0] = batch_size
+    if dtype == np.uint8:
+        return {inp.name: np.random.randint(0, 256, shape, dtype=np.uint8)}
+    return {inp.name: np.random.rand(*shape).astype(dtype)}
+
+
+def measure_latency(session, feeds, warmup=3, runs=10):
+    """测量平均推理耗时，返回毫秒"""
+    for _ in range(warmup):
+        session.run(None, feeds)
+    start = time.perf_counter()
+    for _ in range(runs):
+        session.run(None, feeds)
+    return (time.perf_counter() - start) * 1000.0 / runs
+
+
+def count_onnx_ops(onnx_path):
+    """按算子类型统计ONNX图中的节点数"""
+    import onnx
+    model = onnx.load(str(onnx_path), load_external_data=False)
+    return Counter(node.op_type for node in model.graph.node)
+
+
+def onnx_size_mb(onnx_path):
+    """ONNX模型占用的磁盘大小(MB)，包含torch导出的外部权重文件"""
+    path = Path(onnx_path)
+    size = path.stat().st_size
+    external = path.with_name(path.name + ".data")
+    if external.exists():
+        size += external.stat().st_size
+    return size / 1024 / 1024
+
+
+def list_images(folder, limit=None):
+    """
+    按文件名排序列出目录中的图片，limit时取前N张；folder为calib_subset.py写出的清单(.json)时返回清单中的图片，
+    清单按帧序排列且每张代表一簇，limit小于清单长度时均匀间隔抽取并给出提示，而不是只取前N张
+    """
+    folder = Path(folder)
+    if folder.suffix == '.json' and folder.is_file():
+        import json
+        with open(folder, 'r', encoding='utf-8') as f:
+            images = [(folder.parent / p).resolve() for p in json.load(f)['images']]
+        if limit and limit < len(images):
+            print(f"⚠️ 清单 {folder.name} 有 {len(images)} 张图片，按上限 {limit} 均匀间隔抽取")
+            images = [images[i] for i in np.linspace(0, len(images) - 1, limit).round().astype(int)]
+        return images
+    if not folder.is_dir():
+        return []
+    images = sorted(p for p in folder.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    return images[:limit] if limit else images
+
+
+def load_input_tensor(image_path, img_size=640, dtype=np.float32):
+    """读取图片并按对比器的letterbox流程转换为模型输入"""
+    import cv2
+    from rk3588_host_utils import preprocess_image
+
+    image = cv2.imread(str(image_path))
+    if image is None:
+        raise ValueError(f"无法读取图片: {image_path}")
+    tensor, _, _ = preprocess_image(image, to_hw(img_size), dtype=dtype)
+    return tensor
+
+
+def session_input_size(session, default=640):
+    """从模型输入形状读取(H, W)，动态维度时使用默认尺寸"""
+    inp = session.get_inputs()[0]
+    h, w = inp.shape[1:3] if 'uint8' in inp.type else inp.shape[2:4]
+    return (h if isinstance(h, int) else default, w if isinstance(w, int) else default)
+
+
+def network_input_size(session):
+    """网络实际处理的(H, W)：图内letterbox模型取元数据中的imgsz，其余同session_input_size"""
+    from rk3588_host_utils import onnx_letterbox_metadata
+
+    lb = onnx_letterbox_metadata(session)
+    return lb[1] if lb else session_input_size(session)
+
+
+def onnx_detect(session, image, conf_threshold=0.25, iou_threshold=0.45):
+    """对单张BGR图片做ONNX推理，返回原图坐标系下的 (boxes, scores, class_ids)，配置取自模型元数据"""
+    from rk3588_host_utils import detect_onnx
+
+    return detect_onnx(session, image, conf_threshold, iou_threshold)
+
+
+def pt_detect(model, image, img_size=640, conf_threshold=0.25, iou_threshold=0.45):
+    """使用ultralytics PT模型推理，返回原图坐标系下的 (boxes, scores, class_ids)"""
+    result = model(image, imgsz=img_size, conf=conf_threshold, iou=iou_threshold, verbose=False)[0]
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64)
+    return (boxes.xyxy.cpu().numpy().astype(np.float32), boxes.conf.cpu().numpy().astype(np.float32),
+            boxes.cls.cpu().numpy().astype(np.int64))
+
+
+def output_error(reference, test):
+    """计算两个输出张量的最大绝对误差与余弦相似度"""
+    ref = np.asarray(reference, dtype=np.float64).ravel()
+    out = np.asarray(test, dtype=np.float64).ravel()
+    max_abs = float(np.abs(ref - out).max()) if ref.size else 0.0
+    denom = np.linalg.norm(ref) * np.linalg.norm(out)
+    cosine = float(np.dot(ref, out) / denom) if denom > 0 else 1.0
+    return max_abs, cosine
+
+
+def detection_agreement(ref_detections, test_detections, iou_threshold=0.5):
+    """
+    汇总多张图片上两组检测结果的一致性
+    recall: 参考检测被复现的比例，precision: 待测检测能对应到参考的比例
+    """
+    from rk3588_host_utils import match_detections
+
+    matched = ref_total = test_total = 0
+    score_diffs = []
+    for ref, test in zip(ref_detections, test_detections):
+        count, diffs = match_detections(ref, test, iou_threshold)
+        matched += count
+        ref_total += len(ref[0])
+        test_total += len(test[0])
+        score_diffs.extend(diffs)
+    return {
+        'ref_count': ref_total,
+        'test_count': test_total,
+        'matched': matched,
+        'recall': matched / ref_total if ref_total else 1.0,
+        'precision': matched / test_total if test_total else 1.0,
+        'mean_score_diff': float(np.mean(score_diffs)) if score_diffs else 0.0,
+    }
+
+
+# COCO目标尺寸划分（原图像素面积）：small < 32², medium < 96², large其余
+SIZE_BUCKETS = (('small', 0, 32 ** 2), ('medium', 32 ** 2, 96 ** 2), ('large', 96 ** 2, float('inf')))
+
+
+def recall_by_size(ref_detections, test_detections, iou_threshold=0.5):
+    """按参考框面积分桶统计召回，返回 {桶名: {'ref_count', 'matched', 'recall'}}"""
+    from rk3588_host_utils import match_detections
+
+    result = {}
+    for name, low, high in SIZE_BUCKETS:
+        matched = ref_total = 0
+        for ref, test in zip(ref_detections, test_detections):
+            boxes = ref[0]
+            areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+            keep = (areas >= low) & (areas < high)
+            if not keep.any():
+                continue
+            count, _ = match_detections((ref[0][keep], ref[1][keep], ref[2][keep]), test, iou_threshold)
+            matched += count
+            ref_total += int(keep.sum())
+        result[name] = {'ref_count': ref_total, 'matched': matched,
+                        'recall': matched / ref_total if ref_total else None}
+    return result
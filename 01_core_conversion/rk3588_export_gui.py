@@ -2,8 +2,12 @@
 """
 RK3588 ONNX导出工具 - GUI版本
 现代化界面，专注于PT→ONNX转换的核心功能
+torch/ultralytics在窗口显示后由后台线程加载，冷启动时窗口立即出现，加载完成后才启用导出
 """
 
+import time
+_STARTUP_T0 = time.perf_counter()  # 启动计时起点（gui_startup_benchmark.py）
+
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
@@ -18,26 +22,34 @@ warnings.filterwarnings("ignore", category=UserWarning)
 if sys.platform == "darwin":
     os.environ['TK_SILENCE_DEPRECATION'] = '1'
 
-try:
-    import torch
-    import torch.nn as nn
-    from ultralytics import YOLO
-    import types
-    DEPENDENCIES_OK = True
-except ImportError as e:
-    DEPENDENCIES_OK = False
-    MISSING_DEPS = str(e)
+# 设置后在stderr输出启动时间点（STARTUP <阶段> <毫秒>），就绪后自动退出，供启动基准测试使用
+STARTUP_BENCH_ENV = 'RK3588_GUI_STARTUP_BENCH'
+
+
+def startup_mark(stage):
+    """记录启动阶段耗时（自模块开始导入起），基准测试模式下输出到stderr，与-X importtime的输出按时间顺序交错"""
+    elapsed_ms = (time.perf_counter() - _STARTUP_T0) * 1000.0
+    if os.environ.get(STARTUP_BENCH_ENV):
+        print(f"STARTUP {stage} {elapsed_ms:.1f}", file=sys.stderr, flush=True)
+    return elapsed_ms
+
+
+def load_dependencies():
+    """导入torch、ultralytics与导出模块（冷启动需数秒），成功返回None，缺少依赖时返回错误信息"""
+    try:
+        import torch  # noqa: F401
+        import ultralytics  # noqa: F401
+        import simple_rk3588_export  # noqa: F401
+    except ImportError as e:
+        return str(e)
+    return None
 
 
 class RK3588ExportGUI:
     def __init__(self):
-        if not DEPENDENCIES_OK:
-            self.show_dependency_error()
-            return
-            
         self.root = tk.Tk()
         self.root.title("RK3588 ONNX Export Tool")
-        self.root.geometry("900x700")
+        self.root.geometry("900x900")
         self.root.minsize(800, 600)
         
         # 专业低饱和度配色方案 - 遵循终极指南标准
@@ -80,10 +92,25 @@ class RK3588ExportGUI:
         # 导出配置
         self.batch_size = tk.IntVar(value=1)
         self.img_size = tk.IntVar(value=640)
+        self.img_height = tk.IntVar(value=0)  # 0表示与宽度相同（正方形）
         self.opset_version = tk.IntVar(value=11)
+        self.dynamic_batch = tk.BooleanVar(value=False)
+        self.fuse_conv_bn = tk.BooleanVar(value=True)
+        self.export_fp16 = tk.BooleanVar(value=False)
+        self.uint8_input = tk.BooleanVar(value=False)
+        self.keep_classes = tk.StringVar()  # 留空表示导出全部类别
+        
+        # 批量导出队列（每个任务在独立工作进程中运行）
+        self.batch_exporter = None
+        self.queue_running = False
+        self.use_cache = tk.BooleanVar(value=True)
+        self.dependencies_ready = False
         
         self.setup_styles()
         self.setup_ui()
+        
+        # 窗口显示后再在后台加载torch/ultralytics
+        self.root.after(0, self.start_dependency_loading)
     
     def setup_styles(self):
         """设置ttk样式"""
@@ -117,15 +144,42 @@ class RK3588ExportGUI:
                        insertwidth=2,  # 🔑 光标宽度
                        font=('SF Pro Text', 11))
         
-    def show_dependency_error(self):
+    def show_dependency_error(self, error):
         """显示依赖错误"""
-        root = tk.Tk()
-        root.withdraw()
         messagebox.showerror(
             "依赖错误",
-            f"缺少必要依赖:\n{MISSING_DEPS}\n\n请安装:\npip install torch ultralytics"
+            f"缺少必要依赖:\n{error}\n\n请安装:\npip install torch ultralytics",
+            parent=self.root
         )
-        root.destroy()
+    
+    def start_dependency_loading(self):
+        """窗口已显示：在后台线程导入torch/ultralytics，界面保持可操作"""
+        startup_mark('window')
+        thread = threading.Thread(target=self.load_dependencies_worker)
+        thread.daemon = True
+        thread.start()
+    
+    def load_dependencies_worker(self):
+        """后台线程：导入依赖，结果交回Tk主线程处理"""
+        error = load_dependencies()
+        self.root.after(0, lambda: self.on_dependencies_loaded(error))
+    
+    def on_dependencies_loaded(self, error):
+        """依赖加载完成：更新就绪指示并启用导出按钮"""
+        ready_ms = startup_mark('ready')
+        if error:
+            self.deps_label.configure(text="❌ 缺少依赖: torch / ultralytics", fg=self.colors['error_text'])
+            self.export_btn.configure(text="缺少依赖")
+            self.update_status("缺少必要依赖，无法导出", "error")
+            if not os.environ.get(STARTUP_BENCH_ENV):
+                self.show_dependency_error(error)
+        else:
+            self.dependencies_ready = True
+            self.deps_label.configure(text=f"✅ torch / ultralytics 已就绪 ({ready_ms / 1000:.1f}s)",
+                                      fg=self.colors['success_text'])
+            self.export_btn.configure(state='normal', text="开始导出")
+        if os.environ.get(STARTUP_BENCH_ENV):
+            self.root.after(100, self.root.destroy)
     
     def setup_ui(self):
         """设置用户界面"""
@@ -181,6 +235,16 @@ class RK3588ExportGUI:
         )
         subtitle_label.pack(anchor='w', pady=(5, 0))
         
+        # 依赖就绪指示：torch/ultralytics在后台加载
+        self.deps_label = tk.Label(
+            header_frame,
+            text="⏳ 正在后台加载 torch / ultralytics...",
+            font=(self.fonts['sans'][0], 10),
+            fg=self.colors['warning_text'],
+            bg=self.colors['bg']
+        )
+        self.deps_label.pack(anchor='w', pady=(5, 0))
+        
         # 分割线
         separator = tk.Frame(header_frame, height=1, bg=self.colors['border'])
         separator.pack(fill='x', pady=(15, 0))
@@ -298,7 +362,7 @@ class RK3588ExportGUI:
         
         tk.Label(
             size_frame,
-            text="Image Size:",
+            text="Image Size (W):",
             font=(self.fonts['sans'][0], 10),
             fg=self.colors['text'],
             bg=self.colors['card']
@@ -315,6 +379,25 @@ class RK3588ExportGUI:
         )
         size_spinbox.pack(anchor='w', pady=(2, 0))
         
+        tk.Label(
+            size_frame,
+            text="Image Height (0=正方形):",
+            font=(self.fonts['sans'][0], 10),
+            fg=self.colors['text'],
+            bg=self.colors['card']
+        ).pack(anchor='w', pady=(5, 0))
+        
+        height_spinbox = tk.Spinbox(
+            size_frame,
+            from_=0, to=1280, increment=32,
+            textvariable=self.img_height,
+            font=(self.fonts['mono'][0], 10),
+            width=10,
+            relief='solid',
+            bd=1
+        )
+        height_spinbox.pack(anchor='w', pady=(2, 0))
+        
         # OPSET版本
         opset_frame = tk.Frame(params_grid, bg=self.colors['card'])
         opset_frame.pack(fill='x')
@@ -338,15 +421,46 @@ class RK3588ExportGUI:
         )
         opset_spinbox.pack(anchor='w', pady=(2, 0))
         
+        # 类别子集
+        classes_frame = tk.Frame(params_grid, bg=self.colors['card'])
+        classes_frame.pack(fill='x', pady=(10, 0))
+        
+        tk.Label(
+            classes_frame,
+            text="保留类别ID (如 0,32，留空=全部):",
+            font=(self.fonts['sans'][0], 10),
+            fg=self.colors['text'],
+            bg=self.colors['card']
+        ).pack(anchor='w')
+        
+        ttk.Entry(
+            classes_frame,
+            textvariable=self.keep_classes,
+            font=(self.fonts['mono'][0], 10),
+            width=20,
+            style='Modern.TEntry'
+        ).pack(anchor='w', pady=(2, 0))
+        
+        # 导出选项
+        options_frame = tk.Frame(params_grid, bg=self.colors['card'])
+        options_frame.pack(fill='x', pady=(10, 0))
+        
+        self.create_option_check(options_frame, "动态Batch (导出后测试batch 1/4/8延迟)", self.dynamic_batch)
+        self.create_option_check(options_frame, "Conv+BN融合 (输出融合前后对比报告)", self.fuse_conv_bn)
+        self.create_option_check(options_frame, "FP16模型 (额外输出 *_fp16.onnx 及精度/速度报告)", self.export_fp16)
+        self.create_option_check(options_frame, "uint8 NHWC BGR输入 (归一化在图内完成，主机端免预处理)", self.uint8_input)
+        self.create_option_check(options_frame, "使用导出缓存 (模型与参数未变时直接复用)", self.use_cache)
+        
         # 导出按钮
         button_frame = tk.Frame(content, bg=self.colors['card'])
         button_frame.pack(fill='x', pady=(30, 0))
         
         self.export_btn = ttk.Button(
             button_frame,
-            text="开始导出",
+            text="加载依赖中...",
             command=self.start_export,
-            style='Success.TButton'
+            style='Success.TButton',
+            state='disabled'  # 依赖加载完成后启用
         )
         self.export_btn.pack()
         
@@ -367,6 +481,28 @@ class RK3588ExportGUI:
             fg=self.colors['text_secondary'],
             bg=self.colors['card']
         )
+        
+        self.setup_queue_section(content)
+    
+    def setup_queue_section(self, parent):
+        """批量导出队列：当前模型+参数作为任务加入队列，逐个在工作进程中导出"""
+        self.create_section_title(parent, "批量队列", pady_top=20)
+        
+        queue_buttons = tk.Frame(parent, bg=self.colors['card'])
+        queue_buttons.pack(fill='x')
+        for text, command in (("加入队列", self.add_to_queue), ("运行队列", self.run_queue),
+                              ("取消选中", self.cancel_selected_jobs), ("取消全部", self.cancel_all_jobs)):
+            ttk.Button(queue_buttons, text=text, command=command,
+                       style='Primary.TButton').pack(side='left', padx=(0, 8))
+        
+        columns = ('model', 'size', 'status', 'size_mb', 'elapsed', 'progress')
+        headings = ('模型', '尺寸', '状态', '大小(MB)', '耗时(s)', '进度')
+        widths = (150, 80, 60, 70, 60, 260)
+        self.queue_tree = ttk.Treeview(parent, columns=columns, show='headings', height=6)
+        for column, heading, width in zip(columns, headings, widths):
+            self.queue_tree.heading(column, text=heading)
+            self.queue_tree.column(column, width=width, anchor='w', stretch=(column == 'progress'))
+        self.queue_tree.pack(fill='both', expand=True, pady=(10, 0))
     
     def setup_right_panel(self, parent):
         """设置右侧信息面板"""
@@ -418,6 +554,7 @@ reg2: [B, 1, 4, H2*W2]
 cls2: [B, NC, H2, W2]
 reg3: [B, 1, 4, H3*W3]
 cls3: [B, NC, H3, W3]
+(P6模型另有 reg4/cls4，共8个输出)
 
 完美适配RK3588平台"""
         
@@ -451,6 +588,19 @@ cls3: [B, NC, H3, W3]
         )
         title_label.pack(anchor='w', pady=(pady_top, 10))
     
+    def create_option_check(self, parent, text, variable):
+        """创建导出选项复选框"""
+        tk.Checkbutton(
+            parent,
+            text=text,
+            variable=variable,
+            font=(self.fonts['sans'][0], 10),
+            fg=self.colors['text'],
+            bg=self.colors['card'],
+            activebackground=self.colors['card'],
+            selectcolor=self.colors['card']
+        ).pack(anchor='w')
+    
     def create_input_group(self, parent):
         """创建输入组容器"""
         group_frame = tk.Frame(parent, bg=self.colors['card'])
@@ -517,7 +667,7 @@ cls3: [B, NC, H3, W3]
     
     def start_export(self):
         """开始导出过程"""
-        if self.is_processing:
+        if self.is_processing or not self.dependencies_ready:
             return
             
         if not self.model_path.get():
@@ -540,50 +690,64 @@ cls3: [B, NC, H3, W3]
         thread.daemon = True
         thread.start()
     
+    def collect_export_settings(self):
+        """当前界面参数 → export_rk3588_onnx关键字参数"""
+        # 高度非0时按(h, w)导出矩形输入，如4:3摄像头的480x640
+        img_w, img_h = self.img_size.get(), self.img_height.get()
+        img_size = (img_h, img_w) if img_h and img_h != img_w else img_w
+        keep_classes = [int(c) for c in self.keep_classes.get().replace(',', ' ').split()]
+        
+        # 动态batch时batch维可变，否则固化GUI设置的batch
+        return dict(
+            img_size=img_size,
+            batch_size=self.batch_size.get(),
+            opset_version=self.opset_version.get(),
+            input_name='images',
+            dynamic_batch=self.dynamic_batch.get(),
+            fuse=self.fuse_conv_bn.get(),
+            half=self.export_fp16.get(),
+            use_cache=self.use_cache.get(),
+            uint8_input=self.uint8_input.get(),
+            keep_classes=keep_classes or None
+        )
+    
     def export_model(self):
         """实际执行模型导出"""
         try:
             self.update_status("正在加载模型...", "info")
             
             # 导入核心转换函数
-            from simple_rk3588_export import create_rk3588_forward
-            
-            # 加载模型
-            model = YOLO(self.model_path.get())
-            
-            self.update_status("正在应用RK3588优化...", "info")
-            
-            # 应用RK3588优化
-            detect_head = model.model.model[-1]
-            rk3588_forward = create_rk3588_forward(detect_head)
-            # 统一导出为6输出：对可能的4头模型再加一层保险，仅返回前3头(6张量)
-            def forward_6only(self, x):
-                out = rk3588_forward(self, x)
-                if isinstance(out, (list, tuple)):
-                    return list(out)[:6]
-                return out
-            detect_head.forward = types.MethodType(forward_6only, detect_head)
-            
-            self.update_status("正在导出ONNX模型...", "info")
+            from simple_rk3588_export import export_rk3588_onnx
             
-            # 导出ONNX
-            dummy_input = torch.randn(
-                self.batch_size.get(),
-                3,
-                self.img_size.get(),
-                self.img_size.get()
-            )
+            self.update_status("正在应用RK3588优化并导出ONNX模型...", "info")
             
-            torch.onnx.export(
-                model.model,
-                dummy_input,
+            result = export_rk3588_onnx(
+                self.model_path.get(),
                 self.output_path.get(),
-                input_names=['images'],
-                output_names=['reg1', 'cls1', 'reg2', 'cls2', 'reg3', 'cls3'],
-                dynamic_axes=None,
-                opset_version=self.opset_version.get(),
-                verbose=False
+                **self.collect_export_settings()
             )
+            self.exported_path = result
+            
+            # 静态计算量/内存摘要（导出时已写出完整的 <stem>.graph_stats.json）
+            self.output_names_text = "6个独立张量 (reg1,cls1,reg2,cls2,reg3,cls3)"
+            try:
+                from rk3588_graph_stats import analyze_onnx, format_stats_brief
+                stats = analyze_onnx(result)
+                self.graph_stats_text = format_stats_brief(stats)
+                # P6模型导出全部4个尺度（8个输出），按实际输出显示
+                names = [out['name'] for out in stats['outputs']]
+                self.output_names_text = f"{len(names)}个独立张量 ({','.join(names)})"
+            except Exception as e:
+                self.graph_stats_text = f"静态分析失败: {e}"
+            
+            # 写入模型的元数据：验证/标注工具据此配置类别名、输入尺寸与步长，无需PT模型
+            try:
+                import onnx
+                meta = {p.key: p.value for p in onnx.load(result, load_external_data=False).metadata_props}
+                self.metadata_text = (f"模型元数据: 类别 {meta.get('names', '-')}, 输入 {meta.get('imgsz', '-')}, "
+                                      f"步长 {meta.get('strides', '-')}, 布局 {meta.get('layout', '-')}")
+            except Exception as e:
+                self.metadata_text = f"读取模型元数据失败: {e}"
             
             # 成功完成
             self.root.after(0, self.export_complete_success)
@@ -592,6 +756,85 @@ cls3: [B, NC, H3, W3]
             error_msg = str(e)
             self.root.after(0, lambda: self.export_complete_error(error_msg))
     
+    def add_to_queue(self):
+        """把当前模型与参数作为任务加入批量队列，输出为界面上设置的路径（与队列中的任务重复时追加 _2、_3...）"""
+        from batch_export import BatchExporter
+        
+        if not self.model_path.get() or not self.output_path.get():
+            messagebox.showerror("错误", "请选择PT模型文件并设置输出路径")
+            return
+        try:
+            settings = self.collect_export_settings()
+        except ValueError:
+            messagebox.showerror("错误", "保留类别ID需为逗号分隔的整数")
+            return
+        # 批量任务默认跳过逐个对比报告与逐算子耗时分析
+        settings['reports'] = False
+        settings['profile_runs'] = 0
+        
+        if self.batch_exporter is None:
+            self.batch_exporter = BatchExporter(max_workers=1)
+        model = Path(self.model_path.get())
+        output = self.batch_exporter.unique_output(self.output_path.get())
+        job_id = self.batch_exporter.add_job(model, output, **settings)
+        self.queue_tree.insert('', 'end', iid=str(job_id))
+        self.refresh_queue_row(self.batch_exporter.jobs[job_id])
+        self.update_status(f"已加入队列: {model.name} → {output.name}", "info")
+    
+    def refresh_queue_row(self, job):
+        """刷新队列表格中的一行"""
+        from batch_export import STATUS_LABELS, format_img_size
+        
+        self.queue_tree.item(str(job['id']), values=(
+            Path(job['model']).name,
+            format_img_size(job['settings']['img_size']),
+            STATUS_LABELS[job['status']],
+            f"{job['size_mb']:.2f}" if job['size_mb'] is not None else "-",
+            f"{job['elapsed']:.1f}" if job['elapsed'] is not None else "-",
+            job['message'][:80],
+        ))
+    
+    def run_queue(self):
+        """开始处理队列中等待的任务（运行中加入的任务会自动排上）"""
+        if self.batch_exporter is None or not self.batch_exporter.is_busy():
+            self.update_status("队列中没有等待的任务", "warning")
+            return
+        if not self.queue_running:
+            self.queue_running = True
+            self.poll_queue()
+    
+    def poll_queue(self):
+        """定时处理工作进程事件，Tk主线程只做轻量刷新"""
+        from batch_export import DONE, format_summary
+        
+        for job in self.batch_exporter.poll():
+            self.refresh_queue_row(job)
+        if self.batch_exporter.is_busy():
+            self.root.after(300, self.poll_queue)
+            return
+        
+        self.queue_running = False
+        jobs = self.batch_exporter.jobs
+        done = sum(1 for job in jobs if job['status'] == DONE)
+        print(f"\n📊 批量导出汇总:\n{format_summary(jobs)}")
+        self.update_status(f"队列完成: 成功 {done}/{len(jobs)}", "success" if done == len(jobs) else "warning")
+    
+    def cancel_selected_jobs(self):
+        """取消表格中选中的任务"""
+        if self.batch_exporter is None:
+            return
+        for iid in self.queue_tree.selection():
+            self.batch_exporter.cancel(int(iid))
+            self.refresh_queue_row(self.batch_exporter.jobs[int(iid)])
+    
+    def cancel_all_jobs(self):
+        """取消全部等待中与运行中的任务"""
+        if self.batch_exporter is None:
+            return
+        self.batch_exporter.cancel_all()
+        for job in self.batch_exporter.jobs:
+            self.refresh_queue_row(job)
+    
     def export_complete_success(self):
         """导出成功完成"""
         self.progress_bar.stop()
@@ -605,8 +848,10 @@ cls3: [B, NC, H3, W3]
         
         messagebox.showinfo(
             "导出成功",
-            f"RK3588优化的ONNX模型已保存到:\n{self.output_path.get()}\n\n"
-            "输出格式: 6个独立张量 (reg1,cls1,reg2,cls2,reg3,cls3)"
+            f"RK3588优化的ONNX模型已保存到:\n{self.exported_path}\n\n"
+            f"输出格式: {self.output_names_text}\n\n"
+            f"{self.metadata_text}\n\n"
+            f"{self.graph_stats_text}"
         )
     
     def export_complete_error(self, error_msg):
@@ -641,11 +886,6 @@ cls3: [B, NC, H3, W3]
 
 def main():
     """主函数"""
-    if not DEPENDENCIES_OK:
-        print(f"错误: 缺少必要依赖\n{MISSING_DEPS}")
-        print("\n请安装依赖:\npip install torch ultralytics")
-        return
-    
     app = RK3588ExportGUI()
     app.run()
 
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+RK3588 ONNX静态计算量/参数量/激活内存分析
+不运行推理，只对导出的ONNX做形状推断：
+- 每个节点的MACs（Conv/ConvTranspose/MatMul/Gemm）与参数量
+- 按图中节点顺序执行时的激活内存峰值
+- 每个输出（reg/cls/box...）的形状与字节数
+- 按尺度（P3/P4/P5...，由节点输出相对网络输入的步长确定）与模型区段汇总
+用于在选定分辨率或检测头变体之前比较计算与内存开销
+"""
+
+import argparse
+import json
+import math
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+MULTI_SCALE, NO_SCALE = '多尺度', '其他'
+MAC_OPS = ('Conv', 'ConvTranspose', 'MatMul', 'Gemm')
+
+
+def _tensor_types(model):
+    """张量名 → (形状, numpy数据类型)，符号维度（如动态batch）按1计"""
+    import onnx
+    from onnx import helper
+
+    types = {}
+    graph = model.graph
+    for info in list(graph.input) + list(graph.value_info) + list(graph.output):
+        tensor_type = info.type.tensor_type
+        if not tensor_type.HasField('shape'):
+            continue
+        shape = tuple(d.dim_value if d.HasField('dim_value') else 1 for d in tensor_type.shape.dim)
+        types[info.name] = (shape, np.dtype(helper.tensor_dtype_to_np_dtype(tensor_type.elem_type)))
+    for init in graph.initializer:
+        types[init.name] = (tuple(init.dims), np.dtype(helper.tensor_dtype_to_np_dtype(init.data_type)))
+    for node in graph.node:
+        if node.op_type == 'Constant':
+            for attr in node.attribute:
+                if attr.type == onnx.AttributeProto.TENSOR:
+                    tensor = attr.t
+                    types[node.output[0]] = (tuple(tensor.dims),
+                                             np.dtype(helper.tensor_dtype_to_np_dtype(tensor.data_type)))
+    return types
+
+
+def _nbytes(types, name):
+    shape, dtype = types.get(name, ((), None))
+    return int(np.prod(shape)) * dtype.itemsize if dtype is not None else 0
+
+
+def _node_macs(node, types):
+    """乘加次数：Conv按 输出元素数 × (Cin/group × kH × kW)，MatMul/Gemm按 输出元素数 × K"""
+    out_shape = types.get(node.output[0], ((),))[0]
+    if not out_shape or node.input[0] not in types:
+        return 0
+    out_elems = int(np.prod(out_shape))
+    if node.op_type == 'Conv':
+        weight = types.get(node.input[1], ((),))[0]
+        return out_elems * int(np.prod(weight[1:])) if len(weight) > 2 else 0
+    if node.op_type == 'ConvTranspose':
+        weight = types.get(node.input[1], ((),))[0]
+        in_elems = int(np.prod(types[node.input[0]][0]))
+        return in_elems * int(np.prod(weight[1:])) if len(weight) > 2 else 0
+    a_shape = types[node.input[0]][0]
+    if node.op_type == 'Gemm':
+        trans_a = next((attr.i for attr in node.attribute if attr.name == 'transA'), 0)
+        return out_elems * (a_shape[0] if trans_a else a_shape[-1])
+    return out_elems * a_shape[-1]
+
+
+def _network_hw(graph, types):
+    """网络实际处理的(H, W)：取首个Conv的输入（uint8/原始帧输入时已在图内转换与letterbox）"""
+    for node in graph.node:
+        if node.op_type == 'Conv' and node.input[0] in types and len(types[node.input[0]][0]) == 4:
+            return types[node.input[0]][0][2:]
+    return None
+
+
+def _spatial_scale(shape, net_hw):
+    """NCHW特征图相对网络输入的步长为2^n时返回'Pn'，否则None"""
+    if net_hw is None or len(shape) != 4 or not shape[2] or not shape[3]:
+        return None
+    stride_h, stride_w = net_hw[0] / shape[2], net_hw[1] / shape[3]
+    if stride_h != stride_w or stride_h < 1 or not float(math.log2(stride_h)).is_integer():
+        return None
+    return f"P{int(math.log2(stride_h))}"
+
+
+def analyze_onnx(onnx_path):
+    """
+    静态分析ONNX模型，返回报告字典
+    权重不加载（外部数据只读形状），尺度取节点输出的特征图步长；非特征图节点（reshape/DFL等）沿用输入的尺度
+    """
+    import onnx
+    from rk3588_profile import node_sections, section_order
+
+    model = onnx.load(str(onnx_path), load_external_data=False)
+    model = onnx.shape_inference.infer_shapes(model)
+    graph = model.graph
+    types = _tensor_types(model)
+    initializers = {init.name for init in graph.initializer}
+    constants = {node.output[0] for node in graph.node if node.op_type == 'Constant'}
+    weights = initializers | constants
+    net_hw = _network_hw(graph, types)
+    sections = node_sections(onnx_path)
+
+    # 激活内存：张量从产生到最后一次被使用期间常驻，图输出保留到最后
+    last_use = {}
+    for index, node in enumerate(graph.node):
+        for name in node.input:
+            last_use[name] = index
+    graph_outputs = {out.name for out in graph.output}
+    live = {inp.name: _nbytes(types, inp.name) for inp in graph.input if inp.name not in initializers}
+    peak_bytes, peak_node = sum(live.values()), None
+
+    nodes = []
+    tensor_scale = {}
+    for index, node in enumerate(graph.node):
+        if node.op_type == 'Constant':
+            continue
+        params = sum(int(np.prod(types[name][0])) for name in node.input if name in weights and name in types)
+        macs = _node_macs(node, types) if node.op_type in MAC_OPS else 0
+        scale = _spatial_scale(types.get(node.output[0], ((),))[0], net_hw) if node.output else None
+        if scale is None:
+            inherited = {tensor_scale[name] for name in node.input if name in tensor_scale}
+            scale = inherited.pop() if len(inherited) == 1 else (MULTI_SCALE if inherited else NO_SCALE)
+        for name in node.output:
+            tensor_scale[name] = scale
+        output_bytes = sum(_nbytes(types, name) for name in node.output)
+
+        for name in node.output:
+            live[name] = _nbytes(types, name)
+        current = sum(live.values())
+        if current > peak_bytes:
+            peak_bytes, peak_node = current, node.name
+        for name in set(node.input):
+            if last_use.get(name) == index and name in live and name not in graph_outputs:
+                del live[name]
+
+        nodes.append({'name': node.name, 'op_type': node.op_type, 'scale': scale,
+                      'section': sections.get(node.name, NO_SCALE), 'macs': macs, 'params': params,
+                      'output_bytes': output_bytes})
+
+    outputs = []
+    for out in graph.output:
+        shape, dtype = types.get(out.name, ((), np.dtype(np.float32)))
+        outputs.append({'name': out.name, 'shape': list(shape), 'dtype': str(dtype),
+                        'bytes': _nbytes(types, out.name), 'scale': tensor_scale.get(out.name, NO_SCALE)})
+
+    def group(key):
+        totals = defaultdict(lambda: {'macs': 0, 'params': 0, 'nodes': 0})
+        for row in nodes:
+            totals[row[key]]['macs'] += row['macs']
+            totals[row[key]]['params'] += row['params']
+            totals[row[key]]['nodes'] += 1
+        return dict(totals)
+
+    by_scale = group('scale')
+    scale_keys = sorted((s for s in by_scale if s.startswith('P')), key=lambda s: int(s[1:]))
+    by_scale = {s: by_scale[s] for s in scale_keys + [MULTI_SCALE, NO_SCALE] if s in by_scale}
+    output_bytes_by_scale = defaultdict(int)
+    for out in outputs:
+        output_bytes_by_scale[out['scale']] += out['bytes']
+    for scale, row in by_scale.items():
+        row['output_bytes'] = output_bytes_by_scale.get(scale, 0)
+
+    by_section = group('section')
+    return {
+        'model': str(onnx_path),
+        'network_hw': list(net_hw) if net_hw else None,
+        'total_macs': sum(row['macs'] for row in nodes),
+        'total_params': sum(int(np.prod(init.dims)) for init in graph.initializer),
+        'param_bytes': sum(_nbytes(types, init.name) for init in graph.initializer),
+        'peak_activation_bytes': peak_bytes,
+        'peak_activation_node': peak_node,
+        'output_bytes': sum(out['bytes'] for out in outputs),
+        'outputs': outputs,
+        'by_scale': by_scale,
+        'by_section': {s: by_section[s] for s in section_order(by_section)},
+        'nodes': nodes,
+    }
+
+
+def format_stats(report, top_k=10):
+    """控制台输出：总量、输出张量、按尺度与区段的汇总及MACs最多的节点"""
+    hw = report['network_hw']
+    lines = [
+        f"📊 静态分析 ({Path(report['model']).name}{f', 网络输入 {hw[0]}x{hw[1]}' if hw else ''}):",
+        f"  计算量: {report['total_macs'] / 1e9:.3f} GMACs, 参数: {report['total_params'] / 1e6:.3f} M "
+        f"({report['param_bytes'] / 1024 / 1024:.2f} MB)",
+        f"  激活内存峰值: {report['peak_activation_bytes'] / 1024 / 1024:.2f} MB (节点 {report['peak_activation_node']})",
+        f"  输出: {report['output_bytes'] / 1024:.1f} KB",
+    ]
+    for out in report['outputs']:
+        lines.append(f"    {out['name']:<10}{str(out['shape']):<24}{out['dtype']:<9}{out['bytes'] / 1024:>9.1f} KB  {out['scale']}")
+    lines.append(f"  {'尺度':<8}{'GMACs':>9}{'占比':>8}{'参数(K)':>10}{'输出(KB)':>10}")
+    total = report['total_macs'] or 1
+    for scale, row in report['by_scale'].items():
+        lines.append(f"  {scale:<8}{row['macs'] / 1e9:>9.3f}{row['macs'] / total:>8.1%}"
+                     f"{row['params'] / 1e3:>10.1f}{row['output_bytes'] / 1024:>10.1f}")
+    lines.append(f"  {'区段':<12}{'GMACs':>9}{'占比':>8}{'参数(K)':>10}")
+    for section, row in report['by_section'].items():
+        lines.append(f"  {section:<12}{row['macs'] / 1e9:>9.3f}{row['macs'] / total:>8.1%}{row['params'] / 1e3:>10.1f}")
+    if top_k:
+        lines.append(f"  MACs最多的 {top_k} 个节点:")
+        for row in sorted(report['nodes'], key=lambda r: r['macs'], reverse=True)[:top_k]:
+            lines.append(f"    {row['name']:<28}{row['op_type']:<8}{row['scale']:<6}{row['section']:<12}"
+                         f"{row['macs'] / 1e6:>9.1f} MMACs")
+    return "\n".join(lines)
+
+
+def format_stats_brief(report):
+    """一行摘要（GUI提示用）"""
+    return (f"计算量 {report['total_macs'] / 1e9:.2f} GMACs, 参数 {report['total_params'] / 1e6:.2f} M, "
+            f"激活峰值 {report['peak_activation_bytes'] / 1024 / 1024:.1f} MB, "
+            f"输出 {report['output_bytes'] / 1024:.0f} KB")
+
+
+def graph_stats_report(onnx_path, top_k=10):
+    """分析模型、打印汇总并在模型旁写出 <stem>.graph_stats.json，返回报告字典"""
+    report = analyze_onnx(onnx_path)
+    print(f"\n{format_stats(report, top_k)}")
+    json_path = Path(onnx_path).with_suffix('.graph_stats.json')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"📝 静态分析已保存: {json_path}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Static MACs / params / activation-memory analysis of exported ONNX models')
+    parser.add_argument('onnx', nargs='+', help='ONNX model(s) to analyze')
+    parser.add_argument('--top-k', type=int, default=10, help='Nodes with the most MACs to list (default: 10)')
+    args = parser.parse_args()
+
+    for onnx_path in args.onnx:
+        graph_stats_report(onnx_path, args.top_k)
+
+
+if __name__ == "__main__":
+    main()
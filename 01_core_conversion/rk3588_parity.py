@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+RK3588导出张量级一致性验证
+在图片目录（默认datasets/temp/images/val）的每张图片上分别运行
+替换了RK3588检测头forward的PT模型与导出的ONNX模型，按输出张量统计
+最大绝对误差、平均绝对误差与余弦相似度，并列出误差最大的图片。
+图片分发到多个spawn工作进程，每个进程各自加载一份PT模型与onnxruntime会话
+检测头/输入参数默认取自ONNX导出元数据，对比前先确认两侧输出形状一致
+"""
+
+import argparse
+import contextlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+from pathlib import Path
+
+import numpy as np
+
+# 工作进程内的模型与会话，由_init_worker创建
+_WORKER = {}
+
+
+def _init_worker(model_path, onnx_path, load_kwargs, input_kwargs, threads):
+    """工作进程初始化：加载PT模型（RK3588检测头）与ONNX会话，线程数按进程数均分"""
+    import onnxruntime as ort
+    import torch
+    from simple_rk3588_export import export_module, load_rk3588_model
+
+    torch.set_num_threads(threads)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = load_rk3588_model(model_path, **load_kwargs)
+    module = export_module(model, input_kwargs['uint8_input'], input_kwargs['raw_frame'], input_kwargs['img_size'])
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    session = ort.InferenceSession(str(onnx_path), options, providers=['CPUExecutionProvider'])
+    _WORKER.update(module=module, session=session, **input_kwargs)
+
+
+def make_parity_input(image, session, img_size, raw_frame=None):
+    """按模型输入格式构造输入：原始帧模型缩放到固定帧尺寸，其余按对比器的letterbox预处理，静态batch>1时复制"""
+    import cv2
+    from rk3588_eval_utils import onnx_input_dtype
+    from rk3588_host_utils import preprocess_image
+
+    if raw_frame:
+        tensor = cv2.resize(image, (raw_frame[1], raw_frame[0]))[None]
+    else:
+        tensor = preprocess_image(image, img_size, dtype=onnx_input_dtype(session))[0]
+    batch = session.get_inputs()[0].shape[0]
+    if isinstance(batch, int) and batch > 1:
+        tensor = np.repeat(tensor, batch, axis=0)
+    return tensor
+
+
+def tensor_errors(reference, test):
+    """单个输出张量的 (最大绝对误差, 平均绝对误差, 余弦相似度)"""
+    from rk3588_eval_utils import output_error
+
+    ref = np.asarray(reference, dtype=np.float64)
+    out = np.asarray(test, dtype=np.float64)
+    max_abs, cosine = output_error(ref, out)
+    mean_abs = float(np.abs(ref - out).mean()) if ref.size else 0.0
+    return max_abs, mean_abs, cosine
+
+
+def onnx_parity_settings(onnx_path):
+    """
+    由导出元数据推得PT侧需要的参数，返回 run_parity 的关键字参数 (img_size, uint8_input, raw_frame, head_kwargs)
+    旧模型缺失的元数据项不出现在结果中，由调用方的默认值补齐
+    """
+    import onnxruntime as ort
+    import rk3588_eval_utils  # noqa: F401  将02_validation_tools加入sys.path
+    from rk3588_host_utils import onnx_model_config
+
+    session = ort.InferenceSession(str(onnx_path), providers=['CPUExecutionProvider'])
+    config = onnx_model_config(session)
+    meta = session.get_modelmeta().custom_metadata_map
+    head = config['head'] or ''
+    head_kwargs = {}
+    if head.startswith('rk3588_top'):
+        head_kwargs['topk'] = int(head[len('rk3588_top'):])
+    elif head == 'rk3588_boxes':
+        head_kwargs['decode_boxes'] = True
+    if config['layout']:
+        head_kwargs['layout'] = config['layout']
+    if 'dfl' in meta:
+        head_kwargs['dfl'] = meta['dfl']
+    if config['class_ids'] is not None:
+        head_kwargs['keep_classes'] = [int(c) for c in config['class_ids']]
+    if config['strides']:
+        head_kwargs['max_scales'] = len(config['strides'])
+    settings = {'img_size': tuple(config['imgsz']), 'uint8_input': config['input_dtype'] == np.uint8,
+                'head_kwargs': head_kwargs}
+    if config['letterbox']:
+        settings['raw_frame'] = tuple(config['letterbox'][0])
+    return settings
+
+
+def _check_output_shapes(image_path):
+    """在一张图片上比较PT与ONNX的输出个数与形状，不一致时返回说明文字，一致时返回None"""
+    import cv2
+    import torch
+
+    image = cv2.imread(str(image_path))
+    if image is None:
+        return None
+    session = _WORKER['session']
+    tensor = make_parity_input(image, session, _WORKER['img_size'], _WORKER['raw_frame'])
+    onnx_outputs = session.run(None, {session.get_inputs()[0].name: tensor})
+    with torch.no_grad():
+        pt_outputs = _WORKER['module'](torch.from_numpy(tensor))
+    pt_shapes = [tuple(t.shape) for t in pt_outputs]
+    onnx_shapes = [tuple(a.shape) for a in onnx_outputs]
+    if pt_shapes == onnx_shapes:
+        return None
+    names = [o.name for o in session.get_outputs()]
+    lines = [f"PT与ONNX输出不一致（PT {len(pt_shapes)} 个, ONNX {len(onnx_shapes)} 个），"
+             f"检测头参数（--classes/--layout/--topk/--decode-boxes/--dfl/--imgsz）可能与导出时不同:"]
+    for i in range(max(len(pt_shapes), len(onnx_shapes))):
+        name = names[i] if i < len(names) else f"#{i}"
+        pt_shape = pt_shapes[i] if i < len(pt_shapes) else '-'
+        onnx_shape = onnx_shapes[i] if i < len(onnx_shapes) else '-'
+        mark = '' if pt_shape == onnx_shape else '  ✗'
+        lines.append(f"  {name}: PT {pt_shape} vs ONNX {onnx_shape}{mark}")
+    return "\n".join(lines)
+
+
+def _compare_image(image_path):
+    """在一张图片上对比PT与ONNX的全部输出，返回 (图片路径, [(max_abs, mean_abs, cosine), ...]) 或错误信息"""
+    import cv2
+    import torch
+
+    image = cv2.imread(str(image_path))
+    if image is None:
+        return str(image_path), None, "无法读取图片"
+    session = _WORKER['session']
+    tensor = make_parity_input(image, session, _WORKER['img_size'], _WORKER['raw_frame'])
+    onnx_outputs = session.run(None, {session.get_inputs()[0].name: tensor})
+    with torch.no_grad():
+        pt_outputs = _WORKER['module'](torch.from_numpy(tensor))
+    if [tuple(t.shape) for t in pt_outputs] != [a.shape for a in onnx_outputs]:
+        return str(image_path), None, "PT与ONNX输出形状不一致"
+    errors = [tensor_errors(pt.numpy(), out) for pt, out in zip(pt_outputs, onnx_outputs)]
+    return str(image_path), errors, None
+
+
+def run_parity(model_path, onnx_path, image_paths, img_size=(640, 640), uint8_input=False, raw_frame=None,
+               fuse=True, head_kwargs=None, workers=None):
+    """
+    在全部图片上对比PT与ONNX输出，workers个进程并行（workers<=1时在当前进程内运行）
+    返回 (输出名列表, [(图片路径, 各输出误差), ...], [(图片路径, 错误信息), ...])
+    开始前先在当前进程用第一张图片确认两侧输出形状一致，不一致或没有图片时抛出ValueError（不启动进程池）
+    """
+    image_paths = [str(p) for p in image_paths]
+    if not image_paths:
+        raise ValueError("没有可对比的图片")
+    workers = max(1, min(workers or os.cpu_count() or 1, len(image_paths)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    load_kwargs = dict(fuse=fuse, **(head_kwargs or {}))
+    input_kwargs = dict(img_size=tuple(img_size), uint8_input=uint8_input or bool(raw_frame),
+                        raw_frame=tuple(raw_frame) if raw_frame else None)
+    init_args = (str(model_path), str(onnx_path), load_kwargs, input_kwargs, threads)
+
+    # 形状检查用全部线程在当前进程加载，单进程对比时直接复用（workers=1时threads即为CPU核数）
+    _init_worker(*init_args[:-1], os.cpu_count() or 1)
+    output_names = [o.name for o in _WORKER['session'].get_outputs()]
+    mismatch = _check_output_shapes(image_paths[0])
+    if mismatch:
+        raise ValueError(mismatch)
+    if workers == 1:
+        results = [_compare_image(p) for p in image_paths]
+    else:
+        _WORKER.clear()
+        # spawn：不继承父进程的torch线程池与已加载的模型
+        with ProcessPoolExecutor(workers, mp_context=mp.get_context('spawn'),
+                                 initializer=_init_worker, initargs=init_args) as pool:
+            results = list(pool.map(_compare_image, image_paths, chunksize=max(1, len(image_paths) // (workers * 4))))
+    compared = [(path, errors) for path, errors, error in results if errors is not None]
+    failed = [(path, error) for path, errors, error in results if errors is None]
+    return output_names, compared, failed
+
+
+def summarize_parity(output_names, compared):
+    """按输出汇总：最大误差取全部图片的最大值，平均误差与余弦取图片平均，另给出最小余弦"""
+    summary = {}
+    for i, name in enumerate(output_names):
+        errors = np.array([errors[i] for _, errors in compared], dtype=np.float64)
+        summary[name] = {
+            'max_abs': float(errors[:, 0].max()),
+            'mean_abs': float(errors[:, 1].mean()),
+            'cosine_mean': float(errors[:, 2].mean()),
+            'cosine_min': float(errors[:, 2].min()),
+        }
+    return summary
+
+
+def worst_images(output_names, compared, top_k=5):
+    """按全部输出中最大的绝对误差排序，返回误差最大的top_k张图片 [(路径, 最大误差, 对应输出名)]"""
+    rows = []
+    for path, errors in compared:
+        index = int(np.argmax([e[0] for e in errors]))
+        rows.append((path, errors[index][0], output_names[index]))
+    return sorted(rows, key=lambda r: r[1], reverse=True)[:top_k]
+
+
+def parity_report(model_path, onnx_path, image_dir=None, max_images=None, workers=None, top_k=5, **kwargs):
+    """PT（RK3588检测头）与ONNX在图片目录上的逐输出一致性报告，kwargs同run_parity"""
+    import time
+    from rk3588_eval_utils import DEFAULT_VAL_DIR, list_images
+
+    image_paths = list_images(image_dir or DEFAULT_VAL_DIR, max_images)
+    if not image_paths:
+        print(f"⚠️ 未找到验证图片: {image_dir or DEFAULT_VAL_DIR}")
+        return None
+    start = time.perf_counter()
+    try:
+        output_names, compared, failed = run_parity(model_path, onnx_path, image_paths, workers=workers, **kwargs)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return None
+    elapsed = time.perf_counter() - start
+    if not compared:
+        print(f"❌ 没有图片完成对比")
+        return None
+
+    summary = summarize_parity(output_names, compared)
+    print(f"\n🎯 PT vs ONNX 逐输出一致性 ({len(compared)} 张图片, {elapsed:.1f}s):")
+    print(f"  {'输出':<12}{'最大误差':>12}{'平均误差':>12}{'平均余弦':>12}{'最小余弦':>12}")
+    for name, row in summary.items():
+        print(f"  {name:<12}{row['max_abs']:>12.2e}{row['mean_abs']:>12.2e}"
+              f"{row['cosine_mean']:>12.8f}{row['cosine_min']:>12.8f}")
+    worst = worst_images(output_names, compared, top_k)
+    print(f"  误差最大的图片:")
+    for path, max_abs, name in worst:
+        print(f"    {Path(path).name}: {max_abs:.2e} ({name})")
+    for path, error in failed:
+        print(f"⚠️ {Path(path).name}: {error}")
+    return {'outputs': summary, 'images': len(compared), 'failed': len(failed),
+            'worst_images': [{'image': p, 'max_abs': m, 'output': n} for p, m, n in worst]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tensor-level PT vs ONNX parity over an image folder (process pool)')
+    parser.add_argument('model', help='YOLOv8 .pt file the ONNX was exported from')
+    parser.add_argument('onnx', help='Exported ONNX model')
+    parser.add_argument('--images',
+                        help='Image folder or calib_subset.py manifest (default: datasets/temp/images/val)')
+    parser.add_argument('--max-images', type=int, help='Use at most N images')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--top-k', type=int, default=5, help='Worst images to list (default: 5)')
+    # 以下参数默认取自ONNX导出元数据，只有元数据缺失（旧模型）或需要覆盖时才手动指定
+    parser.add_argument('--imgsz', type=int, nargs='+', help='Network input size: S or H W (default: from metadata, 640)')
+    parser.add_argument('--no-fuse', action='store_true', help='The ONNX was exported without Conv+BN fusion')
+    parser.add_argument('--uint8-input', action='store_true', help='The ONNX takes uint8 NHWC BGR frames')
+    parser.add_argument('--raw-frame', type=int, nargs=2, metavar=('H', 'W'), help='The ONNX takes fixed-size raw frames')
+    parser.add_argument('--decode-boxes', action='store_true', help='The ONNX emits box1..3')
+    parser.add_argument('--topk', type=int, help='The ONNX emits in-graph TopK candidates')
+    parser.add_argument('--classes', type=int, nargs='+', help='The ONNX keeps only these class ids')
+    parser.add_argument('--layout', help='Output layout of the ONNX (default: from metadata, rk3588)')
+    parser.add_argument('--dfl', help='DFL implementation of the ONNX (default: from metadata, conv)')
+    args = parser.parse_args()
+
+    settings = onnx_parity_settings(args.onnx)
+    head_kwargs = dict(decode_boxes=False, topk=None, keep_classes=None, layout='rk3588', dfl='conv')
+    head_kwargs.update(settings['head_kwargs'])
+    overrides = dict(decode_boxes=args.decode_boxes or None, topk=args.topk, keep_classes=args.classes,
+                     layout=args.layout, dfl=args.dfl)
+    head_kwargs.update({key: value for key, value in overrides.items() if value is not None})
+    img_size = (args.imgsz[0], args.imgsz[-1]) if args.imgsz else settings['img_size']
+    raw_frame = args.raw_frame or settings.get('raw_frame')
+    uint8_input = args.uint8_input or settings['uint8_input']
+    print(f"📋 对比参数: 输入 {img_size}, 检测头 {head_kwargs}"
+          + (f", 原始帧 {raw_frame}" if raw_frame else ", uint8输入" if uint8_input else ""))
+    parity_report(args.model, args.onnx, args.images, args.max_images, args.workers, args.top_k,
+                  img_size=img_size, uint8_input=uint8_input, raw_frame=raw_frame,
+                  fuse=not args.no_fuse, head_kwargs=head_kwargs)
+
+
+if __name__ == "__main__":
+    main()
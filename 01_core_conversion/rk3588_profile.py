@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+RK3588 ONNX逐算子耗时分析
+开启onnxruntime profiling连续推理N次，将trace JSON汇总为：
+- 按算子类型、按节点的单次推理耗时表，以及最慢的top-k节点
+- 按模型结构划分的耗时：backbone / neck / 六个检测头分支(reg1,cls1,...，含各尺度的DFL) / 解码后处理
+图优化限制为BASIC（常量折叠与冗余节点消除），不做NCHWc等布局转换与算子融合，
+trace中的节点名与导出图一一对应，结构划分也更接近RKNN实际执行的原始图
+"""
+
+import argparse
+import json
+import re
+import tempfile
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from rk3588_eval_utils import random_feed
+
+# 结构区段名称，检测头分支（reg1/cls1/...）按尺度动态生成
+PREPROCESS, BACKBONE, NECK, HEAD_POST, OTHER = '预处理', 'backbone', 'neck', '解码/后处理', '其他'
+_LAYER_RE = re.compile(r'(?:^|\.)model\.(\d+)$')
+_BRANCH_RE = re.compile(r'(?:^|\.)(cv[23])\.(\d+)$')
+
+
+def _is_branch(section):
+    """是否为检测头分支区段（reg1/cls1/...）"""
+    return section[:3] in ('reg', 'cls') and section[3:].isdigit()
+
+
+def _scope_parts(node):
+    """
+    节点的模块路径 [(属性名, 模块类名), ...]
+    dynamo导出器写在metadata_props的namespace中（"model.22: ...Detect/cv3.1: ..."），
+    旧导出器只有节点名（"/model.22/cv3.1/cv3.1.2/Conv"）
+    """
+    namespace = next((p.value for p in node.metadata_props if p.key == 'namespace'), '')
+    if namespace:
+        return [tuple(s.strip() for s in (seg.split(':', 1) + [''])[:2]) for seg in namespace.split('/')]
+    return [(seg, '') for seg in node.name.split('/')[:-1] if seg]
+
+
+def node_module_path(node):
+    """
+    节点所属模块的完整属性路径（如 model.2.cv1.conv），与PyTorch named_modules()的名称对应
+    namespace中有的段已是完整路径（"model.2" → "model.2.cv1"），有的相对上一层模块（"cv2.2" → "conv"）
+    """
+    path, prev = '', ''
+    for attr, cls in _scope_parts(node):
+        if not attr or cls.startswith('aten.'):
+            continue
+        if prev and attr.startswith(prev + '.'):
+            path = path[:len(path) - len(prev)] + attr
+        else:
+            path = f"{path}.{attr}" if path else attr
+        prev = attr
+    return path
+
+
+def node_sections(onnx_path):
+    """
+    为ONNX图中每个节点划分结构区段，返回 {节点名: 区段}
+    backbone以SPPF层为界（P5/P6均以SPPF结尾），最后一层为Detect：cv2.i→reg{i+1}、cv3.i→cls{i+1}，
+    其余Detect节点若只接续某一分支的单链（输入除权重/常量外都来自同一分支，且是这些张量的唯一使用者）归入该分支，
+    如各尺度DFL的view/transpose/softmax/conv1x1；框解码从DFL输出分出lt/rb两路、拼接/TopK混合多个尺度，
+    均归入解码后处理；无模块信息的节点沿用其输入的区段
+    """
+    import onnx
+
+    graph = onnx.load(str(onnx_path), load_external_data=False).graph
+    constants = {init.name for init in graph.initializer}
+    constants.update(name for node in graph.node if node.op_type == 'Constant' for name in node.output)
+    users = Counter(name for node in graph.node for name in node.input if name)
+    scopes = {}
+    backbone_end = None
+    for node in graph.node:
+        parts = _scope_parts(node)
+        layer = branch = None
+        layer_cls = ''
+        for attr, cls in parts:
+            if layer is None:
+                match = _LAYER_RE.search(attr)
+                if match:
+                    layer, layer_cls = int(match.group(1)), cls
+            elif branch is None:
+                match = _BRANCH_RE.search(attr)
+                if match:
+                    branch = f"{'reg' if match.group(1) == 'cv2' else 'cls'}{int(match.group(2)) + 1}"
+        if layer is not None and layer_cls.endswith('SPPF'):
+            backbone_end = layer if backbone_end is None else max(backbone_end, layer)
+        scopes[node.name] = (parts, layer, layer_cls, branch)
+
+    # 无SPPF信息（如旧导出器）时按YOLOv8 P5结构的前10层为backbone
+    backbone_end = 9 if backbone_end is None else backbone_end
+    detect_layer = max((layer for _, layer, _, _ in scopes.values() if layer is not None), default=None)
+    sections = {}
+    producers = {}
+    for node in graph.node:
+        parts, layer, layer_cls, branch = scopes[node.name]
+        if layer is not None:
+            if layer == detect_layer:
+                if branch is None:
+                    inputs = [name for name in node.input if name and name not in constants]
+                    sources = {producers.get(name, HEAD_POST) for name in inputs}
+                    if len(sources) == 1 and _is_branch(next(iter(sources))) and all(users[n] == 1 for n in inputs):
+                        branch = sources.pop()
+                section = branch or HEAD_POST
+            else:
+                section = BACKBONE if layer <= backbone_end else NECK
+        elif any(cls for _, cls in parts) and not any(cls.endswith('DetectionModel') for _, cls in parts):
+            section = PREPROCESS  # 导出包装层（uint8输入/图内letterbox）
+        else:
+            section = next((producers[name] for name in node.input if name in producers), OTHER)
+        sections[node.name] = section
+        for name in node.output:
+            producers[name] = section
+    return sections
+
+
+def section_order(sections):
+    """区段显示顺序：预处理、backbone、neck、各尺度reg/cls分支、解码后处理、其他"""
+    branches = sorted({s for s in sections if _is_branch(s)},
+                      key=lambda s: (int(s[3:]), s[:3] != 'reg'))
+    order = [PREPROCESS, BACKBONE, NECK] + branches + [HEAD_POST, OTHER]
+    return [s for s in order if s in sections]
+
+
+def profile_onnx(onnx_path, runs=20, warmup=5, top_k=15):
+    """
+    开启profiling推理warmup+runs次，只统计预热之后的节点事件
+    返回报告字典：单次推理耗时、按算子类型/区段/节点的耗时(ms/次)与top-k最慢节点
+    """
+    import onnxruntime as ort
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        options = ort.SessionOptions()
+        options.enable_profiling = True
+        options.profile_file_prefix = str(Path(tmp_dir) / "ort_profile")
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_BASIC
+        session = ort.InferenceSession(str(onnx_path), options, providers=['CPUExecutionProvider'])
+        feeds = random_feed(session)
+        for _ in range(warmup + runs):
+            session.run(None, feeds)
+        with open(session.end_profiling(), encoding='utf-8') as f:
+            trace = json.load(f)
+
+    model_runs = sorted((e for e in trace if e.get('name') == 'model_run'), key=lambda e: e['ts'])[warmup:]
+    start_ts = model_runs[0]['ts']
+    node_events = [e for e in trace if e.get('cat') == 'Node' and e['name'].endswith('_kernel_time')
+                   and e['ts'] >= start_ts]
+
+    sections = node_sections(onnx_path)
+    nodes = {}
+    for event in node_events:
+        name = event['name'][:-len('_kernel_time')]
+        entry = nodes.setdefault(name, {'name': name, 'op_type': event['args'].get('op_name', '?'),
+                                        'section': sections.get(name, OTHER), 'total_us': 0.0})
+        entry['total_us'] += event['dur']
+
+    node_rows = []
+    for entry in nodes.values():
+        node_rows.append({'name': entry['name'], 'op_type': entry['op_type'], 'section': entry['section'],
+                          'ms': entry['total_us'] / runs / 1000.0})
+    node_rows.sort(key=lambda r: r['ms'], reverse=True)
+    node_total = sum(r['ms'] for r in node_rows)
+
+    def group(key):
+        totals = defaultdict(lambda: [0.0, 0])
+        for row in node_rows:
+            totals[row[key]][0] += row['ms']
+            totals[row[key]][1] += 1
+        return {name: {'ms': ms, 'nodes': count, 'share': ms / node_total if node_total else 0.0}
+                for name, (ms, count) in totals.items()}
+
+    by_op = dict(sorted(group('op_type').items(), key=lambda kv: kv[1]['ms'], reverse=True))
+    section_totals = group('section')
+    by_section = {name: section_totals[name] for name in section_order(section_totals)}
+    return {
+        'model': str(onnx_path),
+        'runs': runs,
+        'warmup': warmup,
+        'graph_optimization': 'ORT_ENABLE_BASIC',
+        'inference_ms': float(np.mean([e['dur'] for e in model_runs])) / 1000.0,
+        'node_ms': node_total,
+        'by_section': by_section,
+        'by_op_type': by_op,
+        'top_nodes': node_rows[:top_k],
+        'nodes': node_rows,
+    }
+
+
+def format_profile(report):
+    """报告的Markdown表格：区段、算子类型与top-k节点"""
+    lines = [
+        f"# {Path(report['model']).name} 逐算子耗时",
+        "",
+        f"onnxruntime CPU, 图优化 {report['graph_optimization']}, {report['runs']} 次平均 "
+        f"(预热 {report['warmup']} 次): 单次推理 {report['inference_ms']:.2f} ms, 节点合计 {report['node_ms']:.2f} ms",
+        "",
+        "| 区段 | 耗时(ms) | 占比 | 节点数 |",
+        "|:---|---:|---:|---:|",
+    ]
+    for name, row in report['by_section'].items():
+        lines.append(f"| {name} | {row['ms']:.3f} | {row['share']:.1%} | {row['nodes']} |")
+    lines += ["", "| 算子类型 | 耗时(ms) | 占比 | 节点数 |", "|:---|---:|---:|---:|"]
+    for name, row in report['by_op_type'].items():
+        lines.append(f"| {name} | {row['ms']:.3f} | {row['share']:.1%} | {row['nodes']} |")
+    lines += ["", f"最慢的 {len(report['top_nodes'])} 个节点:", "",
+              "| # | 节点 | 算子 | 区段 | 耗时(ms) | 占比 |", "|---:|:---|:---|:---|---:|---:|"]
+    for i, row in enumerate(report['top_nodes'], 1):
+        share = row['ms'] / report['node_ms'] if report['node_ms'] else 0.0
+        lines.append(f"| {i} | {row['name']} | {row['op_type']} | {row['section']} | {row['ms']:.3f} | {share:.1%} |")
+    return "\n".join(lines) + "\n"
+
+
+def write_profile_report(onnx_path, runs=20, warmup=5, top_k=15):
+    """分析模型并在其旁写出 <stem>.profile.json 与 <stem>.profile.md，返回报告字典"""
+    report = profile_onnx(onnx_path, runs, warmup, top_k)
+    onnx_path = Path(onnx_path)
+    json_path = onnx_path.with_suffix('.profile.json')
+    md_path = onnx_path.with_suffix('.profile.md')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    md_path.write_text(format_profile(report), encoding='utf-8')
+
+    print(f"\n⏱️ 逐算子耗时 ({onnx_path.name}, {runs} 次平均, 单次推理 {report['inference_ms']:.2f} ms):")
+    for name, row in report['by_section'].items():
+        print(f"  {name:<12}{row['ms']:>9.3f} ms  {row['share']:>6.1%}")
+    print(f"  最慢节点:")
+    for row in report['top_nodes'][:5]:
+        print(f"    {row['name']:<28}{row['op_type']:<12}{row['section']:<12}{row['ms']:>8.3f} ms")
+    print(f"📝 耗时报告已保存: {json_path}, {md_path}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-operator onnxruntime profile of an exported RK3588 ONNX model')
+    parser.add_argument('onnx', nargs='+', help='ONNX model(s) to profile')
+    parser.add_argument('--runs', type=int, default=20, help='Profiled inference runs (default: 20)')
+    parser.add_argument('--warmup', type=int, default=5, help='Warm-up runs excluded from the profile (default: 5)')
+    parser.add_argument('--top-k', type=int, default=15, help='Slowest nodes to list (default: 15)')
+    args = parser.parse_args()
+
+    for onnx_path in args.onnx:
+        write_profile_report(onnx_path, args.runs, args.warmup, args.top_k)
+
+
+if __name__ == "__main__":
+    main()
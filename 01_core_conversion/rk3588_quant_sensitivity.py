@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+逐层INT8量化敏感度分析
+在PT模型（RK3588检测头，与导出相同的Conv+BN融合与DFL实现）上每次只伪量化一个卷积层：
+- 输入/输出激活按校准集MinMax范围做uint8非对称量化，权重做int8对称量化（默认逐通道），与rk3588_quantize一致
+- 以六个检测头输出（P6模型为八个）相对FP32的SQNR衡量影响，按最差输出的SQNR从低到高排序
+- 给出混合量化时建议保留高精度的层，rk3588_quantize.py --keep-fp32 可直接读取结果跳过这些层
+每批校准图片先缓存FP32下各层输出，量化第k层所在模块时只从该模块重新计算，前面的层直接复用缓存
+"""
+
+import argparse
+import json
+import re
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from simple_rk3588_export import load_rk3588_model
+from custom_detect_head import DFL_MODES
+from rk3588_eval_utils import DEFAULT_TRAIN_DIR, list_images, load_input_tensor, to_hw
+from rk3588_profile import BACKBONE, HEAD_POST, NECK
+
+_BLOCK_RE = re.compile(r'^model\.(\d+)\.')
+_BRANCH_RE = re.compile(r'\.(cv[23])\.(\d+)\.')
+
+
+def output_names(count):
+    """RK3588检测头输出名：reg1, cls1, reg2, cls2, ..."""
+    return [f"{'reg' if i % 2 == 0 else 'cls'}{i // 2 + 1}" for i in range(count)]
+
+
+def run_blocks(det_model, x, cache=None, start=0):
+    """
+    按DetectionModel._predict_once的顺序逐层执行，返回 (各层输出列表, 检测头输出)
+    cache为一次完整执行得到的各层输出，给出时直接复用前start层的输出，只重新计算start及之后的层
+    """
+    y = list(cache[:start]) if start else []
+    if start:
+        x = y[-1]
+    for m in det_model.model[start:]:
+        if m.f != -1:
+            x = y[m.f] if isinstance(m.f, int) else [x if j == -1 else y[j] for j in m.f]
+        x = m(x)
+        y.append(x)
+    return y, x
+
+
+def fake_quant_activation(x, value_range):
+    """uint8非对称伪量化（MinMax范围总包含0，与onnxruntime QUInt8激活一致）"""
+    lo, hi = min(value_range[0], 0.0), max(value_range[1], 0.0)
+    scale = max((hi - lo) / 255.0, 1e-8)
+    return torch.fake_quantize_per_tensor_affine(x, scale, int(round(-lo / scale)), 0, 255)
+
+
+def fake_quant_weight(weight, per_channel=True):
+    """int8对称伪量化，per_channel时按输出通道分别取scale"""
+    if not per_channel:
+        scale = max(float(weight.abs().max()) / 127.0, 1e-8)
+        return torch.fake_quantize_per_tensor_affine(weight, scale, 0, -128, 127)
+    scale = (weight.abs().amax(dim=tuple(range(1, weight.dim()))) / 127.0).clamp(min=1e-8)
+    zero_point = torch.zeros(scale.numel(), dtype=torch.int32)
+    return torch.fake_quantize_per_channel_affine(weight, scale, zero_point, 0, -128, 127)
+
+
+@contextmanager
+def quantized_layer(module, input_range, output_range, per_channel=True):
+    """临时把一个卷积层的权重、输入激活与输出激活替换为伪量化结果，退出时恢复"""
+    weight = module.weight.data
+    module.weight.data = fake_quant_weight(weight, per_channel)
+    handles = [
+        module.register_forward_pre_hook(
+            lambda m, args: (fake_quant_activation(args[0], input_range),) + tuple(args[1:])),
+        module.register_forward_hook(lambda m, args, out: fake_quant_activation(out, output_range)),
+    ]
+    try:
+        yield
+    finally:
+        for handle in handles:
+            handle.remove()
+        module.weight.data = weight
+
+
+def iter_batches(images, img_size, batch_size):
+    """按批读取校准图片（与对比器相同的letterbox），返回NCHW float32张量"""
+    for i in range(0, len(images), batch_size):
+        tensors = []
+        for path in images[i:i + batch_size]:
+            try:
+                tensors.append(load_input_tensor(path, img_size))
+            except ValueError as e:
+                print(f"⚠️ 跳过校准图片: {e}")
+        if tensors:
+            yield torch.from_numpy(np.concatenate(tensors))
+
+
+def layer_section(name, block, backbone_end, detect_block):
+    """
+    卷积层所属结构区段：backbone / neck / regN / clsN / 解码后处理，与rk3588_profile的区段一致
+    各尺度共用的DFL conv1x1在模块层面无法归到单个reg分支，归入解码后处理
+    """
+    if block == detect_block:
+        match = _BRANCH_RE.search(name + '.')
+        if match:
+            return f"{'reg' if match.group(1) == 'cv2' else 'cls'}{int(match.group(2)) + 1}"
+        return HEAD_POST
+    return BACKBONE if block <= backbone_end else NECK
+
+
+def collect_activation_ranges(det_model, layers, batches):
+    """校准pass：记录每个卷积层输入与输出激活的MinMax范围，返回 {层名: (输入范围, 输出范围)}"""
+    ranges = {}
+
+    def make_hook(name):
+        def hook(module, args, out):
+            inp = args[0]
+            old = ranges.get(name, ((np.inf, -np.inf), (np.inf, -np.inf)))
+            ranges[name] = ((min(old[0][0], float(inp.min())), max(old[0][1], float(inp.max()))),
+                            (min(old[1][0], float(out.min())), max(old[1][1], float(out.max()))))
+        return hook
+
+    handles = [module.register_forward_hook(make_hook(name)) for name, module, _ in layers]
+    try:
+        for x in batches:
+            run_blocks(det_model, x)
+    finally:
+        for handle in handles:
+            handle.remove()
+    return ranges
+
+
+def analyze_sensitivity(model_path, calib_images=None, img_size=640, batch_size=4, per_channel=True, dfl='conv'):
+    """
+    逐层伪量化并统计各输出的SQNR，返回报告字典（layers按敏感度从高到低排序）
+    SQNR = 10*log10(Σref² / Σ(ref-quant)²)，在全部校准图片上累计；数值越低该层越不适合INT8
+    """
+    if calib_images is None:
+        calib_images = list_images(DEFAULT_TRAIN_DIR, 16)
+    if not calib_images:
+        raise ValueError("未找到校准图片")
+    img_size = to_hw(img_size)
+
+    model = load_rk3588_model(model_path, fuse=True, dfl=dfl)
+    det_model = model.model
+    blocks = det_model.model
+    detect_block = len(blocks) - 1
+    backbone_end = max((i for i, m in enumerate(blocks) if type(m).__name__ == 'SPPF'), default=9)
+    layers = []
+    for name, module in det_model.named_modules():
+        match = _BLOCK_RE.match(name)
+        if isinstance(module, nn.Conv2d) and match:
+            layers.append((name, module, int(match.group(1))))
+
+    print(f"🧪 逐层量化敏感度: {len(layers)} 个卷积层, 校准图片 {len(calib_images)} 张, 输入 {img_size}")
+    print(f"✓ 权重int8{'逐通道' if per_channel else '逐张量'}, 激活uint8 MinMax")
+    start_time = time.perf_counter()
+    with torch.no_grad():
+        ranges = collect_activation_ranges(det_model, layers, iter_batches(calib_images, img_size, batch_size))
+        # DFL非conv实现或只导出部分尺度时，未被调用的卷积层不在导出图中
+        layers = [layer for layer in layers if layer[0] in ranges]
+
+        names = None
+        sums = {}  # {层名: [[Σ(ref-quant)², Σref²], ...]}
+        done = 0
+        for x in iter_batches(calib_images, img_size, batch_size):
+            cache, reference = run_blocks(det_model, x)
+            names = names or output_names(len(reference))
+            for name, module, block in layers:
+                with quantized_layer(module, *ranges[name], per_channel=per_channel):
+                    _, outputs = run_blocks(det_model, x, cache, start=block)
+                acc = sums.setdefault(name, [[0.0, 0.0] for _ in reference])
+                for item, ref, out in zip(acc, reference, outputs):
+                    item[0] += float(((ref.double() - out.double()) ** 2).sum())
+                    item[1] += float((ref.double() ** 2).sum())
+            done += len(x)
+            print(f"  进度: {done}/{len(calib_images)} 张, 已用 {time.perf_counter() - start_time:.1f} s")
+
+    results = []
+    for name, module, block in layers:
+        sqnr = {out_name: 10 * np.log10(signal / noise) if noise > 0 else float('inf')
+                for out_name, (noise, signal) in zip(names, sums[name])}
+        results.append({
+            'layer': name,
+            'block': block,
+            'module': type(blocks[block]).__name__,
+            'section': layer_section(name, block, backbone_end, detect_block),
+            'shape': list(module.weight.shape),
+            'sqnr_db': sqnr,
+            'min_sqnr_db': min(sqnr.values()),
+            'worst_output': min(sqnr, key=sqnr.get),
+            'mean_sqnr_db': float(np.mean([v for v in sqnr.values() if np.isfinite(v)] or [float('inf')])),
+        })
+    results.sort(key=lambda r: (r['min_sqnr_db'], r['mean_sqnr_db']))
+
+    # 缓存复用省去的层计算比例（量化第k个模块的层时跳过前k个模块）
+    skipped = sum(block for _, _, block in layers) / max(len(layers) * len(blocks), 1)
+    elapsed = time.perf_counter() - start_time
+    print(f"⏱️ 分析耗时 {elapsed:.1f} s，激活缓存跳过了 {skipped:.0%} 的模块重算")
+    return {
+        'model': str(model_path),
+        'imgsz': list(img_size),
+        'dfl': dfl,
+        'per_channel': per_channel,
+        'calib_images': len(calib_images),
+        'outputs': names,
+        'elapsed_s': elapsed,
+        'layers': results,
+    }
+
+
+def select_keep_layers(report, keep=5, min_sqnr=None):
+    """选出建议保留高精度的层：min_sqnr给出时取最差SQNR低于该阈值的全部层，否则取最敏感的keep个"""
+    layers = report['layers']
+    if min_sqnr is not None:
+        return [r['layer'] for r in layers if r['min_sqnr_db'] < min_sqnr]
+    return [r['layer'] for r in layers[:keep]]
+
+
+def format_report(report, top_k=15):
+    """格式化敏感度排名（最敏感的top_k层）"""
+    names = report['outputs']
+    lines = [f"📊 量化敏感度排名 (SQNR dB，越低越敏感，前 {min(top_k, len(report['layers']))} 层):",
+             f"  {'层':<28}{'区段':<10}{'最差':>8}{'平均':>8}  " + ''.join(f"{n:>8}" for n in names)]
+    for r in report['layers'][:top_k]:
+        lines.append(f"  {r['layer']:<28}{r['section']:<10}{r['min_sqnr_db']:>8.1f}{r['mean_sqnr_db']:>8.1f}  "
+                     + ''.join(f"{r['sqnr_db'][n]:>8.1f}" for n in names))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rank conv layers by their INT8 quantization sensitivity on the '
+                                                 'RK3588 head outputs and suggest layers to keep in higher precision')
+    parser.add_argument('model', help='Path to YOLOv8 model (.pt file)')
+    parser.add_argument('--imgsz', type=int, nargs='+', default=[640],
+                        help='Input size: one value for square or H W (default: 640)')
+    parser.add_argument('--calib-dir', default=str(DEFAULT_TRAIN_DIR),
+                        help='Calibration image folder or calib_subset.py manifest')
+    parser.add_argument('--calib-limit', type=int, default=16,
+                        help='Use at most N calibration images, manifests are subsampled evenly (default: 16)')
+    parser.add_argument('--batch', type=int, default=4, help='Images per cached activation batch (default: 4)')
+    parser.add_argument('--per-tensor', action='store_true', help='Per-tensor instead of per-channel weights')
+    parser.add_argument('--dfl', choices=DFL_MODES, default='conv', help='DFL implementation used for export')
+    parser.add_argument('--keep', type=int, default=5, help='Most sensitive layers to keep in FP32 (default: 5)')
+    parser.add_argument('--min-sqnr', type=float,
+                        help='Instead of --keep, keep every layer whose worst-output SQNR is below this (dB)')
+    parser.add_argument('--top-k', type=int, default=15, help='Layers listed in the printed ranking (default: 15)')
+    parser.add_argument('-o', '--output', help='Output JSON (default: <model>.quant_sensitivity.json)')
+    args = parser.parse_args()
+
+    img_size = args.imgsz[0] if len(args.imgsz) == 1 else tuple(args.imgsz[:2])
+    calib_images = list_images(args.calib_dir, args.calib_limit)
+    report = analyze_sensitivity(args.model, calib_images, img_size, args.batch, not args.per_tensor, args.dfl)
+    report['keep_fp32'] = select_keep_layers(report, args.keep, args.min_sqnr)
+
+    print(f"\n{format_report(report, args.top_k)}")
+    print(f"\n🎯 建议保留高精度的层 ({len(report['keep_fp32'])}): {', '.join(report['keep_fp32']) or '无'}")
+    output = Path(args.output) if args.output else Path(args.model).with_suffix('.quant_sensitivity.json')
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"📝 结果已保存: {output}")
+    print(f"💡 混合量化: python rk3588_quantize.py <fp32.onnx> --keep-fp32 {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+RK3588 ONNX INT8静态量化
+在export_rk3588_onnx导出的FP32模型之后运行：
+- 校准数据从datasets/temp/images/train逐张流式读取，与对比器使用同一letterbox
+- 输出INT8模型，并在验证集上报告逐输出误差和与FP32的检测一致性
+- 可按rk3588_quant_sensitivity.py的分析结果让敏感层保留FP32（混合量化）
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat,
+                                      QuantType, quantize_static)
+
+from rk3588_eval_utils import (DEFAULT_TRAIN_DIR, DEFAULT_VAL_DIR, create_cpu_session,
+                               detection_agreement, list_images, load_input_tensor, measure_latency,
+                               network_input_size, onnx_input_dtype, onnx_size_mb, output_error,
+                               session_input_size)
+from rk3588_host_utils import decode_detections
+from rk3588_profile import node_module_path
+
+
+def model_input_info(onnx_path):
+    """读取模型输入名、输入尺寸(H, W)与输入数据类型"""
+    session = create_cpu_session(onnx_path)
+    return session.get_inputs()[0].name, session_input_size(session), onnx_input_dtype(session)
+
+
+class LetterboxCalibrationReader(CalibrationDataReader):
+    """流式校准数据读取器：每次get_next才读取并预处理一张图片，不在内存中保留整个数据集"""
+
+    def __init__(self, image_paths, input_name, img_size=(640, 640), dtype=np.float32):
+        self.image_paths = list(image_paths)
+        self.input_name = input_name
+        self.img_size = img_size
+        self.dtype = dtype
+        self.rewind()
+
+    def _generate(self):
+        for index, path in enumerate(self.image_paths):
+            try:
+                tensor = load_input_tensor(path, self.img_size, self.dtype)
+            except ValueError as e:
+                print(f"⚠️ 跳过校准图片: {e}")
+                continue
+            if (index + 1) % 50 == 0:
+                print(f"  校准进度: {index + 1}/{len(self.image_paths)}")
+            yield {self.input_name: tensor}
+
+    def get_next(self):
+        return next(self._iterator, None)
+
+    def rewind(self):
+        self._iterator = self._generate()
+
+
+def keep_fp32_nodes(onnx_path, layers):
+    """
+    将PyTorch卷积层名（如 model.22.cv3.0.2）映射为ONNX中的Conv节点名
+    导出包装层（uint8输入/图内letterbox）会给模块路径加前缀，因此按路径后缀匹配
+    返回 (节点名列表, 未找到对应节点的层名列表)；同一层被多次调用（如每个尺度共用的DFL conv1x1）时对应多个节点
+    """
+    import onnx
+
+    graph = onnx.load(str(onnx_path), load_external_data=False).graph
+    nodes, matched = [], set()
+    for node in graph.node:
+        if node.op_type != 'Conv':
+            continue
+        path = node_module_path(node)
+        for layer in layers:
+            if path == layer or path.endswith('.' + layer):
+                nodes.append(node.name)
+                matched.add(layer)
+                break
+    return nodes, [layer for layer in layers if layer not in matched]
+
+
+def quantize_rk3588_onnx(fp32_path, int8_path=None, calib_images=None, calib_limit=None, per_channel=True,
+                         keep_fp32=None):
+    """
+    使用onnxruntime静态量化器生成INT8模型 (QDQ格式)
+    keep_fp32为保留FP32的PyTorch卷积层名列表（rk3588_quant_sensitivity.py的keep_fp32），对应Conv节点不量化
+    """
+    if int8_path is None:
+        int8_path = str(Path(fp32_path).with_name(Path(fp32_path).stem + "_int8.onnx"))
+    if calib_images is None:
+        calib_images = list_images(DEFAULT_TRAIN_DIR, calib_limit)
+    if not calib_images:
+        raise ValueError("未找到校准图片")
+
+    input_name, img_size, dtype = model_input_info(fp32_path)
+    print(f"📦 INT8静态量化: {fp32_path}")
+    print(f"✓ 校准图片: {len(calib_images)} 张, 输入 {input_name} {img_size}")
+    reader = LetterboxCalibrationReader(calib_images, input_name, img_size, dtype)
+    nodes_to_exclude = []
+    if keep_fp32:
+        nodes_to_exclude, missing = keep_fp32_nodes(fp32_path, keep_fp32)
+        print(f"✓ 混合量化: {len(keep_fp32)} 个敏感层保留FP32 → {len(nodes_to_exclude)} 个Conv节点")
+        if missing:
+            # 导出时的DFL实现/尺度数与敏感度分析不一致时会出现
+            print(f"⚠️ 以下层在ONNX中没有对应的Conv节点: {', '.join(missing)}")
+
+    quantize_static(
+        str(fp32_path),
+        str(int8_path),
+        reader,
+        quant_format=QuantFormat.QDQ,
+        per_channel=per_channel,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method=CalibrationMethod.MinMax,
+        nodes_to_exclude=nodes_to_exclude,
+    )
+    print(f"✅ INT8模型已保存: {int8_path}")
+    return int8_path
+
+
+def int8_report(fp32_path, int8_path, val_images=None, conf_threshold=0.25, iou_threshold=0.5):
+    """在验证集上对比INT8与FP32：逐输出误差、检测一致性、CPU延迟"""
+    if val_images is None:
+        val_images = list_images(DEFAULT_VAL_DIR)
+    fp32_sess = create_cpu_session(fp32_path)
+    int8_sess = create_cpu_session(int8_path)
+    input_name, img_size, dtype = model_input_info(fp32_path)
+    decode_size = network_input_size(fp32_sess)
+    names = [o.name for o in fp32_sess.get_outputs()]
+
+    stats = {name: {'max_abs': 0.0, 'cosine_sum': 0.0, 'cosine_min': 1.0} for name in names}
+    fp32_dets, int8_dets = [], []
+    x = None
+    for path in val_images:
+        x = load_input_tensor(path, img_size, dtype)
+        ref = fp32_sess.run(None, {input_name: x})
+        out = int8_sess.run(None, {input_name: x})
+        for name, a, b in zip(names, ref, out):
+            max_abs, cosine = output_error(a, b)
+            stats[name]['max_abs'] = max(stats[name]['max_abs'], max_abs)
+            stats[name]['cosine_min'] = min(stats[name]['cosine_min'], cosine)
+            stats[name]['cosine_sum'] += cosine
+        fp32_dets.append(decode_detections(ref, names, decode_size, conf_threshold))
+        int8_dets.append(decode_detections(out, names, decode_size, conf_threshold))
+
+    print(f"\n📋 INT8精度报告 ({len(val_images)} 张验证图片):")
+    print(f"  {'输出':<8}{'最大误差':>12}{'平均余弦':>12}{'最小余弦':>12}")
+    for name in names:
+        st = stats[name]
+        st['cosine_mean'] = st.pop('cosine_sum') / max(len(val_images), 1)
+        print(f"  {name:<8}{st['max_abs']:>12.4e}{st['cosine_mean']:>12.6f}{st['cosine_min']:>12.6f}")
+
+    agreement = detection_agreement(fp32_dets, int8_dets, iou_threshold)
+    print(f"  检测一致性 (conf>{conf_threshold}, IoU>={iou_threshold}): "
+          f"FP32 {agreement['ref_count']} 个, INT8 {agreement['test_count']} 个, "
+          f"召回 {agreement['recall']:.3f}, 精确 {agreement['precision']:.3f}, "
+          f"平均置信度差 {agreement['mean_score_diff']:.4f}")
+
+    report = {'outputs': stats, 'agreement': agreement}
+    if x is not None:
+        report['latency_fp32_ms'] = measure_latency(fp32_sess, {input_name: x})
+        report['latency_int8_ms'] = measure_latency(int8_sess, {input_name: x})
+        print(f"  CPU延迟: FP32 {report['latency_fp32_ms']:.2f} ms, INT8 {report['latency_int8_ms']:.2f} ms")
+    report['size_fp32_mb'] = onnx_size_mb(fp32_path)
+    report['size_int8_mb'] = onnx_size_mb(int8_path)
+    print(f"  模型大小: FP32 {report['size_fp32_mb']:.2f} MB, INT8 {report['size_int8_mb']:.2f} MB")
+
+    report_path = Path(int8_path).with_suffix('.report.json')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"📝 报告已保存: {report_path}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='INT8 static quantization for RK3588 ONNX exports')
+    parser.add_argument('model', help='FP32 ONNX exported by simple_rk3588_export.py')
+    parser.add_argument('-o', '--output', help='Output INT8 ONNX path (default: *_int8.onnx)')
+    parser.add_argument('--calib-dir', default=str(DEFAULT_TRAIN_DIR),
+                        help='Calibration image folder or calib_subset.py manifest')
+    parser.add_argument('--calib-limit', type=int, help='Use at most N calibration images')
+    parser.add_argument('--val-dir', default=str(DEFAULT_VAL_DIR), help='Validation image folder for the report')
+    parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold for detection agreement')
+    parser.add_argument('--per-tensor', action='store_true', help='Per-tensor instead of per-channel weights')
+    parser.add_argument('--keep-fp32', metavar='JSON',
+                        help='Sensitivity report from rk3588_quant_sensitivity.py; its keep_fp32 layers stay FP32')
+    args = parser.parse_args()
+
+    keep_fp32 = None
+    if args.keep_fp32:
+        with open(args.keep_fp32, 'r', encoding='utf-8') as f:
+            keep_fp32 = json.load(f).get('keep_fp32', [])
+    calib_images = list_images(args.calib_dir, args.calib_limit)
+    int8_path = quantize_rk3588_onnx(args.model, args.output, calib_images, per_channel=not args.per_tensor,
+                                     keep_fp32=keep_fp32)
+    int8_report(args.model, int8_path, list_images(args.val_dir), args.conf)
+
+
+if __name__ == "__main__":
+    main()
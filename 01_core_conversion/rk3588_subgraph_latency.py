@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+子图延迟拆分
+按rk3588_profile的结构区段（预处理 / backbone / neck / 六个reg/cls分支 / 解码后处理）在区段边界切分
+simple_rk3588_export.py导出的ONNX，用onnx.utils.Extractor抽取子图后逐段以onnxruntime测量：
+- 单段延迟：只运行该区段的子图，输入为整图推理时该切分点的真实张量
+- 累计延迟：从图输入到目前为止各区段输出的前缀子图
+多个模型（如不同分辨率的导出）时额外输出 backbone / neck / 检测头 对比表，看哪一部分主导延迟
+"""
+
+import argparse
+import json
+from collections import Counter
+from pathlib import Path
+
+from rk3588_eval_utils import measure_latency, network_input_size, random_feed
+from rk3588_profile import BACKBONE, NECK, PREPROCESS, node_sections, section_order
+
+HEAD = '检测头'
+
+
+def segment_io(graph, sections):
+    """
+    各区段的切分点，返回 {区段: (输入张量名列表, 输出张量名列表)}
+    输入为该区段使用、但由其他区段产生的张量或图输入（不含权重），输出为被其他区段使用的张量或图输出
+    """
+    initializers = {init.name for init in graph.initializer}
+    graph_outputs = {o.name for o in graph.output}
+    producer = {name: sections[node.name] for node in graph.node for name in node.output if name}
+    consumers = {}
+    for node in graph.node:
+        for name in node.input:
+            if name:
+                consumers.setdefault(name, set()).add(sections[node.name])
+
+    io = {}
+    for node in graph.node:
+        section = sections[node.name]
+        inputs, outputs = io.setdefault(section, ({}, {}))
+        for name in node.input:
+            if name and name not in initializers and producer.get(name) != section:
+                inputs[name] = None
+        for name in node.output:
+            if name and (name in graph_outputs or consumers.get(name, set()) - {section}):
+                outputs[name] = None
+    return {section: (list(inputs), list(outputs)) for section, (inputs, outputs) in io.items() if outputs}
+
+
+def create_session(model):
+    """从内存中的ModelProto创建CPU推理会话（默认图优化）"""
+    import onnxruntime as ort
+
+    return ort.InferenceSession(model.SerializeToString(), providers=['CPUExecutionProvider'])
+
+
+def subgraph_latency(onnx_path, runs=50, warmup=5, img_size=None):
+    """逐区段抽取子图并测量单段/累计延迟，返回报告字典"""
+    import onnx
+    from onnx.utils import Extractor
+
+    model = onnx.load(str(onnx_path))
+    if not model.graph.value_info:
+        model = onnx.shape_inference.infer_shapes(model)
+    extractor = Extractor(model)
+    sections = node_sections(onnx_path)
+    io = segment_io(model.graph, sections)
+    order = section_order(io)
+    initializers = {init.name for init in model.graph.initializer}
+    graph_inputs = [i.name for i in model.graph.input if i.name not in initializers]
+    graph_outputs = [o.name for o in model.graph.output]
+
+    # 整图附加全部切分点输出，推理一次得到各区段的真实输入
+    cut_tensors = [name for section in order for name in io[section][0] if name not in graph_inputs]
+    capture = create_session(extractor.extract_model(graph_inputs, list(dict.fromkeys(graph_outputs + cut_tensors))))
+    feeds = random_feed(capture, img_size=img_size)
+    values = dict(zip([o.name for o in capture.get_outputs()], capture.run(None, feeds)))
+    values.update(feeds)
+
+    full_session = create_session(model)
+    full_ms = measure_latency(full_session, feeds, warmup, runs)
+    print(f"⏱️ {Path(onnx_path).name}: 整图 {full_ms:.2f} ms")
+
+    node_counts = Counter(sections.values())
+    rows, produced = [], []
+    for section in order:
+        inputs, outputs = io[section]
+        segment = create_session(extractor.extract_model(inputs, outputs))
+        segment_ms = measure_latency(segment, {name: values[name] for name in inputs}, warmup, runs)
+        produced += outputs
+        prefix = create_session(extractor.extract_model(graph_inputs, list(dict.fromkeys(produced))))
+        cumulative_ms = measure_latency(prefix, feeds, warmup, runs)
+        rows.append({'section': section, 'ms': segment_ms, 'cumulative_ms': cumulative_ms,
+                     'nodes': node_counts[section], 'inputs': inputs, 'outputs': outputs})
+        print(f"  {section:<10}{segment_ms:>9.2f} ms  累计 {cumulative_ms:>9.2f} ms")
+
+    segment_total = sum(row['ms'] for row in rows)
+    for row in rows:
+        row['share'] = row['ms'] / segment_total if segment_total else 0.0
+    return {
+        'model': str(onnx_path),
+        'imgsz': list(network_input_size(full_session)),
+        'runs': runs,
+        'full_ms': full_ms,
+        'segment_total_ms': segment_total,
+        'parts': part_totals(rows),
+        'segments': rows,
+    }
+
+
+def part_totals(rows):
+    """按 预处理 / backbone / neck / 检测头（各reg/cls分支与解码后处理）汇总单段延迟"""
+    parts = {}
+    for row in rows:
+        part = row['section'] if row['section'] in (PREPROCESS, BACKBONE, NECK) else HEAD
+        parts[part] = parts.get(part, 0.0) + row['ms']
+    return parts
+
+
+def format_report(report):
+    """单个模型的Markdown表格"""
+    lines = [
+        f"# {Path(report['model']).name} 子图延迟 ({report['imgsz'][0]}x{report['imgsz'][1]})",
+        "",
+        f"onnxruntime CPU, {report['runs']} 次平均: 整图 {report['full_ms']:.2f} ms, "
+        f"分段合计 {report['segment_total_ms']:.2f} ms",
+        "",
+        "| 区段 | 单段(ms) | 占分段合计 | 累计(ms) | 累计/整图 | 节点数 |",
+        "|:---|---:|---:|---:|---:|---:|",
+    ]
+    for row in report['segments']:
+        lines.append(f"| {row['section']} | {row['ms']:.3f} | {row['share']:.1%} | {row['cumulative_ms']:.3f} | "
+                     f"{row['cumulative_ms'] / report['full_ms']:.1%} | {row['nodes']} |")
+    return "\n".join(lines) + "\n"
+
+
+def format_comparison(reports):
+    """多个模型的 backbone / neck / 检测头 对比表"""
+    parts = [p for p in (PREPROCESS, BACKBONE, NECK, HEAD) if any(p in r['parts'] for r in reports)]
+    lines = ["| 模型 | 输入 | " + " | ".join(f"{p}(ms)" for p in parts) + " | 整图(ms) | 主导 |",
+             "|:---|:---|" + "---:|" * len(parts) + "---:|:---|"]
+    for r in reports:
+        dominant = max(r['parts'], key=r['parts'].get)
+        lines.append(f"| {Path(r['model']).name} | {r['imgsz'][0]}x{r['imgsz'][1]} | "
+                     + " | ".join(f"{r['parts'].get(p, 0.0):.2f}" for p in parts)
+                     + f" | {r['full_ms']:.2f} | {dominant} |")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Split exported RK3588 ONNX models into backbone/neck/head '
+                                                 'sub-graphs and benchmark each segment with onnxruntime')
+    parser.add_argument('models', nargs='+', help='ONNX models exported by simple_rk3588_export.py')
+    parser.add_argument('--runs', type=int, default=50, help='Timed runs per sub-graph (default: 50)')
+    parser.add_argument('--warmup', type=int, default=5, help='Warmup runs per sub-graph (default: 5)')
+    parser.add_argument('--imgsz', type=int, default=640, help='Input size for dynamic-shape models (default: 640)')
+    parser.add_argument('-o', '--output', help='Optional Markdown file for the cross-model comparison')
+    args = parser.parse_args()
+
+    reports = []
+    for model in args.models:
+        report = subgraph_latency(model, args.runs, args.warmup, args.imgsz)
+        json_path = Path(model).with_suffix('.subgraph_latency.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n{format_report(report)}")
+        print(f"📝 结果已保存: {json_path}")
+        reports.append(report)
+
+    if len(reports) > 1:
+        comparison = format_comparison(reports)
+        print(f"\n📊 各模型延迟构成:\n{comparison}")
+        if args.output:
+            Path(args.output).write_text(comparison, encoding='utf-8')
+            print(f"📝 对比表已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,15 +7,37 @@
 import torch
 import torch.nn as nn
 from ultralytics import YOLO
+import copy
 import types
 import argparse
+import tempfile
 from pathlib import Path
 import warnings
+from export_cache import ExportCache, file_sha256
+from custom_detect_head import (DFL_MODES, OUTPUT_LAYOUTS, arrange_outputs, decode_dist_boxes, dfl_expectation,
+                                prune_class_channels, select_topk_candidates)
 warnings.filterwarnings('ignore')
 
+# 写入ONNX metadata_props的字段版本，字段变化时递增（同时使旧的导出缓存失效）
+METADATA_VERSION = 2
+# 检测头替换与导出逻辑所在的源文件，内容哈希计入导出缓存键，修改后旧缓存自动失效
+EXPORTER_SOURCES = (Path(__file__).resolve(), Path(__file__).resolve().with_name('custom_detect_head.py'))
 
-def create_rk3588_forward(detect_head):
-    """为检测头创建RK3588风格的forward方法"""
+
+def create_rk3588_forward(detect_head, decode_boxes=False, topk=None, keep_classes=None, layout='rk3588',
+                          max_scales=None, dfl='conv'):
+    """
+    为检测头创建RK3588风格的forward方法，默认导出全部尺度（P5模型6个输出，P6模型8个输出）
+    max_scales=n时只导出前n个尺度（如3：去掉4尺度模型的P6检测头，兼容只接受6输出的部署代码）
+    decode_boxes=True时在图内完成anchor解码，regN替换为boxN：[batch, 1, 4, H*W] 输入像素坐标xyxy
+    topk=k时在图内解码并按最大类别分数取前k个候选，输出 (boxes [batch, k, 4], scores [batch, k], class_ids [batch, k])
+    keep_classes给出时裁剪cv3最后一层，clsN只包含这些类别（class_ids为子集内的序号）
+    layout为anchor_major/concat时输出改为anchor连续排列，见custom_detect_head.OUTPUT_LAYOUTS
+    dfl为DFL期望值的图内实现：conv（默认，固定权重conv1x1）、reducesum或matmul，见custom_detect_head.DFL_MODES
+    """
+    
+    if keep_classes:
+        prune_class_channels(detect_head, keep_classes)
     
     # 创建conv1x1层 - 按照yolov8_train_inf.md第120-122行
     conv1x1 = nn.Conv2d(16, 1, 1, bias=False).requires_grad_(False)
@@ -28,36 +50,160 @@ def create_rk3588_forward(detect_head):
     def rk3588_forward(self, x):
         """完全复制yolov8_train_inf.md第125-134行的forward逻辑"""
         y = []
-        # 仅保留前三个尺度（P3/P4/P5），统一导出为6个输出张量
-        for i in range(min(self.nl, 3)):
+        # 每个尺度导出 (regN, clsN) 两个输出，步长取自self.stride
+        for i in range(min(self.nl, max_scales or self.nl)):
             t1 = self.cv2[i](x[i])  # 回归分支
             t2 = self.cv3[i](x[i])  # 分类分支（保持logits格式，不加sigmoid）
             
-            # 完全复制文档第132行的DFL处理逻辑
-            dfl_processed = self.conv1x1(
-                t1.view(t1.shape[0], 4, 16, -1)  # reshape to [batch, 4, 16, H*W]
-                .transpose(2, 1)                  # transpose to [batch, 16, 4, H*W]
-                .softmax(1)                      # softmax on 16 distributions
-            )  # conv1x1: [batch, 1, 4, H*W]
+            # DFL期望值，conv模式即文档第132行的 view → transpose → softmax → conv1x1
+            dfl_processed = dfl_expectation(t1, dfl, self.conv1x1)  # [batch, 1, 4, H*W]
             
             # RK3588 期望的回归输出布局：保持扁平化 [batch, 1, 4, H*W]
             reg_output = dfl_processed
+            if decode_boxes or topk:
+                reg_output = decode_dist_boxes(dfl_processed, t1.shape[2], t1.shape[3], float(self.stride[i]))
             
-            y.append(reg_output)  # regN
+            y.append(reg_output)  # regN / boxN
             y.append(t2)         # clsN
         
-        return y
+        if topk:
+            return list(select_topk_candidates(y[0::2], y[1::2], topk))
+        return arrange_outputs(y[0::2], y[1::2], layout)
     
     return rk3588_forward
 
 
-def export_rk3588_onnx(model_path, output_path=None):
-    """导出RK3588优化的ONNX模型"""
+class UInt8NHWCInput(nn.Module):
+    """
+    uint8 NHWC BGR输入包装，与RKNN直接接收摄像头帧的方式一致，主机端无需归一化/转置
+    /255与BGR→RGB折叠进第一层卷积权重（零填充下完全等价），图内只剩Transpose与Cast
+    折叠在模型的深拷贝上进行，传入的模型保持不变，可重复包装或继续作为float输入模型使用
+    """
     
-    if output_path is None:
-        model_stem = Path(model_path).stem
-        output_path = f"{model_stem}_rk3588_simple.onnx"
+    def __init__(self, model):
+        super().__init__()
+        model = copy.deepcopy(model)
+        first_conv = model.model[0].conv
+        with torch.no_grad():
+            first_conv.weight.copy_(first_conv.weight.flip(1) / 255.0)
+        self.model = model
+    
+    def forward(self, x):
+        return self.model(x.permute(0, 3, 1, 2).float())
+
+
+class RawFrameLetterbox(UInt8NHWCInput):
+    """
+    固定分辨率原始帧输入：图内完成letterbox（双线性缩放 + 114灰边填充），主机端直接送入摄像头帧
+    缩放与填充参数与主机端letterbox一致，输入为uint8 [batch, raw_h, raw_w, 3] BGR
+    """
+    
+    def __init__(self, model, raw_size, img_size):
+        super().__init__(model)
+        import rk3588_eval_utils  # noqa: F401  将02_validation_tools加入sys.path
+        from rk3588_host_utils import letterbox_params
+        
+        self.ratio, new_unpad, borders, self.pad = letterbox_params(raw_size, img_size)
+        self.resize_hw = (new_unpad[1], new_unpad[0])
+        self.resize = tuple(raw_size) != self.resize_hw
+        top, bottom, left, right = borders
+        self.borders = (left, right, top, bottom)  # F.pad顺序
+    
+    def forward(self, x):
+        x = x.permute(0, 3, 1, 2).float()
+        if self.resize:
+            x = nn.functional.interpolate(x, size=self.resize_hw, mode='bilinear', align_corners=False)
+        x = nn.functional.pad(x, self.borders, value=114.0)
+        return self.model(x)
+
+
+def export_module(model, uint8_input=False, raw_frame=None, img_size=None):
+    """返回实际导出的模块：uint8_input时包装为uint8 NHWC BGR输入，raw_frame时再加图内letterbox"""
+    if raw_frame:
+        return RawFrameLetterbox(model.model, raw_frame, img_size)
+    return UInt8NHWCInput(model.model) if uint8_input else model.model
+
+
+def write_onnx_metadata(onnx_path, metadata):
+    """写入ONNX metadata_props（非字符串值按JSON编码），外部权重文件保持不变"""
+    import json
+    import onnx
     
+    model = onnx.load(str(onnx_path), load_external_data=False)
+    existing = {prop.key: prop for prop in model.metadata_props}
+    for key, value in metadata.items():
+        value = value if isinstance(value, str) else json.dumps(value)
+        if key in existing:
+            existing[key].value = value
+        else:
+            model.metadata_props.add(key=key, value=value)
+    onnx.save(model, str(onnx_path))
+
+
+def preprocess_contract(uint8_input=False, raw_frame=None):
+    """模型输入对应的主机端预处理约定，写入ONNX元数据的preprocess"""
+    if raw_frame:
+        input_format = 'uint8_nhwc_bgr_raw_frame'
+    else:
+        input_format = 'uint8_nhwc_bgr' if uint8_input else 'float_nchw_rgb'
+    return {
+        'input_format': input_format,
+        'letterbox': 'in_graph' if raw_frame else 'host',  # 等比缩放 + 居中灰边填充
+        'pad_value': 114,
+        'normalize': 'in_graph' if uint8_input or raw_frame else 'host_div_255',
+        'cls_activation': 'sigmoid',  # clsN为logits，topk的scores已做sigmoid
+    }
+
+
+def make_dummy_input(batch, img_h, img_w, uint8_input=False):
+    """构造与导出模块输入格式一致的追踪输入"""
+    if uint8_input:
+        return torch.randint(0, 256, (batch, img_h, img_w, 3), dtype=torch.uint8)
+    return torch.randn(batch, 3, img_h, img_w)
+
+
+def benchmark_batch_latency(onnx_path, img_size=640, batch_sizes=(1, 4, 8)):
+    """在多个batch下验证动态batch模型，并打印单张图片的平均延迟"""
+    from rk3588_eval_utils import create_cpu_session, random_feed, measure_latency
+
+    session = create_cpu_session(onnx_path)
+    results = {}
+    print(f"\n⏱️ 动态batch延迟测试 (onnxruntime CPU):")
+    for batch in batch_sizes:
+        feeds = random_feed(session, batch_size=batch, img_size=img_size)
+        outputs = session.run(None, feeds)
+        bad = [o.shape for o in outputs if o.shape[0] != batch]
+        if bad:
+            raise RuntimeError(f"batch={batch} 时输出batch维不匹配: {bad}")
+        latency = measure_latency(session, feeds)
+        results[batch] = latency / batch
+        print(f"  batch={batch}: 总耗时 {latency:.2f} ms, 单张 {latency / batch:.2f} ms")
+
+    base = results.get(batch_sizes[0])
+    if base:
+        for batch in batch_sizes[1:]:
+            print(f"  batch={batch} 相比 batch={batch_sizes[0]} 单张提速: {base / results[batch]:.2f}x")
+    return results
+
+
+def fuse_conv_bn(model):
+    """将Conv+BatchNorm融合为单个Conv，返回融合的层数"""
+    from ultralytics.utils.torch_utils import fuse_conv_and_bn
+
+    fused = 0
+    for module in model.modules():
+        # ultralytics的Conv/DWConv均带有bn与forward_fuse
+        if isinstance(getattr(module, 'bn', None), nn.BatchNorm2d) and hasattr(module, 'forward_fuse'):
+            module.conv = fuse_conv_and_bn(module.conv, module.bn)
+            delattr(module, 'bn')
+            module.forward = module.forward_fuse
+            fused += 1
+    return fused
+
+
+def load_rk3588_model(model_path, fuse=True, decode_boxes=False, topk=None, keep_classes=None, layout='rk3588',
+                      max_scales=None, dfl='conv'):
+    """加载YOLO模型并替换为RK3588检测头forward"""
     print(f"📦 加载YOLO模型: {model_path}")
     model = YOLO(model_path)
     
@@ -68,45 +214,419 @@ def export_rk3588_onnx(model_path, output_path=None):
     # 获取检测头
     detect_head = model.model.model[-1]
     print(f"✓ 检测头类型: {type(detect_head)}")
-    print(f"✓ 检测层数: {detect_head.nl}")
+    print(f"✓ 检测层数: {detect_head.nl} (步长 {[int(s) for s in detect_head.stride]})")
     print(f"✓ 类别数: {detect_head.nc}")
     
+    # Conv+BN融合：在导出前折叠BN参数，减少图中节点
+    if fuse:
+        fused = fuse_conv_bn(model.model)
+        print(f"🔗 Conv+BN融合: {fused} 层")
+    
     # 动态替换forward方法
     print(f"🔄 替换检测头forward方法...")
-    new_forward = create_rk3588_forward(detect_head)
+    if topk:
+        print(f"📦 图内TopK预筛选: 输出前{topk}个候选 (boxes, scores, class_ids)")
+    elif decode_boxes:
+        print(f"📦 图内框解码: regN → boxN (输入像素坐标xyxy)")
+    if keep_classes:
+        names = [model.names.get(c, str(c)) for c in keep_classes]
+        print(f"✂️ 类别子集: {detect_head.nc} → {len(keep_classes)} 类 {list(keep_classes)} ({', '.join(names)})")
+    if layout != 'rk3588':
+        print(f"📦 输出布局: {layout} (anchor连续排列，主机端免转置)")
+    if dfl != 'conv':
+        print(f"📦 DFL实现: {dfl}")
+    if max_scales and max_scales < detect_head.nl:
+        print(f"✂️ 只导出前 {max_scales} 个尺度 (步长 {[int(s) for s in detect_head.stride[:max_scales]]})")
+    new_forward = create_rk3588_forward(detect_head, decode_boxes=decode_boxes, topk=topk,
+                                        keep_classes=keep_classes, layout=layout, max_scales=max_scales,
+                                        dfl=dfl)
     detect_head.forward = types.MethodType(new_forward, detect_head)
+    return model
+
+
+def conv_bn_fusion_report(fused_path, unfused_path, img_size=640, atol=1e-3):
+    """对比融合前后的ONNX图：按算子统计节点数、CPU延迟和6个输出的一致性"""
+    import numpy as np
+    from rk3588_eval_utils import create_cpu_session, random_feed, measure_latency, count_onnx_ops
+
+    fused_ops = count_onnx_ops(fused_path)
+    unfused_ops = count_onnx_ops(unfused_path)
+    print(f"\n📋 Conv+BN融合报告:")
+    print(f"  {'算子':<24}{'未融合':>8}{'融合后':>8}")
+    for op in sorted(set(fused_ops) | set(unfused_ops)):
+        if fused_ops[op] != unfused_ops[op] or op in ('Conv', 'BatchNormalization'):
+            print(f"  {op:<24}{unfused_ops[op]:>8}{fused_ops[op]:>8}")
+    print(f"  {'总节点数':<22}{sum(unfused_ops.values()):>8}{sum(fused_ops.values()):>8}")
+
+    fused_sess = create_cpu_session(fused_path)
+    unfused_sess = create_cpu_session(unfused_path)
+    feeds = random_feed(fused_sess, img_size=img_size)
+    fused_ms = measure_latency(fused_sess, feeds)
+    unfused_ms = measure_latency(unfused_sess, feeds)
+    print(f"  CPU延迟: 未融合 {unfused_ms:.2f} ms, 融合后 {fused_ms:.2f} ms ({unfused_ms / fused_ms:.2f}x)")
+
+    # 各输出逐一比对
+    all_match = True
+    names = [o.name for o in fused_sess.get_outputs()]
+    for name, a, b in zip(names, fused_sess.run(None, feeds), unfused_sess.run(None, feeds)):
+        max_diff = float(np.abs(a - b).max())
+        match = max_diff <= atol
+        all_match &= match
+        print(f"  {name}: 最大误差 {max_diff:.2e} {'✓' if match else '❌'}")
+    if all_match:
+        print(f"✅ 融合前后输出一致 (atol={atol})")
+    else:
+        print(f"⚠️ 融合前后输出超出容差 (atol={atol})")
+    return {
+        'ops_fused': dict(fused_ops),
+        'ops_unfused': dict(unfused_ops),
+        'latency_fused_ms': fused_ms,
+        'latency_unfused_ms': unfused_ms,
+        'outputs_match': all_match,
+    }
+
+
+def convert_onnx_fp16(fp32_path, fp16_path):
+    """将FP32 ONNX转换为FP16（输入输出同样为float16），权重与激活显存/带宽减半"""
+    import onnx
+    from onnxconverter_common import float16
+
+    model = onnx.load(str(fp32_path))
+    model_fp16 = float16.convert_float_to_float16(model, keep_io_types=False)
+    # uint8输入模型：转换器不会改写整数输入（经Transpose等）之后的Cast，需手动改为转换到float16
+    int_tensors = {inp.name for inp in model_fp16.graph.input
+                   if inp.type.tensor_type.elem_type == onnx.TensorProto.UINT8}
+    for node in model_fp16.graph.node:
+        if node.op_type in ('Transpose', 'Reshape', 'Identity') and node.input[0] in int_tensors:
+            int_tensors.update(node.output)
+        elif node.op_type == 'Cast' and node.input[0] in int_tensors:
+            for attr in node.attribute:
+                if attr.name == 'to' and attr.i == onnx.TensorProto.FLOAT:
+                    attr.i = onnx.TensorProto.FLOAT16
+    onnx.save(model_fp16, str(fp16_path))
+    return fp16_path
+
+
+def fp16_parity_report(fp32_path, fp16_path, image_dir=None, max_images=20):
+    """在验证集图片上对比FP16与FP32图：逐输出最大误差、余弦相似度及CPU延迟"""
+    from rk3588_eval_utils import (DEFAULT_VAL_DIR, create_cpu_session, list_images,
+                                   load_input_tensor, measure_latency, onnx_input_dtype, onnx_size_mb,
+                                   output_error, random_feed, session_input_size)
+
+    fp32_sess = create_cpu_session(fp32_path)
+    fp16_sess = create_cpu_session(fp16_path)
+    input_name = fp32_sess.get_inputs()[0].name
+    img_size = session_input_size(fp32_sess)
+    # FP16图的float输入为float16；uint8输入模型两者均为uint8
+    fp32_dtype, fp16_dtype = onnx_input_dtype(fp32_sess), onnx_input_dtype(fp16_sess)
+
+    images = list_images(image_dir or DEFAULT_VAL_DIR, max_images)
+    print(f"\n📋 FP16精度报告 ({len(images)} 张验证图片):")
+    if images:
+        feeds_list = [load_input_tensor(p, img_size, fp32_dtype) for p in images]
+    else:
+        print("⚠️ 未找到验证图片，使用随机输入")
+        feeds_list = [random_feed(fp32_sess, img_size=img_size)[input_name]]
+
+    names = [o.name for o in fp32_sess.get_outputs()]
+    stats = {name: {'max_abs': 0.0, 'cosine_min': 1.0, 'cosine_sum': 0.0} for name in names}
+    for x in feeds_list:
+        ref = fp32_sess.run(None, {input_name: x})
+        out = fp16_sess.run(None, {input_name: x.astype(fp16_dtype)})
+        for name, a, b in zip(names, ref, out):
+            max_abs, cosine = output_error(a, b)
+            stats[name]['max_abs'] = max(stats[name]['max_abs'], max_abs)
+            stats[name]['cosine_min'] = min(stats[name]['cosine_min'], cosine)
+            stats[name]['cosine_sum'] += cosine
+
+    print(f"  {'输出':<8}{'最大误差':>12}{'平均余弦':>12}{'最小余弦':>12}")
+    for name in names:
+        st = stats[name]
+        st['cosine_mean'] = st.pop('cosine_sum') / len(feeds_list)
+        print(f"  {name:<8}{st['max_abs']:>12.4e}{st['cosine_mean']:>12.6f}{st['cosine_min']:>12.6f}")
+
+    x = feeds_list[0]
+    fp32_ms = measure_latency(fp32_sess, {input_name: x})
+    fp16_ms = measure_latency(fp16_sess, {input_name: x.astype(fp16_dtype)})
+    fp32_mb = onnx_size_mb(fp32_path)
+    fp16_mb = onnx_size_mb(fp16_path)
+    print(f"  模型大小: FP32 {fp32_mb:.2f} MB, FP16 {fp16_mb:.2f} MB")
+    print(f"  CPU延迟: FP32 {fp32_ms:.2f} ms, FP16 {fp16_ms:.2f} ms")
+    return {
+        'outputs': stats,
+        'latency_fp32_ms': fp32_ms,
+        'latency_fp16_ms': fp16_ms,
+        'size_fp32_mb': fp32_mb,
+        'size_fp16_mb': fp16_mb,
+    }
+
+
+def rect_vs_square_report(rect_path, square_path):
+    """对比矩形输入与同长边正方形输入的CPU延迟，确认去掉letterbox填充带来的计算节省"""
+    from rk3588_eval_utils import create_cpu_session, random_feed, measure_latency, session_input_size
+
+    rect_sess = create_cpu_session(rect_path)
+    square_sess = create_cpu_session(square_path)
+    rect_h, rect_w = session_input_size(rect_sess)
+    square_h, square_w = session_input_size(square_sess)
+    rect_ms = measure_latency(rect_sess, random_feed(rect_sess))
+    square_ms = measure_latency(square_sess, random_feed(square_sess))
+    pixel_ratio = rect_h * rect_w / (square_h * square_w)
+    print(f"\n📋 矩形输入延迟对比 (onnxruntime CPU):")
+    print(f"  {square_h}x{square_w}: {square_ms:.2f} ms")
+    print(f"  {rect_h}x{rect_w}: {rect_ms:.2f} ms (像素 {pixel_ratio:.0%}, 延迟 {rect_ms / square_ms:.0%})")
+    return {'latency_rect_ms': rect_ms, 'latency_square_ms': square_ms, 'pixel_ratio': pixel_ratio}
+
+
+def class_subset_report(subset_path, full_path):
+    """对比类别子集模型与全类别模型的单帧输出字节数与CPU延迟"""
+    from rk3588_eval_utils import create_cpu_session, random_feed, measure_latency
+
+    subset_sess = create_cpu_session(subset_path)
+    full_sess = create_cpu_session(full_path)
+    feeds = random_feed(full_sess)
+    subset_outputs = subset_sess.run(None, feeds)
+    full_outputs = full_sess.run(None, feeds)
+    subset_ms = measure_latency(subset_sess, feeds)
+    full_ms = measure_latency(full_sess, feeds)
+    subset_bytes = sum(o.nbytes for o in subset_outputs)
+    full_bytes = sum(o.nbytes for o in full_outputs)
+    print(f"\n📋 类别子集对比 (onnxruntime CPU):")
+    for out, sub, full in zip(subset_sess.get_outputs(), subset_outputs, full_outputs):
+        if sub.shape != full.shape:
+            print(f"  {out.name}: {list(full.shape)} → {list(sub.shape)}")
+    print(f"  输出字节: {full_bytes / 1024:.1f} KB → {subset_bytes / 1024:.1f} KB ({subset_bytes / full_bytes:.0%})")
+    print(f"  延迟: {full_ms:.2f} ms → {subset_ms:.2f} ms ({subset_ms / full_ms:.0%})")
+    return {'bytes_subset': subset_bytes, 'bytes_full': full_bytes,
+            'latency_subset_ms': subset_ms, 'latency_full_ms': full_ms}
+
+
+def ort_startup_report(onnx_path, runs=5):
+    """对比onnxruntime直接加载源模型（每次图优化）与加载优化产物的会话创建耗时，并校验输出一致"""
+    import time
+    import numpy as np
+    from rk3588_eval_utils import create_cpu_session, random_feed
+    from rk3588_host_utils import create_onnx_session
+
+    def startup_ms(create):
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            session = create()
+            times.append((time.perf_counter() - start) * 1000.0)
+        return float(np.median(times)), session
+
+    source_ms, source_sess = startup_ms(lambda: create_cpu_session(onnx_path))
+    artifact_ms, artifact_sess = startup_ms(lambda: create_onnx_session(onnx_path)[0])
+    feeds = random_feed(source_sess)
+    max_diff = max(float(np.abs(a.astype(np.float32) - b.astype(np.float32)).max())
+                   for a, b in zip(source_sess.run(None, feeds), artifact_sess.run(None, feeds)))
+    print(f"\n📋 onnxruntime启动耗时对比 ({Path(onnx_path).name}, {runs} 次中位数):")
+    print(f"  源模型 (每次图优化): {source_ms:.1f} ms")
+    print(f"  优化产物 (含产物校验): {artifact_ms:.1f} ms ({source_ms / artifact_ms:.2f}x)")
+    print(f"  输出最大误差: {max_diff:.2e}")
+    return {'startup_source_ms': source_ms, 'startup_artifact_ms': artifact_ms, 'max_diff': max_diff}
+
+
+def write_ort_artifacts(onnx_paths, reports=True):
+    """为导出的模型生成onnxruntime优化产物（验证工具打开模型时直接加载），reports=True时附启动耗时对比"""
+    import rk3588_eval_utils  # noqa: F401  将02_validation_tools加入sys.path
+    from rk3588_host_utils import write_ort_artifact
+
+    for onnx_path in onnx_paths:
+        try:
+            artifact = write_ort_artifact(onnx_path)
+        except Exception as e:
+            print(f"⚠️ 生成onnxruntime优化产物失败 ({onnx_path}): {e}")
+            continue
+        print(f"⚡ onnxruntime优化产物: {artifact}")
+        if reports:
+            try:
+                ort_startup_report(onnx_path)
+            except Exception as e:
+                print(f"⚠️ 启动耗时对比失败: {e}")
+
+
+def write_profile_reports(onnx_paths, runs):
+    """为各模型写出逐算子耗时报告（<stem>.profile.json/.md），单个模型失败只给出警告"""
+    from rk3588_profile import write_profile_report
+
+    for onnx_path in onnx_paths:
+        try:
+            write_profile_report(onnx_path, runs=runs)
+        except Exception as e:
+            print(f"⚠️ 逐算子耗时分析失败 ({onnx_path}): {e}")
+
+
+def export_rk3588_onnx(model_path, output_path=None, img_size=640, batch_size=1,
+                       opset_version=11, input_name="data", dynamic_batch=False, fuse=True,
+                       half=False, val_dir=None, use_cache=True, cache_dir=None, reports=True,
+                       decode_boxes=False, topk=None, uint8_input=False, raw_frame=None,
+                       keep_classes=None, layout='rk3588', ort_artifact=True, profile_runs=20,
+                       parity_workers=None, parity_images=None, max_scales=None, dfl='conv'):
+    """
+    导出RK3588优化的ONNX模型，成功时返回输出路径（FP16模式返回FP16模型路径）
+    参数无效（布局/DFL/类别列表/尺寸）时抛出ValueError，模型测试或FP16转换失败时抛出RuntimeError，异常信息即失败原因
+    img_size可为int（正方形）或(h, w)（矩形，需为最大步长的整数倍）
+    decode_boxes=True时输出box1..3（图内解码的xyxy框）替代reg1..3，主机端无需anchor计算
+    topk=k时输出boxes/scores/class_ids三个张量，仅包含前k个候选，主机端只需阈值过滤与NMS
+    uint8_input=True时输入为uint8 [batch, H, W, 3] BGR帧，归一化与通道转换在图内完成
+    raw_frame=(h, w)时输入为固定分辨率的原始uint8帧，letterbox在图内完成，缩放与填充写入模型元数据
+    keep_classes=[id, ...]时只导出这些类别的cls通道，原始类别ID与名称写入模型元数据
+    layout: rk3588（默认六输出）、anchor_major（每尺度 [batch, H*W, 4]/[batch, H*W, nc]）、
+            concat（各尺度拼接为 reg/box [batch, N, 4] 与 cls [batch, N, nc] 两个输出）
+    dfl: DFL期望值的图内实现，conv（默认）、reducesum或matmul，输出相同，算子组成不同（见dfl_benchmark.py）
+    默认导出检测头的全部尺度（P6模型为reg1..4/cls1..4），max_scales=n时只导出前n个尺度
+    类别名、各尺度步长、输入尺寸、输出布局与预处理约定写入模型元数据，验证与标注工具无需PT模型即可使用
+    ort_artifact=True时在模型旁写入onnxruntime优化产物（<stem>.ortopt-<源模型哈希>.onnx），验证工具加载时跳过图优化
+    reports=True时在val_dir（默认datasets/temp/images/val）的每张图片上对比PT与ONNX的全部输出，
+    parity_workers个进程并行（默认CPU核数），parity_images限制图片数
+    每个导出的模型都会做静态计算量/内存分析，结果写到模型旁（<stem>.graph_stats.json）
+    profile_runs>0时对导出的每个模型（含命中缓存复用的模型）做onnxruntime逐算子profiling，
+    耗时报告写到模型旁（<stem>.profile.json/.md）；批量/扫描调用方传profile_runs=0关闭
+    reports=False时跳过PT对比与融合/动态batch/FP16/矩形输入报告，供批量扫描等场景使用
+    """
+    img_h, img_w = (img_size, img_size) if isinstance(img_size, int) else tuple(img_size)
+    if raw_frame:
+        raw_frame = tuple(raw_frame)
+        uint8_input = True
+    # 检测头选项，参考模型（未融合/正方形对照）使用相同设置
+    keep_classes = list(keep_classes) if keep_classes else None
+    if layout not in OUTPUT_LAYOUTS:
+        raise ValueError(f"未知的输出布局: {layout}，可选 {', '.join(OUTPUT_LAYOUTS)}")
+    if dfl not in DFL_MODES:
+        raise ValueError(f"未知的DFL实现: {dfl}，可选 {', '.join(DFL_MODES)}")
+    if topk and layout != 'rk3588':
+        raise ValueError(f"--topk 输出固定为 boxes/scores/class_ids，不能与 layout={layout} 同时使用")
+    head_kwargs = dict(decode_boxes=decode_boxes, topk=topk, keep_classes=keep_classes, layout=layout,
+                       max_scales=max_scales, dfl=dfl)
+    head = f'rk3588_top{topk}' if topk else ('rk3588_boxes' if decode_boxes else 'rk3588')
+    
+    if output_path is None:
+        model_stem = Path(model_path).stem
+        output_path = f"{model_stem}_rk3588_simple.onnx"
+    
+    fp16_path = str(Path(output_path).with_name(Path(output_path).stem + "_fp16.onnx"))
+    artifacts = {'fp32': output_path}
+    if half:
+        artifacts['fp16'] = fp16_path
+    
+    # 导出缓存：.pt内容、导出参数、torch/ultralytics版本与导出代码均未变化时直接复用上次的ONNX
+    cache = ExportCache(cache_dir) if use_cache else None
+    if cache is not None:
+        import ultralytics
+        export_settings = {
+            'img_size': [img_h, img_w],
+            'batch': 'dynamic' if dynamic_batch else batch_size,
+            'opset_version': opset_version,
+            'input_name': input_name,
+            'head': head,
+            'metadata_version': METADATA_VERSION,
+            'layout': layout,
+            'dfl': dfl,
+            'fuse': fuse,
+            'half': half,
+            'input_format': 'uint8_nhwc_bgr' if uint8_input else 'float_nchw_rgb',
+            'raw_frame': list(raw_frame) if raw_frame else None,
+            'keep_classes': keep_classes,
+            'max_scales': max_scales,
+            'torch_version': torch.__version__,
+            'ultralytics_version': ultralytics.__version__,
+            'exporter_sha256': {path.name: file_sha256(path) for path in EXPORTER_SOURCES},
+        }
+        cache_key = cache.make_key(model_path, export_settings)
+        if cache.restore(cache_key, artifacts):
+            print(f"⚡ 命中导出缓存 ({cache_key[:12]})，跳过加载与导出: {output_path}")
+            if profile_runs:
+                write_profile_reports(artifacts.values(), profile_runs)
+            if ort_artifact:
+                write_ort_artifacts(artifacts.values(), reports=False)
+            return artifacts.get('fp16', output_path)
+    
+    model = load_rk3588_model(model_path, fuse=fuse, **head_kwargs)
+    
+    detect_head = model.model.model[-1]
+    strides = [int(s) for s in detect_head.stride[:min(detect_head.nl, max_scales or detect_head.nl)]]
+    max_stride = int(model.model.stride.max())
+    if img_h % max_stride or img_w % max_stride:
+        raise ValueError(f"输入尺寸 {img_h}x{img_w} 必须是最大步长 {max_stride} 的整数倍")
     
     # 测试模型
     print(f"🧪 测试修改后的模型...")
-    dummy_input = torch.randn(1, 3, 640, 640)
+    # 动态batch导出时用batch>=2追踪，避免batch维被特化为常量1
+    trace_batch = max(batch_size, 2) if dynamic_batch else batch_size
+    dummy_input = make_dummy_input(trace_batch, *(raw_frame or (img_h, img_w)), uint8_input)
+    module = export_module(model, uint8_input, raw_frame, (img_h, img_w))
+    if raw_frame:
+        print(f"📦 原始帧输入 {raw_frame[1]}x{raw_frame[0]}: letterbox至 {img_w}x{img_h} 在图内完成 "
+              f"(r={module.ratio:.4f}, dw={module.pad[0]:.1f}, dh={module.pad[1]:.1f})")
+    elif uint8_input:
+        print(f"📦 uint8 NHWC BGR输入: 归一化与通道转换在图内完成")
     
     with torch.no_grad():
         try:
-            outputs = model.model(dummy_input)
+            outputs = module(dummy_input)
             print(f"✓ 模型测试成功，输出数量: {len(outputs)}")
             for i, out in enumerate(outputs):
                 print(f"  输出{i}: {list(out.shape)}")
         except Exception as e:
-            print(f"❌ 模型测试失败: {e}")
-            return
+            raise RuntimeError(f"模型测试失败: {e}") from e
     
     # 按照yolov8_train_inf.md第192-195行设置输入输出名称
-    input_names = ["data"]
-    output_names = ["reg1", "cls1", "reg2", "cls2", "reg3", "cls3"]
+    input_names = [input_name]
+    if topk:
+        output_names = ["boxes", "scores", "class_ids"]
+    else:
+        reg_prefix = "box" if decode_boxes else "reg"
+        if layout == 'concat':
+            output_names = [reg_prefix, "cls"]
+        else:
+            output_names = [f"{prefix}{i}" for i in range(1, len(strides) + 1) for prefix in (reg_prefix, "cls")]
+    
+    if dynamic_batch:
+        # 输入与所有输出的第0维均标记为动态batch
+        dynamic_axes = {name: {0: "batch"} for name in input_names + output_names}
+        print(f"✓ 动态batch模式: {', '.join(input_names + output_names)}")
+    else:
+        # 固定batch，与侵入式方法保持完全一致
+        dynamic_axes = None
     
     print(f"🔄 导出ONNX模型到: {output_path}")
-    torch.onnx.export(
-        model.model,
-        dummy_input,
-        output_path,
+    export_kwargs = dict(
         verbose=False,
         input_names=input_names,
         output_names=output_names,
-        opset_version=11,
+        opset_version=opset_version,
         do_constant_folding=True,
-        # 固定batch=1，与侵入式方法保持完全一致
-        dynamic_axes=None
+        dynamic_axes=dynamic_axes
     )
+    torch.onnx.export(module, dummy_input, output_path, **export_kwargs)
+    # 验证/标注工具只凭ONNX即可配置前后处理（见rk3588_host_utils.onnx_model_config），无需加载PT模型：
+    # 各尺度步长按输出顺序取用，names按原始类别ID排列，preprocess为主机端需要完成的预处理约定
+    metadata = {
+        'metadata_version': METADATA_VERSION,
+        'strides': strides,
+        'imgsz': [img_h, img_w],
+        'names': [model.names[i] for i in sorted(model.names)],
+        'layout': layout,
+        'head': head,
+        'dfl': dfl,
+        'preprocess': preprocess_contract(uint8_input, raw_frame),
+    }
+    if raw_frame:
+        # 逆变换所需参数随模型保存，主机端无需保留letterbox状态
+        metadata.update({
+            'raw_frame_size': list(raw_frame),
+            'letterbox_ratio': str(module.ratio),
+            'letterbox_pad': list(module.pad),
+        })
+    if keep_classes:
+        # cls通道i对应原始类别class_ids[i]，主机端据此还原类别ID
+        metadata.update({
+            'class_ids': keep_classes,
+            'class_names': [model.names.get(c, str(c)) for c in keep_classes],
+        })
+    write_onnx_metadata(output_path, metadata)
     
     print(f"✅ RK3588 ONNX导出成功: {output_path}")
     
@@ -125,40 +645,170 @@ def export_rk3588_onnx(model_path, output_path=None):
         for out in session.get_outputs():
             print(f"  {out.name}: {out.shape} ({out.type})")
         
-        # 测试推理对比
-        print(f"\n🎯 推理对比测试:")
-        input_data = dummy_input.numpy()
+        # PT vs ONNX一致性：验证集每张图片上逐输出对比（多进程），跳过报告时只用追踪输入做一次快速检查
+        if reports:
+            from rk3588_parity import parity_report
+            parity_report(model_path, output_path, val_dir, max_images=parity_images, workers=parity_workers,
+                          img_size=(img_h, img_w), uint8_input=uint8_input, raw_frame=raw_frame, fuse=fuse,
+                          head_kwargs=head_kwargs)
+        else:
+            onnx_outputs = session.run(None, {input_names[0]: dummy_input.numpy()})
+            with torch.no_grad():
+                pt_outputs = module(dummy_input)
+            max_diff = max(float((pt.float() - torch.from_numpy(out).float()).abs().max())
+                           for pt, out in zip(pt_outputs, onnx_outputs))
+            print(f"\n🎯 追踪输入一致性: 最大误差 {max_diff:.2e}")
         
-        # ONNX推理
-        onnx_outputs = session.run(None, {input_names[0]: input_data})
-        print("ONNX输出:")
-        for i, (name, output) in enumerate(zip(output_names, onnx_outputs)):
-            print(f"  {name}: {output.shape}, 数值范围: [{output.min():.4f}, {output.max():.4f}]")
+        if dynamic_batch and reports:
+            benchmark_batch_latency(output_path, img_size)
         
-        # PT推理
-        with torch.no_grad():
-            pt_outputs = model.model(dummy_input)
-        print("PT输出:")
-        for i, output in enumerate(pt_outputs):
-            output_np = output.numpy()
-            name = output_names[i]
-            print(f"  {name}: {output_np.shape}, 数值范围: [{output_np.min():.4f}, {output_np.max():.4f}]")
+        # 融合报告：另导出一份未融合的图作为对照
+        if fuse and reports:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                unfused_path = str(Path(tmp_dir) / "unfused.onnx")
+                unfused_model = load_rk3588_model(model_path, fuse=False, **head_kwargs)
+                torch.onnx.export(export_module(unfused_model, uint8_input, raw_frame, (img_h, img_w)),
+                                  dummy_input, unfused_path, **export_kwargs)
+                conv_bn_fusion_report(output_path, unfused_path, img_size)
+        
+        # 矩形输入：另导出同长边的正方形模型，用延迟确认计算节省
+        if img_h != img_w and reports:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                square_path = str(Path(tmp_dir) / "square.onnx")
+                square_size = max(img_h, img_w)
+                square_model = load_rk3588_model(model_path, fuse=fuse, **head_kwargs)
+                square_input = make_dummy_input(trace_batch, *(raw_frame or (square_size, square_size)), uint8_input)
+                torch.onnx.export(export_module(square_model, uint8_input, raw_frame, (square_size, square_size)),
+                                  square_input, square_path, **export_kwargs)
+                rect_vs_square_report(output_path, square_path)
+        
+        # 类别子集：另导出全类别模型，对比输出字节数与延迟
+        if keep_classes and reports:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                full_path = str(Path(tmp_dir) / "all_classes.onnx")
+                full_model = load_rk3588_model(model_path, fuse=fuse, decode_boxes=decode_boxes, topk=topk,
+                                               layout=layout, max_scales=max_scales, dfl=dfl)
+                torch.onnx.export(export_module(full_model, uint8_input, raw_frame, (img_h, img_w)),
+                                  dummy_input, full_path, **export_kwargs)
+                class_subset_report(output_path, full_path)
         
     except ImportError:
         print("⚠️ 未安装onnxruntime，跳过验证")
     except Exception as e:
         print(f"⚠️ ONNX验证失败: {e}")
+    
+    # FP16变体：在FP32图基础上转换，并在验证集上报告精度与速度
+    if half:
+        print(f"\n🔄 转换FP16模型: {fp16_path}")
+        try:
+            convert_onnx_fp16(output_path, fp16_path)
+        except ImportError as e:
+            raise RuntimeError("FP16转换需要onnxconverter-common: pip install onnxconverter-common") from e
+        print(f"✅ FP16 ONNX导出成功: {fp16_path}")
+        if reports:
+            try:
+                fp16_parity_report(output_path, fp16_path, val_dir)
+            except Exception as e:
+                print(f"⚠️ FP16精度报告失败: {e}")
+    
+    # 静态分析（不运行推理）：MACs/参数量/激活峰值/输出字节，按P3/P4/P5与区段汇总
+    from rk3588_graph_stats import graph_stats_report
+    for onnx_path in artifacts.values():
+        try:
+            graph_stats_report(onnx_path, top_k=5)
+        except Exception as e:
+            print(f"⚠️ 静态分析失败 ({onnx_path}): {e}")
+    
+    # 逐算子耗时：按算子类型/节点/backbone-neck-检测头分支汇总，报告保存在模型旁
+    if profile_runs:
+        write_profile_reports(artifacts.values(), profile_runs)
+    
+    if ort_artifact:
+        write_ort_artifacts(artifacts.values(), reports)
+    
+    if cache is not None:
+        try:
+            cache.store(cache_key, artifacts, export_settings)
+        except Exception as e:
+            print(f"⚠️ 写入导出缓存失败: {e}")
+    
+    return artifacts.get('fp16', output_path)
 
 
 def main():
     parser = argparse.ArgumentParser(description='Simple RK3588 ONNX Export')
     parser.add_argument('model', help='Path to YOLOv8 model (.pt file)')
     parser.add_argument('-o', '--output', help='Output ONNX file path')
+    parser.add_argument('--imgsz', type=int, nargs='+', default=[640],
+                        help='Input size: one value for square, or H W for rectangular, e.g. 480 640 (default: 640)')
+    parser.add_argument('--batch', type=int, default=1, help='Static batch size (default: 1)')
+    parser.add_argument('--opset', type=int, default=11, help='ONNX opset version (default: 11)')
+    parser.add_argument('--dynamic-batch', action='store_true',
+                        help='Export with a dynamic batch axis and benchmark batch 1/4/8')
+    parser.add_argument('--no-fuse', action='store_true',
+                        help='Skip Conv+BN fusion before export (fusion is on by default)')
+    parser.add_argument('--half', action='store_true',
+                        help='Also write an FP16 model (*_fp16.onnx) and report parity/latency vs FP32')
+    parser.add_argument('--val-dir', help='Image folder for parity reports (default: datasets/temp/images/val)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Ignore the export cache and always re-export')
+    parser.add_argument('--cache-dir', help='Export cache directory (default: ~/.cache/rk3588_export)')
+    parser.add_argument('--decode-boxes', action='store_true',
+                        help='Decode boxes in-graph: emit box1..3 (xyxy input pixels) instead of reg1..3')
+    parser.add_argument('--topk', type=int,
+                        help='Append in-graph TopK: emit only K candidates as boxes/scores/class_ids')
+    parser.add_argument('--uint8-input', action='store_true',
+                        help='Take uint8 NHWC BGR frames; normalization and channel swap happen in-graph')
+    parser.add_argument('--raw-frame', type=int, nargs=2, metavar=('H', 'W'),
+                        help='Fixed camera frame size, e.g. 960 1280: letterbox runs in-graph on raw uint8 frames')
+    parser.add_argument('--layout', choices=OUTPUT_LAYOUTS, default='rk3588',
+                        help='Output layout: rk3588 (reg [1,1,4,HW] + cls [1,nc,H,W] per scale), '
+                             'anchor_major ([1,HW,4] + [1,HW,nc] per scale) or concat (all scales in two outputs)')
+    parser.add_argument('--classes', type=int, nargs='+',
+                        help='Keep only these class ids in the cls outputs, e.g. 0 32 (original ids stored in metadata)')
+    parser.add_argument('--max-scales', type=int,
+                        help='Export only the first N detection scales, e.g. 3 to drop the P6 head (default: all scales)')
+    parser.add_argument('--dfl', choices=DFL_MODES, default='conv',
+                        help='In-graph DFL expectation: conv (softmax + fixed 1x1 conv), reducesum or matmul (default: conv)')
+    parser.add_argument('--no-ort-artifact', action='store_true',
+                        help='Do not write the pre-optimized onnxruntime artifact (*.ortopt-<hash>.onnx) next to the model')
+    parser.add_argument('--parity-workers', type=int,
+                        help='Worker processes for the PT vs ONNX parity check over --val-dir (default: CPU count)')
+    parser.add_argument('--parity-max-images', type=int,
+                        help='Use at most N images for the parity check (default: all)')
+    parser.add_argument('--profile-runs', type=int, default=20,
+                        help='Profiled onnxruntime runs for the per-operator report saved next to the model '
+                             '(*.profile.json/.md); 0 disables (default: 20)')
+    parser.add_argument('--int8', action='store_true',
+                        help='Run INT8 static quantization (rk3588_quantize.py) on the exported FP32 model')
     
     args = parser.parse_args()
     
     # 导出RK3588优化的ONNX
-    export_rk3588_onnx(args.model, args.output)
+    # --imgsz 480 640 表示 (h, w)，与ultralytics约定一致
+    img_size = args.imgsz[0] if len(args.imgsz) == 1 else tuple(args.imgsz[:2])
+    try:
+        output_path = export_rk3588_onnx(args.model, args.output, img_size=img_size, batch_size=args.batch,
+                                         opset_version=args.opset, dynamic_batch=args.dynamic_batch,
+                                         fuse=not args.no_fuse, half=args.half, val_dir=args.val_dir,
+                                         use_cache=not args.no_cache, cache_dir=args.cache_dir,
+                                         decode_boxes=args.decode_boxes, topk=args.topk,
+                                         uint8_input=args.uint8_input, raw_frame=args.raw_frame,
+                                         keep_classes=args.classes, layout=args.layout,
+                                         ort_artifact=not args.no_ort_artifact, profile_runs=args.profile_runs,
+                                         parity_workers=args.parity_workers, parity_images=args.parity_max_images,
+                                         max_scales=args.max_scales, dfl=args.dfl)
+    except (ValueError, RuntimeError) as e:
+        print(f"❌ {e}")
+        return
+    
+    # INT8量化阶段：始终基于FP32导出结果
+    if args.int8 and output_path:
+        from rk3588_quantize import quantize_rk3588_onnx, int8_report
+        from rk3588_eval_utils import DEFAULT_VAL_DIR, list_images
+        fp32_path = output_path[:-len("_fp16.onnx")] + ".onnx" if args.half else output_path
+        int8_path = quantize_rk3588_onnx(fp32_path)
+        int8_report(fp32_path, int8_path, list_images(args.val_dir or DEFAULT_VAL_DIR))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+主机端后处理耗时对比
+对同一批验证图片，分别统计六输出格式(reg1..3)、图内框解码格式(box1..3)、图内TopK格式(boxes/scores/class_ids)
+以及anchor_major/concat输出布局的主机端后处理CPU耗时，只计时后处理（推理输出预先算好），
+并检查各格式与六输出格式的检测结果是否一致
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+from rk3588_host_utils import (decode_anchor_major, decode_rk3588_boxes, decode_rk3588_outputs, decode_rk3588_topk,
+                               match_detections, onnx_model_config, preprocess_image, sigmoid)
+
+DEFAULT_VAL_DIR = Path(__file__).resolve().parent.parent / "datasets" / "temp" / "images" / "val"
+
+
+def grid_decode_reference(outputs, input_shape, conf_threshold, strides=None):
+    """对比器postprocess_dfl_fixed的做法：每帧为每个尺度构建完整anchor网格后解码（不含NMS）"""
+    results = []
+    for i, (reg_output, cls_output) in enumerate(zip(outputs[0::2], outputs[1::2])):
+        _, nc, height, width = cls_output.shape
+        stride = strides[i] if strides else input_shape[0] / height
+        cls_scores = sigmoid(cls_output[0].transpose(1, 2, 0).astype(np.float32)).reshape(-1, nc)
+        reg_pred = reg_output[0, 0].astype(np.float32).transpose(1, 0)
+        yv, xv = np.meshgrid(np.arange(height), np.arange(width), indexing='ij')
+        anchors = np.stack([xv + 0.5, yv + 0.5], axis=-1).reshape(-1, 2) * stride
+        max_scores = cls_scores.max(axis=1)
+        mask = max_scores > conf_threshold
+        dist = reg_pred[mask] * stride
+        a = anchors[mask]
+        results.append(np.concatenate([a - dist[:, :2], a + dist[:, 2:]], axis=1))
+    return results
+
+
+def model_input(frame, config):
+    """按模型元数据构造输入（同detect_onnx）：图内letterbox模型送入缩放到固定尺寸的原始帧，其余主机端letterbox"""
+    if config['letterbox']:
+        raw_h, raw_w = config['letterbox'][0]
+        return cv2.resize(frame, (raw_w, raw_h))[None]
+    return preprocess_image(frame, config['imgsz'], dtype=config['input_dtype'])[0]
+
+
+def collect_outputs(model_path, frames):
+    """对每帧推理一次，返回 (输出列表, 模型配置(onnx_model_config), 输出名)，解码使用config['imgsz']与['strides']"""
+    session = ort.InferenceSession(str(model_path), providers=['CPUExecutionProvider'])
+    config = onnx_model_config(session)
+    input_name = session.get_inputs()[0].name
+    outputs = [session.run(None, {input_name: model_input(frame, config)}) for frame in frames]
+    return outputs, config, [o.name for o in session.get_outputs()]
+
+
+def layout_label(outputs, names):
+    """按输出个数与维度给出布局名，如 anchor_major(reg) / concat(box)"""
+    if outputs[0].ndim == 4:
+        layout = 'rk3588'
+    else:
+        layout = 'concat' if len(outputs) == 2 else 'anchor_major'
+    return f"{layout}({'box' if names[0].startswith('box') else 'reg'})"
+
+
+def time_decoder(decode, outputs_list, repeat):
+    """重复解码全部帧，返回每帧平均耗时(ms)与最后一轮的解码结果"""
+    results = [decode(outputs) for outputs in outputs_list]  # 预热
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [decode(outputs) for outputs in outputs_list]
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000.0 / (repeat * len(outputs_list)), results
+
+
+def load_frames(image_dir, max_images, fallback_shape=(480, 640)):
+    """读取验证图片，目录为空时使用随机图片"""
+    paths = sorted(p for p in Path(image_dir).glob('*') if p.suffix.lower() in ('.jpg', '.jpeg', '.png', '.bmp'))
+    frames = [cv2.imread(str(p)) for p in paths[:max_images]]
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        print(f"⚠️ 未找到验证图片 ({image_dir})，使用随机图片")
+        frames = [np.random.randint(0, 255, (*fallback_shape, 3), dtype=np.uint8) for _ in range(max_images)]
+    return frames
+
+
+def agreement(ref_dets, test_dets, iou_threshold=0.9):
+    """返回 (匹配数, 两组中较多一方的检测总数)"""
+    matched = total = 0
+    for ref, test in zip(ref_dets, test_dets):
+        count, _ = match_detections(ref, test, iou_threshold)
+        matched += count
+        total += max(len(ref[0]), len(test[0]))
+    return matched, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare host-side postprocess CPU time of RK3588 ONNX output formats')
+    parser.add_argument('reg_model', help='Six-output ONNX (reg1..3/cls1..3)')
+    parser.add_argument('--box-model', help='In-graph decoded ONNX (box1..3/cls1..3), exported with --decode-boxes')
+    parser.add_argument('--topk-models', nargs='+', default=[],
+                        help='In-graph TopK ONNX files (boxes/scores/class_ids), exported with --topk K')
+    parser.add_argument('--layout-models', nargs='+', default=[],
+                        help='ONNX files exported with --layout anchor_major/concat (with or without --decode-boxes)')
+    parser.add_argument('--images', default=str(DEFAULT_VAL_DIR), help='Image folder (default: datasets/temp/images/val)')
+    parser.add_argument('--max-images', type=int, default=20, help='Number of frames (default: 20)')
+    parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold (default: 0.25)')
+    parser.add_argument('--repeat', type=int, default=50, help='Timing repetitions over all frames (default: 50)')
+    args = parser.parse_args()
+
+    frames = load_frames(args.images, args.max_images)
+    print(f"📦 预计算推理输出: {len(frames)} 帧")
+    reg_outputs, config, _ = collect_outputs(args.reg_model, frames)
+    input_shape, strides = config['imgsz'], config['strides']
+
+    grid_ms, _ = time_decoder(lambda o: grid_decode_reference(o, input_shape, args.conf, strides), reg_outputs,
+                              args.repeat)
+    reg_ms, reg_dets = time_decoder(lambda o: decode_rk3588_outputs(o, input_shape, args.conf, strides=strides),
+                                    reg_outputs, args.repeat)
+    rows = [('reg 全网格解码 (对比器做法, 不含NMS)', grid_ms, None), ('reg 候选解码 + NMS', reg_ms, None)]
+
+    # 其余格式：(模型路径, 首个输出名校验, 解码函数)
+    variants = []
+    if args.box_model:
+        variants.append((args.box_model, lambda name: name.startswith('box') and name != 'boxes',
+                         lambda o: decode_rk3588_boxes(o, args.conf)))
+    for path in args.topk_models:
+        variants.append((path, lambda name: name == 'boxes', lambda o: decode_rk3588_topk(o, args.conf)))
+    for path in args.layout_models:
+        variants.append((path, lambda name: name != 'boxes', None))  # 解码函数按输出名确定
+
+    for path, name_ok, decode in variants:
+        outputs, variant_config, names = collect_outputs(path, frames)
+        shape = variant_config['imgsz']
+        if shape != input_shape or not name_ok(names[0]):
+            raise SystemExit(f"❌ 模型不匹配: {path} 输入 {shape} vs {input_shape}, 输出 {names[0]}")
+        if names[0] == 'boxes':
+            label = f"TopK k={outputs[0][1].shape[1]} + NMS"
+        elif outputs[0][0].ndim == 3:
+            decoded = names[0].startswith('box')
+            decode = lambda o, decoded=decoded, s=variant_config['strides']: decode_anchor_major(
+                o, input_shape, args.conf, decoded_boxes=decoded, strides=s)
+            label = f"{layout_label(outputs[0], names)} 解码 + NMS"
+        else:
+            label = "box 图内解码 + NMS"
+        ms, dets = time_decoder(decode, outputs, args.repeat)
+        rows.append((label, ms, agreement(reg_dets, dets)))
+
+    print(f"\n⏱️ 主机端后处理耗时 (每帧, {args.repeat} 轮平均, conf>{args.conf}):")
+    for label, ms, agree in rows:
+        line = f"  {label:<36}{ms:>8.3f} ms ({reg_ms / ms:.2f}x)"
+        if agree is not None:
+            line += f", 与reg检测一致 {agree[0]}/{agree[1]} (IoU>=0.9)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
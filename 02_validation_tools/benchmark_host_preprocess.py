@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+主机端预处理耗时对比
+float输入模型每帧需要 letterbox → BGR→RGB → float32/255 → CHW转置；
+--uint8-input导出的模型只需 letterbox，归一化与通道转换在图内完成；
+--raw-frame导出的模型连letterbox也在图内完成，主机端直接送入原始帧。
+统计预处理的每帧CPU耗时与送入模型的字节数，可选地用ONNX校验输出一致并测量每帧端到端耗时
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmark_host_postprocess import DEFAULT_VAL_DIR, load_frames
+from rk3588_host_utils import decode_detections, onnx_letterbox_metadata, preprocess_image, scale_boxes
+
+
+def time_preprocess(frames, new_shape, dtype, repeat):
+    """重复预处理全部帧，返回每帧平均耗时(ms)与单帧输入字节数"""
+    tensor = preprocess_image(frames[0], new_shape, dtype)[0]  # 预热
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            tensor = preprocess_image(frame, new_shape, dtype)[0]
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000.0 / (repeat * len(frames)), tensor.nbytes
+
+
+def check_parity(float_model, uint8_model, frames, new_shape):
+    """两份模型分别用各自的预处理推理，返回各输出的最大绝对误差"""
+    import onnxruntime as ort
+
+    float_sess = ort.InferenceSession(str(float_model), providers=['CPUExecutionProvider'])
+    uint8_sess = ort.InferenceSession(str(uint8_model), providers=['CPUExecutionProvider'])
+    float_name = float_sess.get_inputs()[0].name
+    uint8_name = uint8_sess.get_inputs()[0].name
+    max_diffs = None
+    for frame in frames:
+        ref = float_sess.run(None, {float_name: preprocess_image(frame, new_shape, np.float32)[0]})
+        out = uint8_sess.run(None, {uint8_name: preprocess_image(frame, new_shape, np.uint8)[0]})
+        diffs = [float(np.abs(a.astype(np.float32) - b.astype(np.float32)).max()) for a, b in zip(ref, out)]
+        max_diffs = diffs if max_diffs is None else [max(x, y) for x, y in zip(max_diffs, diffs)]
+    return dict(zip([o.name for o in float_sess.get_outputs()], max_diffs))
+
+
+def end_to_end_ms(model_path, frames, repeat, conf_threshold=0.25):
+    """
+    每帧端到端主机耗时：预处理 + 推理 + 解码/NMS + 坐标恢复
+    返回 {'pre': ms, 'infer': ms, 'post': ms, 'total': ms}
+    """
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(str(model_path), providers=['CPUExecutionProvider'])
+    inp = session.get_inputs()[0]
+    names = [o.name for o in session.get_outputs()]
+    lb = onnx_letterbox_metadata(session)
+    if 'uint8' in inp.type:
+        dtype, input_shape = np.uint8, tuple(inp.shape[1:3])
+    else:
+        dtype, input_shape = (np.float16 if 'float16' in inp.type else np.float32), tuple(inp.shape[2:4])
+
+    def run_frame(frame, timings):
+        t0 = time.perf_counter()
+        if lb:
+            # 图内letterbox：原始帧直接送入，逆变换参数来自元数据
+            tensor, net_shape, r, dwdh = frame[None], lb[1], lb[2], lb[3]
+        else:
+            (tensor, r, dwdh), net_shape = preprocess_image(frame, input_shape, dtype), input_shape
+        t1 = time.perf_counter()
+        outputs = session.run(None, {inp.name: tensor})
+        t2 = time.perf_counter()
+        boxes, _, _ = decode_detections(outputs, names, net_shape, conf_threshold)
+        scale_boxes(boxes, r, dwdh, frame.shape[:2])
+        t3 = time.perf_counter()
+        timings['pre'] += t1 - t0
+        timings['infer'] += t2 - t1
+        timings['post'] += t3 - t2
+
+    run_frame(frames[0], {'pre': 0.0, 'infer': 0.0, 'post': 0.0})  # 预热
+    timings = {'pre': 0.0, 'infer': 0.0, 'post': 0.0}
+    for _ in range(repeat):
+        for frame in frames:
+            run_frame(frame, timings)
+    result = {key: value * 1000.0 / (repeat * len(frames)) for key, value in timings.items()}
+    result['total'] = sum(result.values())
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare host preprocessing / end-to-end cost of float, uint8 and raw-frame model inputs')
+    parser.add_argument('--images', default=str(DEFAULT_VAL_DIR), help='Image folder (default: datasets/temp/images/val)')
+    parser.add_argument('--max-images', type=int, default=20, help='Number of frames (default: 20)')
+    parser.add_argument('--imgsz', type=int, nargs='+', default=[640], help='Model input size: S or H W (default: 640)')
+    parser.add_argument('--repeat', type=int, default=20, help='Timing repetitions over all frames (default: 20)')
+    parser.add_argument('--float-model', help='Float-input ONNX for the parity check')
+    parser.add_argument('--uint8-model', help='ONNX exported with --uint8-input for the parity check')
+    parser.add_argument('--raw-model', help='ONNX exported with --raw-frame; frames must match its raw size')
+    parser.add_argument('--e2e-repeat', type=int, default=3, help='End-to-end timing repetitions (default: 3)')
+    args = parser.parse_args()
+
+    new_shape = (args.imgsz[0], args.imgsz[-1])
+    frames = load_frames(args.images, args.max_images)
+    print(f"📦 {len(frames)} 帧, 原始尺寸 {frames[0].shape[1]}x{frames[0].shape[0]} → 输入 {new_shape[1]}x{new_shape[0]}")
+
+    float_ms, float_bytes = time_preprocess(frames, new_shape, np.float32, args.repeat)
+    uint8_ms, uint8_bytes = time_preprocess(frames, new_shape, np.uint8, args.repeat)
+    print(f"\n⏱️ 主机端预处理耗时 (每帧, {args.repeat} 轮平均):")
+    print(f"  float32 NCHW RGB: {float_ms:.3f} ms, 输入 {float_bytes / 1024:.0f} KB")
+    print(f"  uint8 NHWC BGR:   {uint8_ms:.3f} ms, 输入 {uint8_bytes / 1024:.0f} KB "
+          f"({float_ms / uint8_ms:.2f}x, 字节 {uint8_bytes / float_bytes:.0%})")
+
+    if args.float_model and args.uint8_model:
+        print(f"\n🧪 输出一致性 (float模型 vs uint8模型):")
+        for name, diff in check_parity(args.float_model, args.uint8_model, frames, new_shape).items():
+            print(f"  {name}: 最大误差 {diff:.2e}")
+
+    # 端到端：每帧主机侧总耗时（含推理），比较有无图内letterbox
+    models = [('float32 NCHW', args.float_model), ('uint8 NHWC', args.uint8_model), ('原始帧(图内letterbox)', args.raw_model)]
+    models = [(label, path) for label, path in models if path]
+    if models:
+        print(f"\n⏱️ 每帧端到端耗时 ({args.e2e_repeat} 轮平均, 单位ms):")
+        print(f"  {'模型':<22}{'预处理':>8}{'推理':>10}{'后处理':>8}{'总计':>10}")
+        for label, path in models:
+            t = end_to_end_ms(path, frames, args.e2e_repeat)
+            print(f"  {label:<22}{t['pre']:>10.3f}{t['infer']:>10.2f}{t['post']:>10.3f}{t['total']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@
 🎯 ONNX后处理已完美优化 - 与PT模型精度差异<0.000001
 
 功能特点：
-- 支持RK3588优化格式的ONNX模型 (6输出: reg1,cls1,reg2,cls2,reg3,cls3)
+- 支持RK3588优化格式的ONNX模型 (6输出: reg1,cls1,reg2,cls2,reg3,cls3；P6模型8输出)
 - 自动适配final_onnx_export.py导出的预处理格式 (DFL已完成)
 - 修复坐标转换bug，确保完美精度匹配
 - 使用与Ultralytics相同的NMS算法，保证一致性
@@ -37,11 +37,9 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import cv2
 import numpy as np
-import onnxruntime as ort
 from threading import Thread, Event
 import time
 from pathlib import Path
-from ultralytics import YOLO
 import platform
 from datetime import datetime
 import sys
@@ -68,6 +66,10 @@ class ModernDualComparator:
         # 核心变量
         self.pt_model = None
         self.onnx_session = None
+        self.onnx_decoded_boxes = False  # box1..3输出：框已在图内解码
+        self.onnx_letterbox = None  # --raw-frame模型的图内letterbox元数据
+        self.onnx_class_ids = None  # --classes模型：cls通道 → 原始类别ID
+        self.onnx_strides = None  # 导出时写入的各尺度步长（P6模型为4个）
         self.video_path = None
         self.cap = None
         self.is_playing = False
@@ -237,7 +239,6 @@ class ModernDualComparator:
         # ONNX后处理参数
         self.IMG_SIZE = (640, 640)
         self.class_names = ['basketball', 'rim']
-        self.strides = [8, 16, 32]  # P3, P4, P5层的步长
         self.reg_max = 16  # DFL的分布数量
         
         # 日志记录初始化（仅数据，不做界面构建）
@@ -819,6 +820,8 @@ class ModernDualComparator:
         
         if model_path:
             try:
+                # torch/ultralytics只在选择PT模型时导入，仅打开ONNX模型时无需加载
+                from ultralytics import YOLO
                 self.pt_model = YOLO(model_path)
                 
                 # 自动检测最佳精度
@@ -852,6 +855,26 @@ class ModernDualComparator:
         for out in session.get_outputs():
             print(f"   输出 '{out.name}': {out.type} {out.shape}")
         
+        self.onnx_decoded_boxes = session.get_outputs()[0].name.startswith('box')
+        # 导出时写入的元数据：网络尺寸、步长、类别名与图内letterbox参数，无需PT模型即可配置后处理
+        from rk3588_host_utils import onnx_model_config
+        config = onnx_model_config(session)
+        self.onnx_letterbox = config['letterbox']
+        self.onnx_class_ids = config['class_ids']
+        self.onnx_strides = config['strides']
+        self.IMG_SIZE = config['imgsz']
+        print(f"   网络输入: {self.IMG_SIZE[1]}x{self.IMG_SIZE[0]}")
+        if self.onnx_strides:
+            print(f"   各尺度步长: {self.onnx_strides}")
+        if config['layout']:
+            print(f"   输出布局: {config['layout']} ({config['head']}), 预处理: {config['preprocess']}")
+        if self.onnx_class_ids is not None:
+            print(f"   类别子集模型: cls通道对应原始类别 {self.onnx_class_ids.tolist()}")
+        if config['names']:
+            # 旧模型没有names元数据时沿用默认的 basketball/rim
+            self.class_names = config['names']
+            print(f"   类别名称: {self.class_names}")
+        
         # 判断是否为FP16模型
         is_fp16 = 'float16' in str(self.onnx_input_type)
         precision = "FP16" if is_fp16 else "FP32"
@@ -868,7 +891,10 @@ class ModernDualComparator:
         
         if model_path:
             try:
-                self.onnx_session = ort.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+                from rk3588_host_utils import create_onnx_session
+                self.onnx_session, optimized = create_onnx_session(model_path)
+                if optimized:
+                    print("⚡ 已加载onnxruntime优化产物，跳过图优化")
                 
                 # 检查模型精度
                 precision = self.check_onnx_precision(self.onnx_session)
@@ -944,6 +970,17 @@ class ModernDualComparator:
         if not self.video_path or not self.pt_model or not self.onnx_session:
             messagebox.showwarning("Warning", "Please select video, PT model and ONNX model")
             return
+        
+        # 图内letterbox模型只接受导出时固定的原始帧尺寸
+        if self.onnx_letterbox:
+            cap = cv2.VideoCapture(self.video_path)
+            frame_hw = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+            cap.release()
+            raw_hw = self.onnx_letterbox[0]
+            if frame_hw != raw_hw:
+                messagebox.showerror("Error", f"Video is {frame_hw[1]}x{frame_hw[0]}, but the ONNX model expects "
+                                              f"raw {raw_hw[1]}x{raw_hw[0]} frames")
+                return
             
         if not self.is_playing:
             self.start_video()  
@@ -1048,7 +1085,7 @@ class ModernDualComparator:
     
     def process_frame_pt(self, frame):
         """使用PT模型处理帧"""
-        results = self.pt_model(frame, conf=self.conf_threshold.get(), verbose=False)
+        results = self.pt_model(frame, imgsz=list(self.IMG_SIZE), conf=self.conf_threshold.get(), verbose=False)
         
         detections = []
         frame_detections = 0
@@ -1148,6 +1185,14 @@ class ModernDualComparator:
 
     def preprocess_image(self, image):
         """图像预处理 - 使用letterbox保证与PT模型一致性"""
+        if self.onnx_letterbox:
+            # letterbox已在图内完成，逆变换参数来自模型元数据
+            raw_hw, _, self.lb_ratio, self.lb_dwdh = self.onnx_letterbox
+            if image.shape[:2] != raw_hw:
+                raise ValueError(f"帧尺寸 {image.shape[1]}x{image.shape[0]} 与模型固定的原始帧 "
+                                 f"{raw_hw[1]}x{raw_hw[0]} 不一致")
+            return image[None]
+        
         # 固定使用letterbox预处理（推荐的标准方式）
         input_image, r, (dw, dh) = self.letterbox(image, (self.IMG_SIZE[0], self.IMG_SIZE[1]))
         self.lb_ratio = r
@@ -1155,11 +1200,17 @@ class ModernDualComparator:
         if self.frame_count <= 3:
             print(f"📐 Letterbox preprocessing: r={r:.4f}, dw={dw:.2f}, dh={dh:.2f}")
         
+        # uint8 NHWC模型：归一化、BGR→RGB与转置已在图内完成，直接送入letterbox后的帧
+        if 'uint8' in str(getattr(self, 'onnx_input_type', '')):
+            return input_image[None]
+        
         input_image = cv2.cvtColor(input_image, cv2.COLOR_BGR2RGB)
-        # 统一使用FP32归一化
+        # 统一使用FP32归一化，FP16模型再转换为float16输入
         input_image = input_image.astype(np.float32) / 255.0
         input_image = np.transpose(input_image, (2, 0, 1))
         input_image = np.expand_dims(input_image, axis=0)
+        if 'float16' in str(getattr(self, 'onnx_input_type', '')):
+            input_image = input_image.astype(np.float16)
         return input_image
     
     def sigmoid(self, x):
@@ -1308,22 +1359,44 @@ class ModernDualComparator:
     def postprocess_onnx(self, outputs, original_width, original_height):
         """ONNX后处理 - 修复DFL解码"""
         # 判断输出格式
-        if len(outputs) == 6:
-            # 新格式：6个输出 (reg1, cls1, reg2, cls2, reg3, cls3)
+        if len(outputs) == 3 or outputs[0].ndim == 3:
+            # 图内TopK格式 (boxes, scores, class_ids) 或 anchor_major/concat布局 ([1, N, 4], [1, N, nc])
+            return self.postprocess_host_decoded(outputs, original_width, original_height)
+        elif len(outputs) % 2 == 0:
+            # 新格式：每尺度 (regN, clsN)，P5模型6个输出，P6模型8个输出
             return self.postprocess_dfl_fixed(outputs, original_width, original_height)
         else:
             # 原格式：9个输出 (dfl, cls, obj) * 3
             return self.postprocess_rknn_style(outputs, original_width, original_height)
     
+    def postprocess_host_decoded(self, outputs, original_width, original_height):
+        """图内TopK与anchor_major/concat布局：由rk3588_host_utils解码并NMS，再做letterbox坐标恢复"""
+        from rk3588_host_utils import decode_detections, scale_boxes
+
+        output_names = [o.name for o in self.onnx_session.get_outputs()]
+        boxes, scores, class_ids = decode_detections(outputs, output_names, self.IMG_SIZE, self.conf_threshold.get(),
+                                                     strides=self.onnx_strides)
+        if self.onnx_class_ids is not None:
+            class_ids = self.onnx_class_ids[class_ids]
+        boxes = scale_boxes(boxes, self.lb_ratio, self.lb_dwdh, (original_height, original_width))
+        # 与postprocess_dfl_fixed一致：按类别仅保留最高分（结果已按分数降序）
+        best_by_class = {}
+        for box, score, cid in zip(boxes, scores, class_ids):
+            if cid < len(self.class_names) and cid not in best_by_class:
+                best_by_class[cid] = {'bbox': box, 'score': float(score), 'class_name': self.class_names[cid]}
+        return list(best_by_class.values())
+    
     def postprocess_dfl_fixed(self, outputs, original_width, original_height):
-        """修复的DFL后处理方法 - 处理RK3588优化的6个输出格式"""
+        """修复的DFL后处理方法 - 处理RK3588优化的6输出（P6模型8输出）格式"""
         # 分离输出
-        reg_outputs = [outputs[i] for i in [0, 2, 4]]  # reg1, reg2, reg3
-        cls_outputs = [outputs[i] for i in [1, 3, 5]]  # cls1, cls2, cls3
+        reg_outputs = outputs[0::2]  # reg1, reg2, reg3[, reg4]
+        cls_outputs = outputs[1::2]  # cls1, cls2, cls3[, cls4]
         
         all_detections = []
         
-        for i, (reg_output, cls_output, stride) in enumerate(zip(reg_outputs, cls_outputs, self.strides)):
+        for i, (reg_output, cls_output) in enumerate(zip(reg_outputs, cls_outputs)):
+            # 步长优先取模型元数据，旧模型由输入高度与特征图高度推得（矩形输入时H/W方向一致）
+            stride = self.onnx_strides[i] if self.onnx_strides else self.IMG_SIZE[0] / cls_output.shape[2]
             # 打印调试信息
             print(f"🔍 处理尺度{i}: reg={reg_output.shape}, cls={cls_output.shape}, stride={stride}")
             
@@ -1345,17 +1418,23 @@ class ModernDualComparator:
             # reg_output[0,0] -> [4, H*W]，转置为 [H*W, 4]
             reg_pred = reg_output[0, 0].astype(np.float32).transpose(1, 0)
 
-            # 创建anchor网格 - 用于坐标转换
-            yv, xv = np.meshgrid(np.arange(height), np.arange(width), indexing='ij')
-            anchors = np.stack([xv + 0.5, yv + 0.5], axis=-1) * stride  # [H, W, 2]
-            anchors = anchors.reshape(-1, 2)  # [H*W, 2]
+            # boxN输出已是输入像素坐标xyxy，跳过anchor网格构建
+            if self.onnx_decoded_boxes:
+                anchors = None
+            else:
+                # 创建anchor网格 - 用于坐标转换
+                yv, xv = np.meshgrid(np.arange(height), np.arange(width), indexing='ij')
+                anchors = np.stack([xv + 0.5, yv + 0.5], axis=-1) * stride  # [H, W, 2]
+                anchors = anchors.reshape(-1, 2)  # [H*W, 2]
 
             # 展平所有预测
-            cls_scores_flat = cls_scores.reshape(-1, 2)  # [H*W, 2]
+            cls_scores_flat = cls_scores.reshape(-1, cls_scores.shape[-1])  # [H*W, num_classes]
 
             # 获取最大类别分数和索引
             max_scores = np.max(cls_scores_flat, axis=1)
             class_ids = np.argmax(cls_scores_flat, axis=1)
+            if self.onnx_class_ids is not None:
+                class_ids = self.onnx_class_ids[class_ids]  # 类别子集模型：还原原始类别ID
 
             # 调试信息
             print(f"  尺度{i}: 最高置信度={max_scores.max():.4f}, 超阈值数量={np.sum(max_scores > self.conf_threshold.get())}")
@@ -1364,13 +1443,15 @@ class ModernDualComparator:
             valid_mask = max_scores > self.conf_threshold.get()
 
             if np.any(valid_mask):
-                valid_anchors = anchors[valid_mask]
                 valid_reg = reg_pred[valid_mask]  # [N, 4]
                 valid_scores = max_scores[valid_mask]
                 valid_classes = class_ids[valid_mask]
 
                 # 处理已完成DFL的回归输出
-                boxes = self.decode_bboxes_dfl(valid_reg, valid_anchors, stride)
+                if anchors is None:
+                    boxes = valid_reg
+                else:
+                    boxes = self.decode_bboxes_dfl(valid_reg, anchors[valid_mask], stride)
 
                 # 添加检测结果
                 for j in range(len(boxes)):
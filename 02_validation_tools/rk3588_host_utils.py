@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+"""
+RK3588 ONNX主机端前后处理工具
+与对比器一致的letterbox预处理和六输出解码，供导出评估、量化校准等脚本复用
+另含onnxruntime优化产物的生成与加载，验证工具打开模型时可跳过图优化；
+导出时写入的元数据（类别名/步长/输入尺寸/布局/预处理约定）由onnx_model_config读取，全程不依赖torch
+"""
+
+import ast
+import functools
+import hashlib
+import json
+import platform
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+def letterbox_params(frame_shape, new_shape=(640, 640)):
+    """
+    计算与letterbox一致的缩放与填充参数
+    返回 (r, (new_w, new_h), (top, bottom, left, right), (dw, dh))，供图内letterbox导出复用
+    """
+    r = min(new_shape[0] / frame_shape[0], new_shape[1] / frame_shape[1])
+    new_unpad = (int(round(frame_shape[1] * r)), int(round(frame_shape[0] * r)))
+    dw = (new_shape[1] - new_unpad[0]) / 2
+    dh = (new_shape[0] - new_unpad[1]) / 2
+    borders = (int(round(dh - 0.1)), int(round(dh + 0.1)), int(round(dw - 0.1)), int(round(dw + 0.1)))
+    return r, new_unpad, borders, (dw, dh)
+
+
+def letterbox(image, new_shape=(640, 640), color=(114, 114, 114)):
+    """与Ultralytics一致的letterbox预处理"""
+    if isinstance(new_shape, int):
+        new_shape = (new_shape, new_shape)
+
+    r, new_unpad, (top, bottom, left, right), dwdh = letterbox_params(image.shape[:2], new_shape)
+    if image.shape[1::-1] != new_unpad:
+        image = cv2.resize(image, new_unpad, interpolation=cv2.INTER_LINEAR)
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return image, r, dwdh
+
+
+# onnxruntime优化产物：与源模型同目录的 <stem>.ortopt-<键>.onnx，键记录在 <stem>.ortopt.json
+ORT_ARTIFACT_TAG = ".ortopt-"
+
+
+def _model_parts(onnx_path):
+    """源模型文件及其.data外部权重（存在时）"""
+    path = Path(onnx_path)
+    return [part for part in (path, path.with_name(path.name + ".data")) if part.exists()]
+
+
+def _ort_runtime_tag():
+    """产物依赖的运行环境：onnxruntime版本与CPU架构"""
+    import onnxruntime as ort
+    return f"{ort.__version__}|{platform.machine()}"
+
+
+def ort_artifact_key(onnx_path):
+    """产物键：源模型（含.data外部权重）内容哈希 + onnxruntime版本 + CPU架构，任一变化即失效"""
+    digest = hashlib.sha256()
+    for part in _model_parts(onnx_path):
+        with open(part, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 22), b''):
+                digest.update(chunk)
+    digest.update(_ort_runtime_tag().encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def _ort_manifest_path(onnx_path):
+    """记录产物键与源文件大小/mtime的清单"""
+    path = Path(onnx_path)
+    return path.with_name(f"{path.stem}.ortopt.json")
+
+
+def _stat_signature(onnx_path):
+    """源模型各文件的 [文件名, 大小, mtime_ns]"""
+    return [[part.name, part.stat().st_size, part.stat().st_mtime_ns] for part in _model_parts(onnx_path)]
+
+
+def ort_artifact_path(onnx_path):
+    """
+    源模型当前内容对应的优化产物路径（不保证存在）
+    源文件大小与mtime与上次生成产物时一致则复用记录的哈希，避免每次打开都读取整个模型
+    """
+    path = Path(onnx_path)
+    key = None
+    manifest_path = _ort_manifest_path(path)
+    if manifest_path.exists():
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+            if manifest.get('stat') == _stat_signature(path) and manifest.get('runtime') == _ort_runtime_tag():
+                key = manifest.get('key')
+        except (OSError, ValueError):
+            key = None
+    return path.with_name(f"{path.stem}{ORT_ARTIFACT_TAG}{key or ort_artifact_key(path)}.onnx")
+
+
+def write_ort_artifact(onnx_path):
+    """
+    以ORT_ENABLE_ALL优化源模型并保存为优化产物，同时删除该模型的旧产物，返回产物路径
+    产物含NCHWc等CPU相关的布局优化，键中已包含CPU架构与onnxruntime版本
+    """
+    import onnxruntime as ort
+
+    path = Path(onnx_path)
+    key = ort_artifact_key(path)
+    artifact = path.with_name(f"{path.stem}{ORT_ARTIFACT_TAG}{key}.onnx")
+    for stale in path.parent.glob(f"{path.stem}{ORT_ARTIFACT_TAG}*.onnx"):
+        if stale != artifact:
+            stale.unlink()
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.optimized_model_filepath = str(artifact)
+    options.log_severity_level = 3  # 屏蔽"产物含硬件相关优化"警告
+    ort.InferenceSession(str(path), options, providers=['CPUExecutionProvider'])
+    _ort_manifest_path(path).write_text(json.dumps({
+        'key': key,
+        'stat': _stat_signature(path),
+        'runtime': _ort_runtime_tag(),
+    }, indent=2), encoding='utf-8')
+    return artifact
+
+
+def create_onnx_session(onnx_path, providers=None):
+    """
+    创建推理会话：仅用CPU推理且存在与源模型匹配的优化产物时，直接加载产物并关闭图优化
+    返回 (session, 是否加载了优化产物)
+    """
+    import onnxruntime as ort
+
+    providers = list(providers or ['CPUExecutionProvider'])
+    if providers == ['CPUExecutionProvider']:
+        artifact = ort_artifact_path(onnx_path)
+        if artifact.exists():
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            return ort.InferenceSession(str(artifact), options, providers=providers), True
+    return ort.InferenceSession(str(onnx_path), providers=providers), False
+
+
+def onnx_letterbox_metadata(session):
+    """
+    读取--raw-frame导出模型的图内letterbox元数据
+    返回 (原始帧(h, w), 模型输入(h, w), r, (dw, dh))，普通模型返回None
+    """
+    meta = session.get_modelmeta().custom_metadata_map
+    if 'letterbox_ratio' not in meta:
+        return None
+    raw_hw = tuple(json.loads(meta['raw_frame_size']))
+    img_hw = tuple(json.loads(meta['imgsz']))
+    return raw_hw, img_hw, float(meta['letterbox_ratio']), tuple(json.loads(meta['letterbox_pad']))
+
+
+def onnx_class_ids(session):
+    """
+    读取--classes导出模型的原始类别ID：cls通道i对应原始类别ids[i]
+    返回可直接用于索引映射的int64数组，全类别模型返回None
+    """
+    meta = session.get_modelmeta().custom_metadata_map
+    if 'class_ids' not in meta:
+        return None
+    return np.asarray(json.loads(meta['class_ids']), dtype=np.int64)
+
+
+def onnx_strides(session):
+    """读取导出时写入的各尺度步长（如 [8, 16, 32] 或P6模型的 [8, 16, 32, 64]），旧模型返回None"""
+    meta = session.get_modelmeta().custom_metadata_map
+    if 'strides' not in meta:
+        return None
+    return [float(s) for s in json.loads(meta['strides'])]
+
+
+def onnx_class_names(session):
+    """
+    读取导出时写入的全部类别名（列表下标即原始类别ID），无元数据时返回None
+    兼容ultralytics自带导出的names（Python字典字面量 "{0: 'person', ...}"）
+    """
+    meta = session.get_modelmeta().custom_metadata_map
+    if 'names' not in meta:
+        return None
+    try:
+        names = json.loads(meta['names'])
+    except ValueError:
+        names = ast.literal_eval(meta['names'])
+    if isinstance(names, dict):
+        names = [names[k] for k in sorted(names, key=int)]
+    return [str(n) for n in names]
+
+
+def onnx_model_config(session):
+    """
+    仅凭ONNX文件确定前后处理配置，返回dict：
+      imgsz        网络输入(h, w)：优先取元数据，旧模型取输入形状（动态维度按640）
+      input_dtype  np.float32 / np.float16 / np.uint8（uint8为NHWC BGR帧）
+      names        全部类别名（见onnx_class_names），旧模型为None
+      class_ids / strides / letterbox  同onnx_class_ids / onnx_strides / onnx_letterbox_metadata
+      layout / head / preprocess       导出时的输出布局、检测头变体与预处理约定，旧模型为None
+    """
+    meta = session.get_modelmeta().custom_metadata_map
+    inp = session.get_inputs()[0]
+    if 'uint8' in inp.type:
+        input_dtype = np.uint8
+        shape_hw = inp.shape[1:3]
+    else:
+        input_dtype = np.float16 if 'float16' in inp.type else np.float32
+        shape_hw = inp.shape[2:4]
+    if 'imgsz' in meta:
+        imgsz = tuple(json.loads(meta['imgsz']))
+    else:
+        imgsz = tuple(d if isinstance(d, int) else 640 for d in shape_hw)
+    return {
+        'imgsz': imgsz,
+        'input_dtype': input_dtype,
+        'names': onnx_class_names(session),
+        'class_ids': onnx_class_ids(session),
+        'strides': onnx_strides(session),
+        'letterbox': onnx_letterbox_metadata(session),
+        'layout': meta.get('layout'),
+        'head': meta.get('head'),
+        'preprocess': json.loads(meta['preprocess']) if 'preprocess' in meta else None,
+    }
+
+
+def preprocess_image(image, new_shape=(640, 640), dtype=np.float32):
+    """
+    letterbox + BGR→RGB + 归一化 + NCHW，返回 (tensor, r, (dw, dh))
+    dtype为uint8时对应--uint8-input导出的模型：只做letterbox，返回 [1, H, W, 3] BGR帧
+    """
+    input_image, r, (dw, dh) = letterbox(image, new_shape)
+    if dtype == np.uint8:
+        return input_image[None], r, (dw, dh)
+    input_image = cv2.cvtColor(input_image, cv2.COLOR_BGR2RGB)
+    input_image = input_image.astype(np.float32) / 255.0
+    input_image = np.transpose(input_image, (2, 0, 1))
+    input_image = np.expand_dims(input_image, axis=0).astype(dtype)
+    return input_image, r, (dw, dh)
+
+
+def sigmoid(x):
+    """Sigmoid激活函数"""
+    return 1 / (1 + np.exp(-np.clip(x, -250, 250)))
+
+
+def nms_boxes(boxes, scores, iou_threshold=0.45):
+    """标准NMS，返回保留的索引"""
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.maximum(0.0, x2 - x1) * np.maximum(0.0, y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        inter = np.maximum(0.0, xx2 - xx1) * np.maximum(0.0, yy2 - yy1)
+        ovr = inter / (areas[i] + areas[order[1:]] - inter + 1e-9)
+        order = order[np.where(ovr <= iou_threshold)[0] + 1]
+    return np.array(keep, dtype=np.int64)
+
+
+def batched_nms(boxes, scores, class_ids, iou_threshold=0.45):
+    """按类别分别做NMS"""
+    keep = []
+    for cid in np.unique(class_ids):
+        idx = np.where(class_ids == cid)[0]
+        keep.extend(idx[nms_boxes(boxes[idx], scores[idx], iou_threshold)])
+    keep = np.array(sorted(keep, key=lambda i: -scores[i]), dtype=np.int64)
+    return keep
+
+
+def _select_candidates(cls_output, conf_threshold):
+    """按最大类别置信度筛选候选，返回 (anchor索引, 分数, 类别)"""
+    nc = cls_output.shape[1]
+    cls_scores = sigmoid(cls_output[0].reshape(nc, -1).astype(np.float32)).T  # [H*W, nc]
+    max_scores = cls_scores.max(axis=1)
+    idx = np.where(max_scores > conf_threshold)[0]
+    return idx, max_scores[idx], cls_scores[idx].argmax(axis=1)
+
+
+def _merge_scales(all_boxes, all_scores, all_classes, iou_threshold):
+    """合并各尺度候选并做按类别NMS"""
+    if not all_boxes:
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64)
+
+    boxes = np.concatenate(all_boxes)
+    scores = np.concatenate(all_scores)
+    class_ids = np.concatenate(all_classes)
+    keep = batched_nms(boxes, scores, class_ids, iou_threshold)
+    return boxes[keep], scores[keep], class_ids[keep]
+
+
+def decode_rk3588_outputs(outputs, input_shape=(640, 640), conf_threshold=0.25, iou_threshold=0.45, strides=None):
+    """
+    解码RK3588格式 (reg1, cls1, reg2, cls2, ...)，每尺度一对输出（P5模型6个，P6模型8个）
+    reg: [1, 1, 4, H*W] DFL后的ltrb距离，cls: [1, nc, H, W] logits
+    步长取strides（模型元数据），未给出时由输入尺寸与特征图尺寸推得，返回letterbox输入坐标系下的 (boxes_xyxy, scores, class_ids)
+    """
+    all_boxes, all_scores, all_classes = [], [], []
+    for i, (reg_output, cls_output) in enumerate(zip(outputs[0::2], outputs[1::2])):
+        _, _, height, width = cls_output.shape
+        stride = strides[i] if strides else input_shape[0] / height
+
+        idx, scores, classes = _select_candidates(cls_output, conf_threshold)
+        if idx.size == 0:
+            continue
+
+        dist = reg_output[0, 0][:, idx].astype(np.float32).T * stride  # [N, 4] ltrb
+        cx = (idx % width + 0.5) * stride
+        cy = (idx // width + 0.5) * stride
+        boxes = np.stack([cx - dist[:, 0], cy - dist[:, 1], cx + dist[:, 2], cy + dist[:, 3]], axis=1)
+
+        all_boxes.append(boxes)
+        all_scores.append(scores)
+        all_classes.append(classes)
+    return _merge_scales(all_boxes, all_scores, all_classes, iou_threshold)
+
+
+def decode_rk3588_boxes(outputs, conf_threshold=0.25, iou_threshold=0.45):
+    """
+    解码图内框解码变体 (box1, cls1, box2, cls2, box3, cls3)
+    box: [1, 1, 4, H*W] 已是输入像素坐标xyxy，无需anchor网格与步长
+    """
+    all_boxes, all_scores, all_classes = [], [], []
+    for box_output, cls_output in zip(outputs[0::2], outputs[1::2]):
+        idx, scores, classes = _select_candidates(cls_output, conf_threshold)
+        if idx.size == 0:
+            continue
+        all_boxes.append(box_output[0, 0][:, idx].astype(np.float32).T)
+        all_scores.append(scores)
+        all_classes.append(classes)
+    return _merge_scales(all_boxes, all_scores, all_classes, iou_threshold)
+
+
+def _infer_strides(input_shape, num_anchors, max_levels=4):
+    """由输入尺寸与anchor数推得各尺度步长（8, 16, 32[, 64]），单尺度输出时直接按面积求步长"""
+    h, w = input_shape
+    for levels in range(1, max_levels + 1):
+        if levels == 1:
+            stride = round((h * w / num_anchors) ** 0.5)
+            if (h // stride) * (w // stride) == num_anchors:
+                return [stride]
+            continue
+        strides = [8 * 2 ** i for i in range(levels)]
+        if sum((h // s) * (w // s) for s in strides) == num_anchors:
+            return strides
+    raise ValueError(f"无法由输入 {h}x{w} 推得 {num_anchors} 个anchor对应的步长")
+
+
+def _anchor_centers(idx, input_shape, strides):
+    """anchor-major索引 → (cx, cy, stride)，idx可跨越多个尺度（concat布局）"""
+    h, w = input_shape
+    widths = np.array([w // s for s in strides])
+    counts = np.array([(h // s) * (w // s) for s in strides])
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    level = np.searchsorted(starts, idx, side='right') - 1
+    local = idx - starts[level]
+    stride = np.asarray(strides, dtype=np.float32)[level]
+    return (local % widths[level] + 0.5) * stride, (local // widths[level] + 0.5) * stride, stride
+
+
+def decode_anchor_major(outputs, input_shape=(640, 640), conf_threshold=0.25, iou_threshold=0.45,
+                        decoded_boxes=False, strides=None):
+    """
+    解码anchor-major布局：reg/box [1, N, 4] 与 cls [1, N, nc] 成对出现
+    每尺度一对（anchor_major，6/8输出）或各尺度已拼接（concat，2输出），按anchor连续读取无需转置
+    decoded_boxes=True时reg已是输入像素坐标xyxy，否则为DFL后的ltrb距离
+    strides为模型元数据中的各尺度步长，未给出时由输入尺寸与anchor数推得
+    """
+    concat = len(outputs) == 2
+    # sigmoid单调：阈值换算到logit上，只对候选做sigmoid
+    logit_threshold = np.log(conf_threshold / (1.0 - conf_threshold)) if 0.0 < conf_threshold < 1.0 else (
+        -np.inf if conf_threshold <= 0.0 else np.inf)
+    all_boxes, all_scores, all_classes = [], [], []
+    for i, (reg_output, cls_output) in enumerate(zip(outputs[0::2], outputs[1::2])):
+        logits = cls_output[0]  # [N, nc]
+        # numpy沿很短的连续轴(nc)归约极慢，逐列取最大值代替 logits.max(axis=1)
+        max_logits = functools.reduce(np.maximum, (logits[:, c] for c in range(logits.shape[1])))
+        idx = np.where(max_logits > logit_threshold)[0]
+        if idx.size == 0:
+            continue
+
+        reg = reg_output[0, idx].astype(np.float32)  # [n, 4]
+        if decoded_boxes:
+            boxes = reg
+        else:
+            if strides:
+                level_strides = [int(s) for s in strides] if concat else [int(strides[i])]
+            else:
+                level_strides = _infer_strides(input_shape, cls_output.shape[1])
+            cx, cy, stride = _anchor_centers(idx, input_shape, level_strides)
+            dist = reg * stride[:, None]
+            boxes = np.stack([cx - dist[:, 0], cy - dist[:, 1], cx + dist[:, 2], cy + dist[:, 3]], axis=1)
+
+        all_boxes.append(boxes)
+        all_scores.append(sigmoid(max_logits[idx].astype(np.float32)))
+        all_classes.append(logits[idx].argmax(axis=1))
+    return _merge_scales(all_boxes, all_scores, all_classes, iou_threshold)
+
+
+def decode_rk3588_topk(outputs, conf_threshold=0.25, iou_threshold=0.45):
+    """
+    解码图内TopK变体 (boxes [1, k, 4], scores [1, k], class_ids [1, k])
+    候选已在图内筛选并完成sigmoid，主机端只做阈值过滤与NMS
+    """
+    boxes, scores, class_ids = outputs[0][0], outputs[1][0], outputs[2][0]
+    idx = np.where(scores > conf_threshold)[0]
+    boxes = boxes[idx].astype(np.float32)
+    scores = scores[idx].astype(np.float32)
+    class_ids = class_ids[idx].astype(np.int64)
+    keep = batched_nms(boxes, scores, class_ids, iou_threshold)
+    return boxes[keep], scores[keep], class_ids[keep]
+
+
+def decode_detections(outputs, output_names, input_shape=(640, 640), conf_threshold=0.25, iou_threshold=0.45,
+                      strides=None):
+    """
+    按输出名与维度选择解码方式：boxes为图内TopK变体，3维输出为anchor-major/concat布局，
+    boxN为图内解码变体，regN为DFL距离格式；尺度数由输出数决定，strides见onnx_strides
+    """
+    if output_names[0] == 'boxes':
+        return decode_rk3588_topk(outputs, conf_threshold, iou_threshold)
+    if outputs[0].ndim == 3:
+        return decode_anchor_major(outputs, input_shape, conf_threshold, iou_threshold,
+                                   decoded_boxes=output_names[0].startswith('box'), strides=strides)
+    if output_names[0].startswith('box'):
+        return decode_rk3588_boxes(outputs, conf_threshold, iou_threshold)
+    return decode_rk3588_outputs(outputs, input_shape, conf_threshold, iou_threshold, strides)
+
+
+def scale_boxes(boxes, r, dwdh, original_shape):
+    """letterbox逆变换：将输入坐标系的框映射回原图并裁剪到图像范围"""
+    dw, dh = dwdh
+    boxes = boxes.astype(np.float32).copy()
+    boxes[:, [0, 2]] -= dw
+    boxes[:, [1, 3]] -= dh
+    boxes /= r
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, original_shape[1] - 1)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, original_shape[0] - 1)
+    return boxes
+
+
+def detect_onnx(session, image, conf_threshold=0.25, iou_threshold=0.45, config=None):
+    """
+    对单张BGR图片做ONNX推理，返回原图坐标系下的 (boxes, scores, class_ids)，class_ids为原始类别ID
+    config为onnx_model_config的结果，逐帧调用时传入可避免重复读取元数据
+    """
+    config = config or onnx_model_config(session)
+    lb = config['letterbox']
+    if lb:
+        # 图内letterbox：直接送入原始帧，逆变换参数取自模型元数据
+        raw_hw, img_size, r, dwdh = lb
+        if image.shape[:2] != raw_hw:
+            raise ValueError(f"帧尺寸 {image.shape[1]}x{image.shape[0]} 与模型固定的原始帧 {raw_hw[1]}x{raw_hw[0]} 不一致")
+        tensor = image[None]
+    else:
+        img_size = config['imgsz']
+        tensor, r, dwdh = preprocess_image(image, img_size, dtype=config['input_dtype'])
+    outputs = session.run(None, {session.get_inputs()[0].name: tensor})
+    output_names = [o.name for o in session.get_outputs()]
+    boxes, scores, class_ids = decode_detections(outputs, output_names, img_size, conf_threshold, iou_threshold,
+                                                 strides=config['strides'])
+    if config['class_ids'] is not None:
+        class_ids = config['class_ids'][class_ids]  # 类别子集模型：还原原始类别ID
+    return scale_boxes(boxes, r, dwdh, image.shape[:2]), scores, class_ids
+
+
+def box_iou(box, boxes):
+    """单个框与一组框的IoU"""
+    xx1 = np.maximum(box[0], boxes[:, 0])
+    yy1 = np.maximum(box[1], boxes[:, 1])
+    xx2 = np.minimum(box[2], boxes[:, 2])
+    yy2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.maximum(0.0, xx2 - xx1) * np.maximum(0.0, yy2 - yy1)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / (area + areas - inter + 1e-9)
+
+
+def match_detections(ref, test, iou_threshold=0.5):
+    """
+    按类别贪心匹配两组检测结果 (boxes, scores, class_ids)
+    返回 (匹配数, 匹配对的置信度差列表)
+    """
+    ref_boxes, ref_scores, ref_classes = ref
+    test_boxes, test_scores, test_classes = test
+    used = np.zeros(len(test_boxes), dtype=bool)
+    score_diffs = []
+    for i in np.argsort(-ref_scores):
+        candidates = np.where((test_classes == ref_classes[i]) & ~used)[0]
+        if candidates.size == 0:
+            continue
+        ious = box_iou(ref_boxes[i], test_boxes[candidates])
+        best = int(np.argmax(ious))
+        if ious[best] >= iou_threshold:
+            used[candidates[best]] = True
+            score_diffs.append(abs(float(ref_scores[i]) - float(test_scores[candidates[best]])))
+    return len(score_diffs), score_diffs
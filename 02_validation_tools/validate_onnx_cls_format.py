@@ -30,11 +30,15 @@ def letterbox(image, new_shape=(640, 640), color=(114, 114, 114)):
     return image
 
 
-def preprocess_image(img_bgr, size=640, letterbox_enabled=True):
+def preprocess_image(img_bgr, size=640, letterbox_enabled=True, nhwc_uint8=False):
+    h, w = (size, size) if isinstance(size, int) else size
     if letterbox_enabled:
-        img = letterbox(img_bgr, (size, size))
+        img = letterbox(img_bgr, (h, w))
     else:
-        img = cv2.resize(img_bgr, (size, size))
+        img = cv2.resize(img_bgr, (w, h))
+    if nhwc_uint8:
+        # --uint8-input导出的模型：归一化与BGR→RGB在图内完成
+        return img[None]
     img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
     x = (img.astype(np.float32) / 255.0).transpose(2, 0, 1)[None]
     return x
@@ -84,7 +88,15 @@ def main():
     assert model_path.exists(), f"Model not found: {model_path}"
 
     providers = [p.strip() for p in args.providers.split(",") if p.strip()]
-    sess = ort.InferenceSession(str(model_path), providers=providers)
+    # 存在与模型匹配的优化产物时直接加载，跳过onnxruntime图优化（rk3588_host_utils依赖cv2）
+    try:
+        from rk3588_host_utils import create_onnx_session
+    except ImportError:
+        sess = ort.InferenceSession(str(model_path), providers=providers)
+    else:
+        sess, optimized = create_onnx_session(model_path, providers)
+        if optimized:
+            print("[info] loaded pre-optimized ORT artifact")
 
     print("Inputs:")
     for i in sess.get_inputs():
@@ -93,18 +105,29 @@ def main():
     out_names = [o.name for o in sess.get_outputs()]
     for o in sess.get_outputs():
         print(f"  {o.name}: {o.shape} ({o.type})")
+    # 导出时写入的元数据（类别名/步长/输入尺寸/布局/预处理约定）
+    meta = sess.get_modelmeta().custom_metadata_map
+    if meta:
+        print("Metadata:")
+        for key in sorted(meta):
+            print(f"  {key}: {meta[key]}")
 
     # Dummy inference
     inp0 = sess.get_inputs()[0]
-    if isinstance(inp0.shape[0], str):
-        b, c, h, w = 1, 3, args.size, args.size
+    # 尽量按模型静态形状推测（矩形输入时H/W不同），动态维度回退到--size
+    # uint8输入为NHWC BGR布局
+    nhwc_uint8 = "uint8" in inp0.type
+    dims = [inp0.shape[i] for i in ((0, 3, 1, 2) if nhwc_uint8 else (0, 1, 2, 3))]
+    b = int(dims[0]) if isinstance(dims[0], (int, np.integer)) else 1
+    c = int(dims[1]) if isinstance(dims[1], (int, np.integer)) else 3
+    h = int(dims[2]) if isinstance(dims[2], (int, np.integer)) else args.size
+    w = int(dims[3]) if isinstance(dims[3], (int, np.integer)) else args.size
+    if nhwc_uint8:
+        in_dtype = np.uint8
+        x_dummy = np.random.randint(0, 256, (b, h, w, c), dtype=np.uint8)
     else:
-        # 尽量按模型静态形状推测
-        b = int(inp0.shape[0]) if isinstance(inp0.shape[0], (int, np.integer)) else 1
-        c = int(inp0.shape[1]) if isinstance(inp0.shape[1], (int, np.integer)) else 3
-        h = int(inp0.shape[2]) if isinstance(inp0.shape[2], (int, np.integer)) else args.size
-        w = int(inp0.shape[3]) if isinstance(inp0.shape[3], (int, np.integer)) else args.size
-    x_dummy = np.random.randn(b, c, h, w).astype(np.float32)
+        in_dtype = np.float16 if "float16" in inp0.type else np.float32
+        x_dummy = np.random.randn(b, c, h, w).astype(in_dtype)
     outs_dummy = sess.run(None, {inp0.name: x_dummy})
     analyze_outputs("dummy", out_names, outs_dummy)
 
@@ -116,7 +139,8 @@ def main():
             print(f"\n[warn] image not found: {args.image}")
         else:
             img = cv2.imread(args.image)
-            x_img = preprocess_image(img, size=args.size, letterbox_enabled=args.letterbox)
+            x_img = preprocess_image(img, size=(h, w), letterbox_enabled=args.letterbox,
+                                     nhwc_uint8=nhwc_uint8).astype(in_dtype)
             outs_img = sess.run(None, {inp0.name: x_img})
             cls_info = analyze_outputs("image", out_names, outs_img)
 
@@ -8,6 +8,10 @@ import cv2
 import numpy as np
 import onnxruntime as ort
 from ultralytics import YOLO
+from rk3588_host_utils import onnx_model_config
+
+# 旧模型没有names元数据时使用的类别名
+DEFAULT_CLASS_NAMES = ['basketball', 'rim']
 
 def letterbox(image, new_shape=(640, 640), color=(114, 114, 114)):
     """与Ultralytics一致的letterbox预处理"""
@@ -39,6 +43,9 @@ def test_preprocessing_effect():
     try:
         pt_model = YOLO("best.pt")
         onnx_session = ort.InferenceSession("best_rk3588_simple.onnx", providers=['CPUExecutionProvider'])
+        # 输入尺寸、步长与类别名取自ONNX元数据
+        config = onnx_model_config(onnx_session)
+        img_h, img_w = config['imgsz']
         print("✅ 模型加载成功")
     except Exception as e:
         print(f"❌ 模型加载失败: {e}")
@@ -74,7 +81,7 @@ def test_preprocessing_effect():
     print(f"\n⚡ ONNX模型结果 (简单resize):")
     
     # resize预处理
-    frame_resized = cv2.resize(frame, (640, 640))
+    frame_resized = cv2.resize(frame, (img_w, img_h))
     frame_rgb = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2RGB)
     frame_normalized = frame_rgb.astype(np.float32) / 255.0
     frame_tensor = np.transpose(frame_normalized, (2, 0, 1))
@@ -85,7 +92,7 @@ def test_preprocessing_effect():
     outputs = onnx_session.run(None, {input_name: frame_tensor})
     
     # 简单后处理
-    resize_detections = simple_postprocess(outputs, frame.shape[1], frame.shape[0])
+    resize_detections = simple_postprocess(outputs, frame.shape[1], frame.shape[0], config)
     for det in resize_detections:
         print(f"  {det['class_name']}: {det['score']:.6f}")
     
@@ -93,7 +100,7 @@ def test_preprocessing_effect():
     print(f"\n⚡ ONNX模型结果 (letterbox):")
     
     # letterbox预处理
-    frame_letterbox, r, (dw, dh) = letterbox(frame, (640, 640))
+    frame_letterbox, r, (dw, dh) = letterbox(frame, (img_h, img_w))
     frame_rgb = cv2.cvtColor(frame_letterbox, cv2.COLOR_BGR2RGB)
     frame_normalized = frame_rgb.astype(np.float32) / 255.0
     frame_tensor = np.transpose(frame_normalized, (2, 0, 1))
@@ -103,7 +110,7 @@ def test_preprocessing_effect():
     outputs = onnx_session.run(None, {input_name: frame_tensor})
     
     # letterbox后处理
-    letterbox_detections = letterbox_postprocess(outputs, frame.shape[1], frame.shape[0], r, dw, dh)
+    letterbox_detections = letterbox_postprocess(outputs, frame.shape[1], frame.shape[0], r, dw, dh, config)
     for det in letterbox_detections:
         print(f"  {det['class_name']}: {det['score']:.6f}")
     
@@ -116,7 +123,7 @@ def test_preprocessing_effect():
     resize_dict = {det['class_name']: det['score'] for det in resize_detections}
     letterbox_dict = {det['class_name']: det['score'] for det in letterbox_detections}
     
-    for class_name in ['basketball', 'rim']:
+    for class_name in config['names'] or DEFAULT_CLASS_NAMES:
         pt_conf = pt_dict.get(class_name, 0)
         resize_conf = resize_dict.get(class_name, 0)
         letterbox_conf = letterbox_dict.get(class_name, 0)
@@ -136,12 +143,13 @@ def test_preprocessing_effect():
             else:
                 print(f"  ⚠️  需要进一步调试")
 
-def simple_postprocess(outputs, original_width, original_height):
-    """简单的resize后处理"""
-    reg_outputs = [outputs[i] for i in [0, 2, 4]]
-    cls_outputs = [outputs[i] for i in [1, 3, 5]]
-    strides = [8, 16, 32]
-    class_names = ['basketball', 'rim']
+def simple_postprocess(outputs, original_width, original_height, config):
+    """简单的resize后处理，config为onnx_model_config的结果"""
+    reg_outputs = outputs[0::2]
+    cls_outputs = outputs[1::2]
+    # 步长优先取元数据，旧模型由输入高度推得（P6模型为 [8, 16, 32, 64]）
+    strides = config['strides'] or [config['imgsz'][0] // cls_output.shape[2] for cls_output in cls_outputs]
+    class_names = config['names'] or DEFAULT_CLASS_NAMES
     
     all_detections = []
     
@@ -198,8 +206,8 @@ def simple_postprocess(outputs, original_width, original_height):
                         })
     
     # 简单缩放
-    scale_x = original_width / 640
-    scale_y = original_height / 640
+    scale_x = original_width / config['imgsz'][1]
+    scale_y = original_height / config['imgsz'][0]
     
     for det in all_detections:
         det['bbox'][[0, 2]] *= scale_x
@@ -214,12 +222,13 @@ def simple_postprocess(outputs, original_width, original_height):
     
     return list(best_by_class.values())
 
-def letterbox_postprocess(outputs, original_width, original_height, r, dw, dh):
-    """letterbox后处理"""
-    reg_outputs = [outputs[i] for i in [0, 2, 4]]
-    cls_outputs = [outputs[i] for i in [1, 3, 5]]
-    strides = [8, 16, 32]
-    class_names = ['basketball', 'rim']
+def letterbox_postprocess(outputs, original_width, original_height, r, dw, dh, config):
+    """letterbox后处理，config为onnx_model_config的结果"""
+    reg_outputs = outputs[0::2]
+    cls_outputs = outputs[1::2]
+    # 步长优先取元数据，旧模型由输入高度推得（P6模型为 [8, 16, 32, 64]）
+    strides = config['strides'] or [config['imgsz'][0] // cls_output.shape[2] for cls_output in cls_outputs]
+    class_names = config['names'] or DEFAULT_CLASS_NAMES
     
     all_detections = []
     
@@ -3,6 +3,7 @@
 YOLOv8自动标注工具 - 现代化界面版本
 采用更清晰的布局和现代化的视觉设计
 生成与LabelMe兼容的JSON格式标注文件
+支持simple_rk3588_export.py导出的ONNX模型：类别名与前后处理配置取自模型元数据，无需torch
 """
 
 import tkinter as tk
@@ -24,22 +25,12 @@ warnings.filterwarnings("ignore", category=UserWarning)
 if sys.platform == "darwin":  # macOS
     os.environ['TK_SILENCE_DEPRECATION'] = '1'
 
-try:
-    import torch
-    from ultralytics import YOLO
-    DEPENDENCIES_OK = True
-except ImportError as e:
-    DEPENDENCIES_OK = False
-    MISSING_DEPS = str(e)
+# torch/ultralytics只在加载.pt模型时导入；RK3588 ONNX模型的前后处理复用02_validation_tools/rk3588_host_utils.py
+VALIDATION_TOOLS_DIR = Path(__file__).resolve().parent.parent / "02_validation_tools"
 
 
 class ModernAnnotationTool:
     def __init__(self):
-        # 检查依赖
-        if not DEPENDENCIES_OK:
-            self.show_dependency_error()
-            return
-            
         self.root = tk.Tk()
         self.root.title("YOLO智能标注助手")
         self.root.geometry("1400x900")
@@ -78,6 +69,7 @@ class ModernAnnotationTool:
         self.image_folder = tk.StringVar()
         self.confidence_threshold = tk.DoubleVar(value=0.5)
         self.current_model = None
+        self.onnx_config = None  # ONNX模型的元数据配置（onnx_model_config），.pt模型为None
         self.class_names = []
         self.selected_classes = {}
         self.custom_class_names = {}
@@ -671,7 +663,8 @@ class ModernAnnotationTool:
         """浏览模型文件"""
         filename = filedialog.askopenfilename(
             title="选择YOLOv8模型文件",
-            filetypes=[("PyTorch模型", "*.pt"), ("所有文件", "*.*")]
+            filetypes=[("YOLO模型", "*.pt *.onnx"), ("PyTorch模型", "*.pt"), ("RK3588 ONNX模型", "*.onnx"),
+                       ("所有文件", "*.*")]
         )
         if filename:
             self.model_path.set(filename)
@@ -696,26 +689,10 @@ class ModernAnnotationTool:
         self.root.update_idletasks()
         
         try:
-            # 处理PyTorch安全限制
-            import torch.serialization
-            torch.serialization.add_safe_globals([
-                'ultralytics.nn.tasks.DetectionModel',
-                'ultralytics.nn.modules.head.Detect',
-                'ultralytics.nn.modules.block.C2f',
-                'ultralytics.nn.modules.conv.Conv',
-                'ultralytics.nn.modules.conv.DWConv',
-                'ultralytics.nn.modules.block.SPPF',
-                'torch.nn.modules.upsampling.Upsample',
-                'torch.nn.modules.container.Sequential',
-                'torch.nn.modules.activation.SiLU'
-            ])
-            
-            self.current_model = YOLO(model_file)
-            self.class_names = list(self.current_model.names.values())
-            
-            # 测试推理
-            dummy_img = np.zeros((640, 640, 3), dtype=np.uint8)
-            test_results = self.current_model(dummy_img, verbose=False)
+            if Path(model_file).suffix.lower() == '.onnx':
+                self.load_onnx_model(model_file)
+            else:
+                self.load_pt_model(model_file)
             
             # 创建类别选择界面
             self.create_class_selection_ui()
@@ -723,10 +700,69 @@ class ModernAnnotationTool:
             self.model_status.config(text=f"✅ 已加载 ({len(self.class_names)}个类别)",
                                    fg=self.colors['success'])
             
+        except ImportError as e:
+            self.model_status.config(text="❌ 缺少依赖", fg=self.colors['danger'])
+            self.show_dependency_error(str(e))
         except Exception as e:
             self.model_status.config(text="❌ 加载失败", fg=self.colors['danger'])
             messagebox.showerror("模型加载错误", f"无法加载模型:\n{str(e)}")
     
+    def load_pt_model(self, model_file):
+        """加载ultralytics .pt模型"""
+        import torch.serialization
+        from ultralytics import YOLO
+        
+        # 处理PyTorch安全限制
+        torch.serialization.add_safe_globals([
+            'ultralytics.nn.tasks.DetectionModel',
+            'ultralytics.nn.modules.head.Detect',
+            'ultralytics.nn.modules.block.C2f',
+            'ultralytics.nn.modules.conv.Conv',
+            'ultralytics.nn.modules.conv.DWConv',
+            'ultralytics.nn.modules.block.SPPF',
+            'torch.nn.modules.upsampling.Upsample',
+            'torch.nn.modules.container.Sequential',
+            'torch.nn.modules.activation.SiLU'
+        ])
+        
+        self.current_model = YOLO(model_file)
+        self.onnx_config = None
+        self.class_names = list(self.current_model.names.values())
+        
+        # 测试推理
+        dummy_img = np.zeros((640, 640, 3), dtype=np.uint8)
+        test_results = self.current_model(dummy_img, verbose=False)
+    
+    def load_onnx_model(self, model_file):
+        """加载RK3588 ONNX模型：类别名、输入尺寸、步长与输出布局均取自导出时写入的元数据"""
+        if str(VALIDATION_TOOLS_DIR) not in sys.path:
+            sys.path.append(str(VALIDATION_TOOLS_DIR))
+        from rk3588_host_utils import create_onnx_session, onnx_model_config
+        
+        session, _ = create_onnx_session(model_file)
+        config = onnx_model_config(session)
+        if not config['names']:
+            raise ValueError("ONNX模型中没有类别名元数据，请用simple_rk3588_export.py重新导出")
+        self.current_model = session
+        self.onnx_config = config
+        self.class_names = config['names']
+    
+    def detect_boxes(self, img_file, image):
+        """检测单张图片，返回 [(x1, y1, x2, y2, class_id), ...]，.pt与ONNX模型共用"""
+        conf = self.confidence_threshold.get()
+        if self.onnx_config is not None:
+            from rk3588_host_utils import detect_onnx
+            boxes, _, class_ids = detect_onnx(self.current_model, image, conf, config=self.onnx_config)
+            return [(*box, int(class_id)) for box, class_id in zip(boxes, class_ids)]
+        
+        detections = []
+        for result in self.current_model(str(img_file), conf=conf):
+            if result.boxes is not None:
+                for box in result.boxes:
+                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+                    detections.append((x1, y1, x2, y2, int(box.cls[0].cpu().numpy())))
+        return detections
+    
     def scan_images(self):
         """扫描图片文件夹"""
         folder = self.image_folder.get()
@@ -933,31 +969,22 @@ class ModernAnnotationTool:
             self.root.after(0, lambda: self.status_label.config(text="处理中..."))
             
             try:
-                # 运行检测
-                results = self.current_model(str(img_file), conf=self.confidence_threshold.get())
-                
                 # 获取图片尺寸
                 image = cv2.imread(str(img_file))
                 height, width = image.shape[:2]
                 
-                # 解析结果
+                # 运行检测并解析结果
                 detections = []
-                for result in results:
-                    boxes = result.boxes
-                    if boxes is not None:
-                        for box in boxes:
-                            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                            class_id = int(box.cls[0].cpu().numpy())
-                            
-                            # 只保留选中的类别
-                            if class_id in self.selected_classes and self.selected_classes[class_id]:
-                                detection = {
-                                    "label": self.class_names[class_id],
-                                    "points": [[float(x1), float(y1)], [float(x2), float(y2)]],
-                                    "shape_type": "rectangle",
-                                    "flags": {}
-                                }
-                                detections.append(detection)
+                for x1, y1, x2, y2, class_id in self.detect_boxes(img_file, image):
+                    # 只保留选中的类别
+                    if class_id in self.selected_classes and self.selected_classes[class_id]:
+                        detection = {
+                            "label": self.class_names[class_id],
+                            "points": [[float(x1), float(y1)], [float(x2), float(y2)]],
+                            "shape_type": "rectangle",
+                            "flags": {}
+                        }
+                        detections.append(detection)
                 
                 # 保存标注
                 if detections:
@@ -998,44 +1025,28 @@ class ModernAnnotationTool:
         # 可以实现预览功能
         messagebox.showinfo("预览", "预览功能开发中...")
     
-    def show_dependency_error(self):
-        """显示依赖错误"""
-        root = tk.Tk()
-        root.withdraw()
-        
+    def show_dependency_error(self, error):
+        """显示依赖错误（.pt模型需要torch/ultralytics，ONNX模型需要onnxruntime）"""
         error_msg = f"""依赖库缺失！
 
-缺失的依赖: {MISSING_DEPS}
+缺失的依赖: {error}
 
 请安装以下依赖包:
-• pip install ultralytics
-• pip install opencv-python
-• pip install pillow
-• pip install torch torchvision
+• .pt模型: pip install ultralytics torch torchvision
+• ONNX模型: pip install onnxruntime
 
-安装完成后重新运行程序。"""
+安装完成后重新加载模型。"""
         
-        messagebox.showerror("依赖错误", error_msg)
-        root.destroy()
+        messagebox.showerror("依赖错误", error_msg, parent=self.root)
     
     def run(self):
         """运行应用"""
-        if not DEPENDENCIES_OK:
-            return
         self.root.mainloop()
 
 
 def main():
     """主函数"""
     print("正在启动YOLO智能标注助手...")
-    
-    if not DEPENDENCIES_OK:
-        print(f"[错误] 依赖库缺失: {MISSING_DEPS}")
-        print("请运行以下命令安装依赖:")
-        print("pip install ultralytics opencv-python pillow torch torchvision")
-        return
-    
-    print("[成功] 依赖检查通过")
     print("正在初始化界面...")
     
     try: